@@ -1,18 +1,103 @@
 import os
 import json
+import time
+import zlib
 import pandas as pd
-import numpy as np
-from datetime import datetime
+import zstandard
+from WordleCleaning import condense_rows, parse_times
+from UserIndexStore import UserIndexStore
+from WordleAggregate import DAILY_VIEWS, aggregate_frame, merge_aggregates
+import fsspec
+import pyarrow as pa
+import pyarrow.parquet as pq
 from google.cloud import storage
 from google.cloud import bigquery
-from requests import request
 import requests
-import psutil
+from LocalCloud import LocalStorageClient, LocalBigQueryClient
+from PipelineMetrics import PipelineMetrics, get_metrics_file_path, get_peak_rss
+
+# set to a local directory to run against the file-backed stand-ins for GCS and BigQuery
+LOCAL_CLOUD_DIR = os.environ.get("WORDLE_LOCAL_CLOUD_DIR")
+
+# day files bigger than this, uncompressed, are condensed and loaded in streaming mode,
+# a chunk of CONDENSE_CHUNK_ROWS rows at a time, so memory use is bounded by the chunk size
+STREAM_MIN_BYTES = 32 << 20
+# compressed bytes read from the start of a gzip or zstd day file, to measure how much it
+# expands. arrow streams are bigger than the csv as stored, so they are compared as they are
+EXPANSION_SAMPLE_BYTES = 1 << 20
+CONDENSE_CHUNK_ROWS = 250_000
+# folder of the bucket holding the condensed parquet parts of a day file until they are loaded
+PARTS_FOLDER = "condensed_parts"
+# the columns of the condensed parquet parts, typed like the condensed_data table
+CONDENSED_PART_SCHEMA = pa.schema(
+    [
+        ("time", pa.timestamp("us", tz="UTC")),
+        ("user_id", pa.int64()),
+        ("surface", pa.int64()),
+        ("is_reply", pa.bool_()),
+        ("is_quote", pa.bool_()),
+        ("retweets", pa.int64()),
+        ("quotes", pa.int64()),
+        ("favs", pa.int64()),
+        ("replies", pa.int64()),
+        ("language", pa.string()),
+        ("wordle_num", pa.int64()),
+        ("rounds", pa.string()),
+        ("hard", pa.bool_()),
+        ("theme", pa.string()),
+        ("colorblind", pa.bool_()),
+        ("win", pa.bool_()),
+        ("matrix", pa.string()),
+    ]
+)
+# the columns of the daily_aggregates table, which holds the rows of every daily view named by
+# a view column, with the group-by columns of the other views NULL
+DAILY_AGGREGATES_SCHEMA = [
+    bigquery.SchemaField("view", "STRING"),
+    bigquery.SchemaField("wordle_num", "INTEGER"),
+    bigquery.SchemaField("rounds", "STRING"),
+    bigquery.SchemaField("hard", "BOOLEAN"),
+    bigquery.SchemaField("theme", "STRING"),
+    bigquery.SchemaField("colorblind", "BOOLEAN"),
+    bigquery.SchemaField("surface", "INTEGER"),
+    bigquery.SchemaField("language", "STRING"),
+    bigquery.SchemaField("hour", "INTEGER"),
+    bigquery.SchemaField("first_pattern", "STRING"),
+    bigquery.SchemaField("pattern", "STRING"),
+    bigquery.SchemaField("guess", "INTEGER"),
+    bigquery.SchemaField("greens", "INTEGER"),
+    bigquery.SchemaField("yellows", "INTEGER"),
+    bigquery.SchemaField("next_greens", "INTEGER"),
+    bigquery.SchemaField("next_yellows", "INTEGER"),
+    bigquery.SchemaField("count", "INTEGER"),
+    bigquery.SchemaField("wins", "INTEGER"),
+]
+# the nullable dtypes of the BigQuery types, as the views' columns are NULL in other views' rows
+BQ_DTYPES = {"STRING": "string", "BOOLEAN": "boolean", "INTEGER": "Int64"}
+
+
+def get_storage_client():
+    if LOCAL_CLOUD_DIR:
+        return LocalStorageClient(LOCAL_CLOUD_DIR)
+    return storage.Client()
+
+
+def get_bigquery_client():
+    if LOCAL_CLOUD_DIR:
+        return LocalBigQueryClient(LOCAL_CLOUD_DIR)
+    return bigquery.Client()
+
+
+# returns the url (or local path) of the given file in the bucket
+def get_bucket_url(bucket, filename):
+    if LOCAL_CLOUD_DIR:
+        return os.path.join(LOCAL_CLOUD_DIR, "gcs", bucket, filename)
+    return f"gs://{bucket}/{filename}"
 
 
 def get_wordle_num_from_filename(filename):
     # filename in the form of folder/wordle.NUM.api.csv
-    # or folder/wordle.NUM.csv
+    # or folder/wordle.NUM.csv, with any other extension (i.e. .api.csv.gz)
     return filename.split("/")[1].split(".")[1]
 
 
@@ -25,110 +110,123 @@ def convert_bytes(size):
     return size
 
 
+# replaces user ids with anon indexes, kept in the bucket between runs, see UserIndexStore.py
 class UserCounter:
     def __init__(self, bucket_name):
-        bucket = storage.Client().get_bucket(bucket_name)
-        self.blob = bucket.get_blob("metadata/user_id_map.csv")
-        self.user_dict = {}
-        if not self.blob:
-            print("UC - creating new file")
-        else:
-            print("UC - getting from existing file")
-            with self.blob.open("r") as f:
-                next(f)  # skip header row
-                for line in f:
-                    row = line.split(",")
-                    self.user_dict[row[0]] = row[1][:-1]  # remove trailing \n
-        print(f"UC - {len(self.user_dict)} rows loaded")
+        bucket = get_storage_client().get_bucket(bucket_name)
+        self.store = UserIndexStore.bucket(bucket)
+        print(f"UC - {len(self.store)} user indexes loaded")
 
     def get_index(self, user_id):
-        if user_id not in self.user_dict:
-            count = len(self.user_dict)
-            new_index = count + 1
-            self.user_dict[user_id] = new_index
-            return new_index
+        return self.store.get_index(user_id)
 
-        return int(self.user_dict[user_id])
+    # returns the index of each user id of a column, giving new ids the next indexes
+    def get_indexes(self, user_ids):
+        return self.store.get_indexes(user_ids)
 
     def save_data(self):
-        with self.blob.open("w") as f:
-            f.write("user_id,user_index\n")
-            for key, value in self.user_dict.items():
-                f.write(str(key) + "," + str(value) + "\n")
-        print(f"UC - {len(self.user_dict)} rows saved")
-
-
-def get_surface_id(surface_string):
-    if surface_string == "Twitter for iPhone":
-        return 1
-    if surface_string == "Twitter for Android":
-        return 2
-    if surface_string == "Twitter Web App":
-        return 3
-    if surface_string == "Twitter for iPad":
-        return 4
-    if surface_string == "Tweetbot for iΟS":
-        return 5
-    if surface_string == "TweetDeck":
-        return 6
-    return 7
-
-
-def get_timestamp(time_string):
-    return datetime.strptime(time_string, "%a %b %d %H:%M:%S +0000 %Y")
-
-
-def contains_interior_win(matrix):
-    rows = [matrix[i : i + 5] for i in range(0, len(matrix), 5)]
-    try:
-        return rows.index("CCCCC") != len(rows) - 1
-    except:
+        self.store.save()
+        print(f"UC - {len(self.store)} user indexes saved")
+
+
+# prepares rows read from a day file: maps the time strings of a csv to timestamps,
+# or drops the time zone of an arrow stream, where the time column is already a timestamp
+def prepare_day_frame(df, is_arrow):
+    if is_arrow:
+        df["user_id"] = df["user_id"].astype(str)
+        df["time"] = df["time"].dt.tz_convert(None)
+    else:
+        df["time"] = parse_times(df["time"])
+    return df
+
+
+# reads the day file into a dataframe, from csv (optionally gzip or zstd compressed)
+# or from a typed arrow ipc stream
+def read_day_file(bucket, filename):
+    if filename.endswith(".arrows"):
+        with fsspec.open(get_bucket_url(bucket, filename), "rb") as f:
+            df = pa.ipc.open_stream(f).read_pandas()
+        return prepare_day_frame(df, True)
+    df = pd.read_csv(get_bucket_url(bucket, filename), dtype={2: str, 12: str})
+    return prepare_day_frame(df, False)
+
+
+# yields the rows of the day file a chunk of about chunk_rows at a time, like read_day_file
+def read_day_file_chunks(bucket, filename, chunk_rows=CONDENSE_CHUNK_ROWS):
+    url = get_bucket_url(bucket, filename)
+    if filename.endswith(".arrows"):
+        with fsspec.open(url, "rb") as f:
+            batches = []
+            for batch in pa.ipc.open_stream(f):
+                batches.append(batch)
+                if sum(len(b) for b in batches) >= chunk_rows:
+                    yield prepare_day_frame(
+                        pa.Table.from_batches(batches).to_pandas(), True
+                    )
+                    batches = []
+            if batches:
+                yield prepare_day_frame(
+                    pa.Table.from_batches(batches).to_pandas(), True
+                )
+        return
+    with pd.read_csv(url, dtype={2: str, 12: str}, chunksize=chunk_rows) as reader:
+        for df in reader:
+            yield prepare_day_frame(df, False)
+
+
+# returns the size the given start of a gzip or zstd day file decompresses to, going through
+# each of its gzip members or zstd frames (the sinks write one per flush), up to where it's cut
+def get_decompressed_size(data, filename):
+    if filename.endswith(".zst"):
+        decompressor = zstandard.ZstdDecompressor().decompressobj(
+            read_across_frames=True
+        )
+        return len(decompressor.decompress(data))
+    size = 0
+    while data:
+        decompressor = zlib.decompressobj(wbits=31)
+        size += len(decompressor.decompress(data))
+        data = decompressor.unused_data
+    return size
+
+
+# returns an estimate of the size of the day file uncompressed, from its size as stored
+# the gzip and zstd trailers only give the size of one member or frame, so instead the start
+# of the file is decompressed, and its expansion is taken to hold for the rest of the file
+def get_uncompressed_size(bucket, filename, size):
+    if not filename.endswith((".gz", ".zst")):
+        return size
+    with fsspec.open(get_bucket_url(bucket, filename), "rb") as f:
+        data = f.read(EXPANSION_SAMPLE_BYTES)
+    if len(data) == 0:
+        return 0
+    return size * get_decompressed_size(data, filename) / len(data)
+
+
+# whether the day file is big enough to be condensed and loaded in streaming mode, going by
+# its estimated size uncompressed
+def use_streaming(bucket_name, filename):
+    blob = get_storage_client().get_bucket(bucket_name).get_blob(filename)
+    if blob is None:
         return False
+    size = get_uncompressed_size(bucket_name, filename, blob.size)
+    return size > STREAM_MIN_BYTES
 
 
-# condenses individual day file
-def condense_day_file(bucket, filename):
+# condenses individual day file, recording the rows rejected by each check in the metrics
+def condense_day_file(bucket, filename, metrics):
     print(f"condensing {filename}...")
 
-    df = pd.read_csv(f"gs://{bucket}/{filename}", dtype={2: str, 12: str})
+    with metrics.stage("read"):
+        df = read_day_file(bucket, filename)
+    metrics.count("rows_read", len(df))
 
     UC = UserCounter(bucket)
 
-    # map surface string to id
-    df["surface"] = df["surface"].map(get_surface_id)
-    # map time string to timestamp
-    df["time"] = df["time"].map(get_timestamp)
-    # map user id to user anon index
-    df["user_id"] = df["user_id"].map(UC.get_index)
-
-    # add column for interior win matrices, then filter by it and drop it
-    df["contains_interior_win"] = df["matrix"].map(contains_interior_win)
-    df = df[df["contains_interior_win"] == False]
-    df.drop("contains_interior_win", axis=1, inplace=True)
-
-    # fix wins to include colorblind wins
-    df.loc[(df["colorblind"] == 1) & df["matrix"].str.endswith("CCCCC"), "win"] = 1
-    # fix lowercase x to uppercase
-    df.loc[df["rounds"] == "x", "rounds"] = "X"
-    # fix rounds for when rounds = 6 and win = 0
-    df.loc[(df["rounds"] == "6") & (df["win"] == 0), "rounds"] = "X"
-
-    # drop rows where round count != matrix length * 5
-    df["matrix_size_mismatch"] = df["matrix"].str.len() / 5 != pd.to_numeric(
-        np.where(df["rounds"] == "X", 6, df["rounds"])
-    )
-    df = df[df["matrix_size_mismatch"] == False]
-    df.drop("matrix_size_mismatch", axis=1, inplace=True)
-
-    # drop rows where round = X and win = 1, or round != X and win = 0
-    df["matrix_win_mismatch"] = ((df["win"] == 1) & (df["rounds"] == "X")) | (
-        (df["win"] == 0) & (df["rounds"] != "X")
-    )
-    df = df[df["matrix_win_mismatch"] == False]
-    df.drop("matrix_win_mismatch", axis=1, inplace=True)
-
-    # drop tweet ids
-    df.drop("tweet_id", axis=1, inplace=True)
+    # map surface and user ids, and drop the rows that fail the checks, see WordleCleaning.py
+    df, rejected = condense_rows(df, UC.get_indexes)
+    for reason, count in rejected.items():
+        metrics.count("rejected_rows", count, reason=reason)
 
     # # write data to new blob in condensed_days folder
     # df.to_csv(f"gs://{bucket}/{condensed_filename}", index=False, mode="w")
@@ -140,24 +238,84 @@ def condense_day_file(bucket, filename):
     return df
 
 
-def load_to_bq_condensed_table(dataframe, wordle_num):
-    client = bigquery.Client()
+# returns the folder of the bucket holding the condensed parquet parts of the wordle number
+def get_parts_prefix(wordle_num):
+    return f"{PARTS_FOLDER}/wordle.{wordle_num}/"
+
+
+def delete_blobs(bucket, prefix):
+    for blob in bucket.list_blobs(prefix=prefix):
+        blob.delete()
+
+
+# writes condensed rows to the bucket as a parquet part, typed like the condensed_data table
+def write_condensed_part(bucket, name, df):
+    table = pa.Table.from_pandas(df, schema=CONDENSED_PART_SCHEMA, preserve_index=False)
+    with bucket.blob(name).open("wb") as f:
+        pq.write_table(table, f)
+
+
+# streaming version of condense_day_file, which condenses the day file a chunk at a time,
+# writing each chunk to the bucket as a parquet part, so only one chunk is in memory at once
+# user ids are given indexes chunk by chunk, in order, so they are the same as condense_day_file's
+# returns the number of parts written, and the daily aggregates of the rows, summed over the chunks
+def condense_day_file_to_parts(bucket_name, filename, wordle_num, metrics):
+    print(f"condensing {filename} in chunks of {CONDENSE_CHUNK_ROWS} rows...")
+    bucket = get_storage_client().get_bucket(bucket_name)
+    prefix = get_parts_prefix(wordle_num)
+    # parts left by a run that failed before loading them
+    delete_blobs(bucket, prefix)
+
+    UC = UserCounter(bucket_name)
+    parts = 0
+    chunks = []
+    for df in read_day_file_chunks(bucket_name, filename):
+        metrics.count("rows_read", len(df))
+        df, rejected = condense_rows(df, UC.get_indexes)
+        for reason, count in rejected.items():
+            metrics.count("rejected_rows", count, reason=reason)
+        write_condensed_part(bucket, f"{prefix}part-{parts:05d}.parquet", df)
+        metrics.count("rows_written", len(df), table="condensed_parts")
+        chunks.append(aggregate_day_frame(df))
+        parts += 1
+    print(f"wrote {parts} parts to {prefix}")
+
+    UC.save_data()
+
+    if parts == 0:
+        return parts, aggregate_day_frame(
+            CONDENSED_PART_SCHEMA.empty_table().to_pandas()
+        )
+    return parts, merge_aggregates(chunks)
+
+
+# the tables are range partitioned by wordle number, one partition per day, so a day's rows
+# are replaced by a WRITE_TRUNCATE job to the table$N partition, without DML
+WORDLE_NUM_PARTITIONING = bigquery.RangePartitioning(
+    field="wordle_num",
+    range_=bigquery.PartitionRange(start=1, end=4000, interval=1),
+)
+
+
+# returns the id of the partition of a main table holding the rows of a wordle number
+def get_partition_id(table, wordle_num):
     project_id = os.environ.get("GCP_PROJECT")
+    return f"{project_id}.main.{table}${wordle_num}"
 
-    print(f"Deleting existing {wordle_num} rows in condensed data table...")
-    query = f"""
-        DELETE 
-        FROM 
-            {project_id}.main.condensed_data
-        WHERE
-            wordle_num = {wordle_num}
-    """
-    job = client.query(query)
-    print(job.result())
 
-    print("loading to condensed data table...")
-    table_id = f"{project_id}.main.condensed_data"
-    job_config = bigquery.LoadJobConfig(
+# waits for the given jobs, by name, which were all submitted before waiting so they run
+# concurrently, and records the seconds each one ran for, from its own start and end times
+def wait_for_jobs(jobs, metrics):
+    for name, job in jobs.items():
+        print(name, job.result())
+        seconds = (job.ended - job.started).total_seconds()
+        metrics.observe("bigquery_job_seconds", seconds, job=name)
+
+
+# returns the load job config of the condensed_data table, for loads of the given source format
+# the load replaces the partition of its wordle number, so loading a day again is idempotent
+def get_condensed_load_config(source_format=None):
+    return bigquery.LoadJobConfig(
         schema=[
             bigquery.SchemaField("time", "TIMESTAMP"),
             bigquery.SchemaField("user_id", "INTEGER"),
@@ -177,51 +335,105 @@ def load_to_bq_condensed_table(dataframe, wordle_num):
             bigquery.SchemaField("win", "BOOLEAN"),
             bigquery.SchemaField("matrix", "STRING"),
         ],
-        write_disposition=bigquery.WriteDisposition.WRITE_APPEND,
+        source_format=source_format,
+        write_disposition=bigquery.WriteDisposition.WRITE_TRUNCATE,
         create_disposition=bigquery.CreateDisposition.CREATE_IF_NEEDED,
-        range_partitioning=bigquery.RangePartitioning(
-            field="wordle_num",
-            range_=bigquery.PartitionRange(start=1, end=4000, interval=1),
-        ),
+        range_partitioning=WORDLE_NUM_PARTITIONING,
     )
+
+
+# submits the load of the condensed rows into the partition of the wordle number,
+# returning the job without waiting for it
+def load_to_bq_condensed_table(dataframe, wordle_num, metrics):
+    client = get_bigquery_client()
+    print("loading to condensed data table...")
+    table_id = get_partition_id("condensed_data", wordle_num)
+    job_config = get_condensed_load_config()
     job = client.load_table_from_dataframe(dataframe, table_id, job_config=job_config)
-    print(job.result())
+    metrics.count("rows_written", len(dataframe), table="condensed_data")
+    return job
+
+
+# submits the load of the condensed parquet parts of the wordle number into its partition
+# with one job, returning the job without waiting for it. main deletes the parts once it is done
+def load_parts_to_bq_condensed_table(bucket_name, parts, wordle_num, metrics):
+    if parts == 0:
+        # there are no files to load, so an empty frame replaces the partition
+        dataframe = CONDENSED_PART_SCHEMA.empty_table().to_pandas()
+        return load_to_bq_condensed_table(dataframe, wordle_num, metrics)
+    client = get_bigquery_client()
+    prefix = get_parts_prefix(wordle_num)
+    print(f"loading {parts} parts to condensed data table...")
+    table_id = get_partition_id("condensed_data", wordle_num)
+    job_config = get_condensed_load_config(bigquery.SourceFormat.PARQUET)
+    return client.load_table_from_uri(
+        f"gs://{bucket_name}/{prefix}*", table_id, job_config=job_config
+    )
 
 
-def append_to_bq_wordle_rounds_table(wordle_num):
-    print(f"Deleting existing {wordle_num} rows in Wordle rounds agg table...")
-    client = bigquery.Client()
-    project_id = os.environ.get("GCP_PROJECT")
-    query = f"""
-        DELETE 
-        FROM 
-            {project_id}.main.wordle_rounds_count
-        WHERE
-            wordle_num = {wordle_num}
-    """
-    job = client.query(query)
-    print(job.result())
-
-    print(f"Appending {wordle_num} to Wordle rounds agg table...")
-    query = f"""
-        INSERT INTO {project_id}.main.wordle_rounds_count
-        SELECT
-            wordle_num,
-            rounds,
-            COUNT(1)
-        FROM
-            {project_id}.main.condensed_data
-        WHERE
-            wordle_num = {wordle_num}
-        GROUP BY
-            1,
-            2
-    """
-    job = client.query(query)
-    print(job.result())
+# computes the rounds histogram and the daily views of condensed rows in memory, by name,
+# see WordleAggregate.py
+def aggregate_day_frame(df):
+    return aggregate_frame(df, ["wordle_rounds_count"] + DAILY_VIEWS)
+
+
+# returns the daily views as one frame of the daily_aggregates table, typed like it
+def get_daily_aggregates_frame(aggregates):
+    frames = [aggregates[name].assign(view=name) for name in DAILY_VIEWS]
+    df = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+    df = df.reindex(columns=[field.name for field in DAILY_AGGREGATES_SCHEMA])
+    return df.astype(
+        {field.name: BQ_DTYPES[field.field_type] for field in DAILY_AGGREGATES_SCHEMA}
+    )
+
+
+# returns the load job config of an aggregate table, replacing the partition of a wordle number
+# columns of new views are added to the table by the load
+def get_aggregate_load_config(schema):
+    return bigquery.LoadJobConfig(
+        schema=schema,
+        write_disposition=bigquery.WriteDisposition.WRITE_TRUNCATE,
+        create_disposition=bigquery.CreateDisposition.CREATE_IF_NEEDED,
+        range_partitioning=WORDLE_NUM_PARTITIONING,
+        schema_update_options=[bigquery.SchemaUpdateOption.ALLOW_FIELD_ADDITION],
+    )
+
+
+# submits the loads of the daily aggregates into the partitions of the wordle number: the
+# rounds histogram to the Wordle rounds agg table, and every other view to daily_aggregates
+# with one job. returns the jobs by name, without waiting for them
+def load_to_bq_aggregate_tables(aggregates, wordle_num, metrics):
+    print(f"Replacing {wordle_num} in aggregate tables...")
+    client = get_bigquery_client()
+    jobs = {}
+    rounds = aggregates["wordle_rounds_count"]
+    job_config = get_aggregate_load_config(
+        [
+            bigquery.SchemaField("wordle_num", "INTEGER"),
+            bigquery.SchemaField("rounds", "STRING"),
+            bigquery.SchemaField("count", "INTEGER"),
+        ]
+    )
+    jobs["load_rounds"] = client.load_table_from_dataframe(
+        rounds,
+        get_partition_id("wordle_rounds_count", wordle_num),
+        job_config=job_config,
+    )
+    metrics.count("rows_written", len(rounds), table="wordle_rounds_count")
+    if DAILY_VIEWS:
+        df = get_daily_aggregates_frame(aggregates)
+        job_config = get_aggregate_load_config(DAILY_AGGREGATES_SCHEMA)
+        jobs["load_aggregates"] = client.load_table_from_dataframe(
+            df, get_partition_id("daily_aggregates", wordle_num), job_config=job_config
+        )
+        metrics.count("rows_written", len(df), table="daily_aggregates")
+    return jobs
 
 
 def trigger_github_download_workflow(wordle_num):
+    if LOCAL_CLOUD_DIR:
+        print("Running locally, not triggering github download workflow")
+        return
     print("Triggering github download workflow...")
     pat = os.environ.get("GITHUB_PAT")
     res = requests.post(
@@ -236,6 +448,14 @@ def trigger_github_download_workflow(wordle_num):
     print(res.status_code, res.reason, res.__dict__)
 
 
+# saves the metrics of the run to the metrics folder of the bucket
+def save_metrics(bucket_name, wordle_num, metrics):
+    filename = os.path.basename(get_metrics_file_path(f"wordle.{wordle_num}.compile"))
+    bucket = get_storage_client().bucket(bucket_name)
+    bucket.blob("metrics/" + filename).upload_from_string(metrics.serialize(filename))
+    print(f"Metrics saved to metrics/{filename}")
+
+
 def main(event, context):
     """Triggered by a change to a Cloud Storage bucket.
     Args:
@@ -255,15 +475,51 @@ def main(event, context):
     print(json.dumps(event))
     print(json.dumps(context.__dict__))
     wordle_num = get_wordle_num_from_filename(filename)
+    metrics = PipelineMetrics("compile")
 
-    # condense day data as a dataframe
-    df = condense_day_file(bucket, filename)
-    # write condensed data to bigquery main table
-    load_to_bq_condensed_table(df, wordle_num)
-    # append to wordle rounds aggregate table
-    append_to_bq_wordle_rounds_table(wordle_num)
-    # trigger github download workflow
-    trigger_github_download_workflow(wordle_num)
-
-    process = psutil.Process(os.getpid())
-    print("mem", convert_bytes(process.memory_info().rss))
+    try:
+        if use_streaming(bucket, filename):
+            # condense day data a chunk at a time, into parquet parts in the bucket,
+            # aggregating each chunk as it goes
+            with metrics.stage("condense"):
+                parts, aggregates = condense_day_file_to_parts(
+                    bucket, filename, wordle_num, metrics
+                )
+            # load the parts and the aggregates to the partitions of the day in bigquery,
+            # with the jobs running concurrently
+            with metrics.stage("load"):
+                jobs = {
+                    "load_condensed": load_parts_to_bq_condensed_table(
+                        bucket, parts, wordle_num, metrics
+                    ),
+                    **load_to_bq_aggregate_tables(aggregates, wordle_num, metrics),
+                }
+                wait_for_jobs(jobs, metrics)
+                delete_blobs(
+                    get_storage_client().get_bucket(bucket),
+                    get_parts_prefix(wordle_num),
+                )
+        else:
+            # condense day data as a dataframe
+            with metrics.stage("condense"):
+                df = condense_day_file(bucket, filename, metrics)
+            # compute the daily aggregates from the condensed rows in memory
+            with metrics.stage("aggregate"):
+                aggregates = aggregate_day_frame(df)
+            # load condensed data and the aggregates to the partitions of the day in bigquery,
+            # with the jobs running concurrently
+            with metrics.stage("load"):
+                jobs = {
+                    "load_condensed": load_to_bq_condensed_table(
+                        df, wordle_num, metrics
+                    ),
+                    **load_to_bq_aggregate_tables(aggregates, wordle_num, metrics),
+                }
+                wait_for_jobs(jobs, metrics)
+        # trigger github download workflow
+        with metrics.stage("trigger"):
+            trigger_github_download_workflow(wordle_num)
+    finally:
+        save_metrics(bucket, wordle_num, metrics)
+
+    print("peak mem", convert_bytes(get_peak_rss()))
@@ -1,24 +1,201 @@
 import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+import pandas as pd
 import pandas_gbq
+from LocalCloud import LocalBigQueryClient
+from WordleAggregate import AGGREGATES, DAILY_VIEWS, VIEW_DTYPES, get_aggregate_columns
 
+# Downloads the views of the BigQuery summary tables to data_views/<name>.csv.
+# Given the wordle numbers that changed (the download workflow passes the one the Cloud Function
+# just loaded), only their rows are fetched, and they replace the rows of those numbers in the
+# existing csv, so the download stays the same size as history grows. The views are sorted by
+# wordle number first, so the result is the same as a full refresh. Without numbers, or for a
+# view with no csv yet, the whole view is fetched.
+# Rows missed by a download that failed or was skipped are caught up too: the total count of
+# each of the last STALE_CHECK_NUMBERS numbers of the csv and any newer ones is queried first,
+# and every number whose rows in the csv don't add up to it (or that is only in one of them)
+# is fetched again with the given ones. As the tables are partitioned by wordle number, the
+# check reads the same few partitions whatever the size of history. With "reconcile", every
+# number of the view is checked instead.
 
-def get_wordle_rounds_count_data():
-    project_id = os.environ.get("GCP_PROJECT")
-    query = f"""
+# set to a local directory to query the file-backed BigQuery stand-in instead
+LOCAL_CLOUD_DIR = os.environ.get("WORDLE_LOCAL_CLOUD_DIR")
+VIEWS_FOLDER = "data_views"
+# queries run at once
+VIEW_QUERY_WORKERS = 8
+# the last wordle numbers of a csv checked for missed rows, along with any newer numbers
+STALE_CHECK_NUMBERS = 30
+# if more than this fraction of the wordle numbers of a csv are out of date, the whole view
+# is fetched instead
+STALE_FULL_REFRESH = 0.5
+
+# the views downloaded, with the table each one is read from, see GCPCompileFiles.py
+# the daily views share the daily_aggregates table, with their rows named by its view column
+VIEWS = {
+    "wordle_rounds_count": "wordle_rounds_count",
+    **{name: "daily_aggregates" for name in DAILY_VIEWS},
+}
+
+
+def read_query(query, project_id):
+    if LOCAL_CLOUD_DIR:
+        return LocalBigQueryClient(LOCAL_CLOUD_DIR).query(query).to_dataframe()
+    return pandas_gbq.read_gbq(query, project_id=project_id)
+
+
+# returns the WHERE clause of the rows of a view, for the given wordle numbers or all of them,
+# and only from the given first number on
+def get_view_where(name, wordle_nums=None, first_num=None):
+    conditions = []
+    if VIEWS[name] == "daily_aggregates":
+        conditions.append(f"view = '{name}'")
+    if wordle_nums is not None:
+        conditions.append(f"wordle_num IN ({', '.join(map(str, wordle_nums))})")
+    if first_num is not None:
+        conditions.append(f"wordle_num >= {first_num}")
+    return f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+
+# returns the query of a view, for the given wordle numbers or the whole view
+def get_view_query(name, project_id, wordle_nums=None):
+    return f"""
       SELECT
-        * 
-      FROM `{project_id}.main.wordle_rounds_count`
+        {', '.join(get_aggregate_columns(name))}
+      FROM `{project_id}.main.{VIEWS[name]}`
+      {get_view_where(name, wordle_nums)}
       ORDER BY
-        wordle_num, rounds
+        {', '.join(["wordle_num"] + AGGREGATES[name])}
+    """
+
+
+# returns the query of the total count of each wordle number of a view, from the given first
+# number on, or of every number
+def get_totals_query(name, project_id, first_num=None):
+    return f"""
+      SELECT
+        wordle_num, SUM(count) AS count
+      FROM `{project_id}.main.{VIEWS[name]}`
+      {get_view_where(name, first_num=first_num)}
+      GROUP BY
+        wordle_num
     """
 
-    df = pandas_gbq.read_gbq(query, project_id=project_id)
 
-    Path("data_views/").mkdir(exist_ok=True)
+# returns the wordle numbers whose rows in the existing view don't add up to the total count
+# of the number in BigQuery, or that are only in one of them, out of the last
+# STALE_CHECK_NUMBERS numbers of the existing view and any newer ones, or every number
+def get_stale_wordle_nums(name, project_id, existing, reconcile=False):
+    first_num = None
+    if not reconcile:
+        first_num = int(existing["wordle_num"].max()) - STALE_CHECK_NUMBERS + 1
+        existing = existing[existing["wordle_num"] >= first_num]
+    totals = read_query(get_totals_query(name, project_id, first_num), project_id)
+    both = pd.concat(
+        [
+            existing.groupby("wordle_num")["count"].sum().astype("int64"),
+            totals.set_index("wordle_num")["count"].astype("int64"),
+        ],
+        axis=1,
+        keys=["csv", "view"],
+    )
+    stale = both.index[both["csv"].fillna(-1) != both["view"].fillna(-1)]
+    return sorted(int(wordle_num) for wordle_num in stale)
+
+
+def get_view_path(name):
+    return os.path.join(VIEWS_FOLDER, name + ".csv")
+
+
+# returns the view frame typed by VIEW_DTYPES, so it's written the same whichever rows are in it
+def set_view_dtypes(df):
+    return df.astype({column: VIEW_DTYPES[column] for column in df.columns})
+
+
+# returns the existing view, with the rows of the given wordle numbers replaced by the new rows
+# both are sorted by wordle number first, so a stable sort by number keeps each number's rows
+# in the order of the query
+def merge_view(existing, rows, wordle_nums):
+    kept = existing[~existing["wordle_num"].isin(wordle_nums)]
+    df = pd.concat([kept, rows], ignore_index=True)
+    return df.sort_values("wordle_num", kind="stable", ignore_index=True)
+
+
+# downloads a view, only the rows of the given wordle numbers and of any numbers out of date in
+# its csv if it has one already, and writes it to its csv. returns the number of rows fetched
+# with reconcile, every number of the csv is checked, rather than the last ones
+def download_view(name, project_id, wordle_nums=None, reconcile=False):
+    path = get_view_path(name)
+    if wordle_nums is not None and not os.path.exists(path):
+        print(f"{name} has no csv yet, fetching all of it")
+        wordle_nums = None
+    if wordle_nums is not None:
+        existing = pd.read_csv(path, dtype=VIEW_DTYPES)
+    if wordle_nums is not None and len(existing) == 0:
+        print(f"{name} has an empty csv, fetching all of it")
+        wordle_nums = None
+    if wordle_nums is not None:
+        stale = get_stale_wordle_nums(name, project_id, existing, reconcile)
+        if len(stale) > STALE_FULL_REFRESH * existing["wordle_num"].nunique():
+            print(
+                f"{name} has {len(stale)} wordle numbers out of date, fetching all of it"
+            )
+            wordle_nums = None
+        elif stale:
+            print(
+                f"{name} has {len(stale)} wordle numbers out of date, fetching them too"
+            )
+            wordle_nums = sorted(set(wordle_nums) | set(stale))
+    rows = set_view_dtypes(
+        read_query(get_view_query(name, project_id, wordle_nums), project_id)
+    )
+    df = rows
+    if wordle_nums is not None:
+        df = merge_view(existing, rows, wordle_nums)
+    df.to_csv(path, index=False)
+    return len(rows)
+
+
+# downloads every view, with the queries running concurrently
+def download_views(wordle_nums=None, names=VIEWS, reconcile=False):
+    project_id = os.environ.get("GCP_PROJECT")
+    Path(VIEWS_FOLDER).mkdir(exist_ok=True)
+    a = time.time()
+    with ThreadPoolExecutor(VIEW_QUERY_WORKERS) as executor:
+        futures = {
+            name: executor.submit(
+                download_view, name, project_id, wordle_nums, reconcile
+            )
+            for name in names
+        }
+        for name, future in futures.items():
+            print(f"{name}: fetched {future.result()} rows")
+    print(f"downloaded {len(futures)} views in {time.time() - a:.2f}s")
+
+
+# returns the wordle numbers of a comma separated list of numbers and ranges, i.e. 300-309,312
+def parse_wordle_nums(arg):
+    nums = []
+    for part in arg.split(","):
+        first, _, last = part.partition("-")
+        nums += range(int(first), int(last or first) + 1)
+    return sorted(set(nums))
+
 
-    df.to_csv("data_views/wordle_rounds_count.csv", index=False)
+# usage: python3 scripts/GHQueryForViewData.py [wordle nums] [reconcile]
+# with wordle numbers (i.e. 400, or 300-309,312) only their rows are fetched and merged into
+# the existing csvs, and without any, every view is fetched in full
+# with "reconcile", every number of the csvs is checked for missed rows, not just the last ones
+def main():
+    args = [arg for arg in sys.argv[1:] if arg != "reconcile"]
+    arg = args[0] if args else ""
+    download_views(
+        parse_wordle_nums(arg) if arg.strip() else None,
+        reconcile="reconcile" in sys.argv[1:],
+    )
 
 
 if __name__ == "__main__":
-    get_wordle_rounds_count_data()
+    main()
@@ -0,0 +1,346 @@
+import glob
+import json
+import os
+import re
+import shutil
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+import pandas as pd
+import pyarrow.parquet as pq
+
+# Local, file-backed stand-ins for the parts of Google Cloud Storage and BigQuery
+# used by GCPCompileFiles.py and GHQueryForViewData.py, so the pipeline can run with no network.
+# Both scripts switch to them when WORDLE_LOCAL_CLOUD_DIR is set to a local directory:
+# buckets are folders under <dir>/gcs/, and the warehouse is a sqlite file at <dir>/bigquery.sqlite
+
+# tables of the main dataset, created when the local warehouse is first opened
+LOCAL_TABLES = [
+    """
+    CREATE TABLE IF NOT EXISTS condensed_data (
+        time TIMESTAMP,
+        user_id INTEGER,
+        surface INTEGER,
+        is_reply BOOLEAN,
+        is_quote BOOLEAN,
+        retweets INTEGER,
+        quotes INTEGER,
+        favs INTEGER,
+        replies INTEGER,
+        language TEXT,
+        wordle_num INTEGER,
+        rounds TEXT,
+        hard BOOLEAN,
+        theme TEXT,
+        colorblind BOOLEAN,
+        win BOOLEAN,
+        matrix TEXT
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS wordle_rounds_count (
+        wordle_num INTEGER,
+        rounds TEXT,
+        count INTEGER
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS daily_aggregates (
+        view TEXT,
+        wordle_num INTEGER,
+        rounds TEXT,
+        hard BOOLEAN,
+        theme TEXT,
+        colorblind BOOLEAN,
+        surface INTEGER,
+        language TEXT,
+        hour INTEGER,
+        first_pattern TEXT,
+        pattern TEXT,
+        guess INTEGER,
+        greens INTEGER,
+        yellows INTEGER,
+        next_greens INTEGER,
+        next_yellows INTEGER,
+        count INTEGER,
+        wins INTEGER
+    )
+    """,
+]
+
+# the column each table of the main dataset is range partitioned on, one partition per value,
+# so a write to table$N with WRITE_TRUNCATE only replaces the rows where it equals N
+LOCAL_PARTITION_FIELDS = {
+    "condensed_data": "wordle_num",
+    "wordle_rounds_count": "wordle_num",
+    "daily_aggregates": "wordle_num",
+}
+# threads running the submitted jobs of a client
+LOCAL_JOB_WORKERS = 4
+
+
+class LocalBlob:
+    def __init__(self, bucket, name):
+        self.bucket = bucket
+        self.name = name
+        self.path = os.path.join(bucket.path, name)
+
+    def exists(self):
+        return os.path.exists(self.path)
+
+    @property
+    def size(self):
+        return os.path.getsize(self.path)
+
+    def open(self, mode="r"):
+        if "r" not in mode:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        return open(self.path, mode)
+
+    def upload_from_filename(self, filename):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        shutil.copyfile(filename, self.path)
+
+    def upload_from_string(self, data):
+        with self.open("wb") as f:
+            f.write(data.encode() if isinstance(data, str) else data)
+
+    def download_as_bytes(self):
+        with self.open("rb") as f:
+            return f.read()
+
+    def delete(self):
+        os.remove(self.path)
+
+
+class LocalBucket:
+    def __init__(self, root, name):
+        self.name = name
+        self.path = os.path.join(root, "gcs", name)
+
+    def blob(self, name):
+        return LocalBlob(self, name)
+
+    # returns the blob if it exists, or None, like the GCS client
+    def get_blob(self, name):
+        blob = LocalBlob(self, name)
+        return blob if blob.exists() else None
+
+    def list_blobs(self, prefix=""):
+        blobs = []
+        for folder, _, filenames in os.walk(self.path):
+            for filename in filenames:
+                name = os.path.relpath(os.path.join(folder, filename), self.path)
+                if name.startswith(prefix):
+                    blobs.append(LocalBlob(self, name))
+        return sorted(blobs, key=lambda blob: blob.name)
+
+
+class LocalStorageClient:
+    def __init__(self, root):
+        self.root = root
+
+    def bucket(self, name):
+        return LocalBucket(self.root, name)
+
+    def get_bucket(self, name):
+        return LocalBucket(self.root, name)
+
+
+# returns the given BigQuery SQL rewritten for sqlite, i.e. `project.main.table` -> main.table
+def translate_query(query):
+    return re.sub(r"`?[\w-]+\.main\.(\w+)`?", r"main.\1", query)
+
+
+# returns the table name and the partition (or None) of a table id or reference,
+# i.e. project.main.condensed_data$400 -> condensed_data, 400
+def parse_table_id(table_id):
+    table_id = getattr(table_id, "table_id", table_id)
+    table, _, partition = table_id.split(".")[-1].partition("$")
+    return table, int(partition) if partition else None
+
+
+# yields the rows of each parquet file as a frame, with times stored like the naive UTC times
+# of load_table_from_dataframe
+def read_parquet_files(paths):
+    for path in paths:
+        dataframe = pq.read_table(path).to_pandas()
+        for column in dataframe.columns:
+            if isinstance(dataframe[column].dtype, pd.DatetimeTZDtype):
+                dataframe[column] = dataframe[column].dt.tz_convert(None)
+        yield dataframe
+
+
+# a job of the local warehouse, run in the background once submitted
+# like a BigQuery job, result() waits for it to finish and raises any error it failed with,
+# and started and ended are the UTC datetimes it ran between, once it has
+class LocalJob:
+    def __init__(self):
+        self.future = None
+        self.started = None
+        self.ended = None
+
+    def result(self):
+        return self.future.result()[1]
+
+    def done(self):
+        return self.future.done()
+
+    def to_dataframe(self):
+        columns, rows = self.future.result()
+        return pd.DataFrame(rows, columns=columns)
+
+
+# runs queries and load jobs against a sqlite file, and logs every job issued
+# jobs run in a pool of threads, so jobs submitted together run concurrently, although the
+# writes of each one are serialized by the lock
+class LocalBigQueryClient:
+    lock = threading.Lock()
+    executor = ThreadPoolExecutor(LOCAL_JOB_WORKERS)
+
+    def __init__(self, root):
+        os.makedirs(root, exist_ok=True)
+        self.root = root
+        self.path = os.path.join(root, "bigquery.sqlite")
+        self.jobs_path = os.path.join(root, "bigquery_jobs.jsonl")
+        with self.connect() as conn:
+            for statement in LOCAL_TABLES:
+                conn.execute(statement)
+
+    def connect(self):
+        return sqlite3.connect(self.path)
+
+    # logs a job once it is done, with the times it was submitted, started and finished
+    def log_job(self, job_type, submitted, started, error=None, **details):
+        record = {
+            "time": submitted,
+            "started": started,
+            "finished": time.time(),
+            "type": job_type,
+            **details,
+        }
+        if error is not None:
+            record["error"] = repr(error)
+        with self.lock, open(self.jobs_path, "a") as f:
+            f.write(json.dumps(record) + "\n")
+
+    # runs the function of a job in the background, returning (columns, rows) of its result
+    def submit(self, job_type, function, **details):
+        submitted = time.time()
+        job = LocalJob()
+
+        def run():
+            started = time.time()
+            job.started = datetime.fromtimestamp(started, timezone.utc)
+            try:
+                result = function()
+            except Exception as e:
+                self.log_job(job_type, submitted, started, error=e, **details)
+                raise
+            finally:
+                job.ended = datetime.now(timezone.utc)
+            self.log_job(job_type, submitted, started, **details)
+            return result
+
+        job.future = self.executor.submit(run)
+        return job
+
+    # adds the columns of the frame that the table doesn't have, like ALLOW_FIELD_ADDITION,
+    # or else fails like BigQuery does
+    def add_columns(self, conn, table, dataframe, allow_field_addition):
+        existing = {row[1] for row in conn.execute(f"PRAGMA main.table_info({table})")}
+        for column in dataframe.columns:
+            if column not in existing:
+                if not allow_field_addition:
+                    raise Exception("no such field in table", table, column)
+                conn.execute(f"ALTER TABLE main.{table} ADD COLUMN {column}")
+
+    # writes frames to a table, replacing the whole table, or with a table$N id only the
+    # partition N, for WRITE_TRUNCATE. like BigQuery, rows outside the partition are an error,
+    # and as the writes are one transaction, an error leaves the table as it was
+    def write_frames(self, conn, frames, table_id, job_config):
+        table, partition = parse_table_id(table_id)
+        write_disposition = getattr(job_config, "write_disposition", None)
+        allow_field_addition = "ALLOW_FIELD_ADDITION" in (
+            getattr(job_config, "schema_update_options", None) or []
+        )
+        field = LOCAL_PARTITION_FIELDS.get(table)
+        if write_disposition == "WRITE_TRUNCATE":
+            if partition is None:
+                conn.execute(f"DELETE FROM main.{table}")
+            else:
+                conn.execute(
+                    f"DELETE FROM main.{table} WHERE {field} = ?", (partition,)
+                )
+        for dataframe in frames:
+            if partition is not None and (dataframe[field] != partition).any():
+                raise Exception("rows outside of partition", table_id)
+            self.add_columns(conn, table, dataframe, allow_field_addition)
+            dataframe.to_sql(table, conn, if_exists="append", index=False)
+
+    # runs a query, writing its rows to the destination table of the job config, if any
+    def query(self, query, job_config=None):
+        destination = getattr(job_config, "destination", None)
+        write_disposition = getattr(job_config, "write_disposition", None)
+
+        def run():
+            with self.lock, self.connect() as conn:
+                cursor = conn.execute(translate_query(query))
+                if cursor.description is None:
+                    return None, None
+                columns = [column[0] for column in cursor.description]
+                rows = cursor.fetchall()
+                if destination is not None:
+                    dataframe = pd.DataFrame(rows, columns=columns)
+                    self.write_frames(conn, [dataframe], destination, job_config)
+                return columns, rows
+
+        details = {"query": query}
+        if destination is not None:
+            details["destination"] = getattr(destination, "table_id", destination)
+            details["write_disposition"] = write_disposition
+        return self.submit("query", run, **details)
+
+    def load_table_from_dataframe(self, dataframe, table_id, job_config=None):
+        write_disposition = getattr(job_config, "write_disposition", None)
+
+        def run():
+            with self.lock, self.connect() as conn:
+                self.write_frames(conn, [dataframe], table_id, job_config)
+            return None, None
+
+        return self.submit(
+            "load",
+            run,
+            table=table_id,
+            rows=len(dataframe),
+            write_disposition=write_disposition,
+        )
+
+    # loads parquet files from the local buckets, given gs://bucket/name uris,
+    # where names can have a * wildcard like in BigQuery
+    def load_table_from_uri(self, source_uris, table_id, job_config=None):
+        uris = [source_uris] if isinstance(source_uris, str) else source_uris
+        paths = []
+        for uri in uris:
+            bucket, _, name = uri[len("gs://") :].partition("/")
+            paths += sorted(glob.glob(os.path.join(self.root, "gcs", bucket, name)))
+        write_disposition = getattr(job_config, "write_disposition", None)
+
+        def run():
+            if len(paths) == 0:
+                raise Exception("no files match the source uris", uris)
+            with self.lock, self.connect() as conn:
+                self.write_frames(conn, read_parquet_files(paths), table_id, job_config)
+            return None, None
+
+        return self.submit(
+            "load",
+            run,
+            table=table_id,
+            uris=uris,
+            files=len(paths),
+            write_disposition=write_disposition,
+        )
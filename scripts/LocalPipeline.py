@@ -0,0 +1,126 @@
+import glob
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from LocalCloud import LocalStorageClient
+from TwitterStubServer import StubServer, RateLimit, Recording
+
+# Runs the full scrape -> condense -> aggregate -> view flow with no network, and times each stage.
+# The search API is served by TwitterStubServer.py (generated tweets, or a replayed recording),
+# and GCS/BigQuery are replaced by the file-backed stand-ins in LocalCloud.py.
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+BUCKET = "wordle-twitter-data-main"
+
+
+# runs the given python script args as a subprocess, returning its wall time
+def run_stage(name, args, cwd, env):
+    print(f"--- {name} ---")
+    a = time.time()
+    subprocess.run([sys.executable] + args, cwd=cwd, env=env, check=True)
+    b = time.time()
+    return b - a
+
+
+def run_pipeline(work_dir, wordle_num, recording=None, time_scale=1):
+    work_dir = os.path.abspath(work_dir)
+    cloud_dir = os.path.join(work_dir, "cloud")
+    os.makedirs(cloud_dir, exist_ok=True)
+
+    if recording is not None:
+        server = StubServer(
+            ("localhost", 0), None, None, Recording(recording, time_scale)
+        )
+    else:
+        server = StubServer(("localhost", 0), RateLimit(100000, 15 * 60), 10000)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    port = server.server_address[1]
+
+    env = dict(
+        os.environ,
+        BEARER_TOKEN="local",
+        TWITTER_SEARCH_URL=f"http://localhost:{port}/1.1/search/tweets.json",
+        WORDLE_LOCAL_CLOUD_DIR=cloud_dir,
+        GCP_PROJECT="local",
+        GITHUB_ENV=os.path.join(work_dir, "github_env"),
+        PYTHONPATH=SCRIPTS_DIR,
+    )
+    timings = {}
+
+    # scrape the day's tweets from scratch
+    for filename in glob.glob(os.path.join(work_dir, f"wordle.{wordle_num}.api.*")):
+        os.remove(filename)
+    timings["scrape"] = run_stage(
+        "scrape",
+        [
+            os.path.join(SCRIPTS_DIR, "WordleTwitterAPIScrape.py"),
+            str(wordle_num),
+            "github",
+            "sharded",
+            "csv.gz",
+        ],
+        work_dir,
+        env,
+    )
+
+    # upload the day file to the local bucket, like the fetch workflow does
+    a = time.time()
+    filename = f"wordle.{wordle_num}.api.csv.gz"
+    bucket = LocalStorageClient(cloud_dir).bucket(BUCKET)
+    bucket.blob("day_files/" + filename).upload_from_filename(
+        os.path.join(work_dir, filename)
+    )
+    timings["upload"] = time.time() - a
+
+    # condense, load and aggregate, like the cloud function does when triggered by the upload
+    event = {"bucket": BUCKET, "name": "day_files/" + filename}
+    timings["compile"] = run_stage(
+        "compile",
+        [
+            "-c",
+            "import types, GCPCompileFiles; "
+            f"GCPCompileFiles.main({event!r}, types.SimpleNamespace())",
+        ],
+        work_dir,
+        env,
+    )
+
+    # download the views of the wordle number, like the download workflow does
+    timings["views"] = run_stage(
+        "views",
+        [os.path.join(SCRIPTS_DIR, "GHQueryForViewData.py"), str(wordle_num)],
+        work_dir,
+        env,
+    )
+
+    # export the dashboard artifacts of the views
+    timings["dashboard"] = run_stage(
+        "dashboard",
+        [os.path.join(SCRIPTS_DIR, "WordleDashboard.py")],
+        work_dir,
+        env,
+    )
+
+    server.shutdown()
+    print("--- timings ---")
+    for stage, seconds in timings.items():
+        print(f"{stage}: {seconds:.2f}s")
+    with open(os.path.join(work_dir, "timings.json"), "w") as f:
+        json.dump(timings, f, indent=2)
+    return timings
+
+
+# usage: python3 scripts/LocalPipeline.py <work dir> <wordle num> [recording.jsonl] [time scale]
+def main():
+    work_dir = sys.argv[1]
+    wordle_num = int(sys.argv[2])
+    recording = sys.argv[3] if len(sys.argv) > 3 else None
+    time_scale = float(sys.argv[4]) if len(sys.argv) > 4 else 1
+    run_pipeline(work_dir, wordle_num, recording, time_scale)
+
+
+if __name__ == "__main__":
+    main()
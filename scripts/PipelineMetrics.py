@@ -0,0 +1,211 @@
+import json
+import os
+import resource
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+# Lightweight metrics for one run of a pipeline script (scrape, compile or the cloud function).
+# Counters and histograms can be labeled, i.e. metrics.count("rejected_tweets", 3, reason="text"),
+# and stages record their wall time and the peak RSS of the process when they end.
+# At the end of the run the metrics are written to a JSON file, or a Prometheus text file
+# if the path ends in .prom, so runs can be compared from day to day.
+
+# histogram bucket upper bounds, in seconds for timers
+SECONDS_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60]
+# histogram bucket upper bounds for counts, i.e. tweets per page
+COUNT_BUCKETS = [0, 1, 5, 10, 25, 50, 75, 100]
+# prefix of every metric name in Prometheus text format
+PROMETHEUS_PREFIX = "wordle_"
+
+
+# returns the peak resident set size of the process so far, in bytes
+# on linux it's read from VmHWM, which starts over when a process is started with exec,
+# unlike ru_maxrss, which keeps the peak of the process that started it
+def get_peak_rss():
+    if sys.platform.startswith("linux"):
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # linux reports kilobytes, mac reports bytes
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+# returns the key a labeled metric is kept under
+def get_key(name, labels):
+    return (name, tuple(sorted(labels.items())))
+
+
+# returns a labeled metric key in Prometheus text form, i.e. wordle_calls{status="200"}
+def get_prometheus_name(key, suffix="", extra_labels=()):
+    name, labels = key
+    labels = list(labels) + list(extra_labels)
+    text = PROMETHEUS_PREFIX + name + suffix
+    if len(labels) != 0:
+        text += "{" + ",".join(f'{k}="{v}"' for k, v in labels) + "}"
+    return text
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.bucket_counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0
+
+    def observe(self, value):
+        self.count += 1
+        self.sum += value
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.bucket_counts[i] += 1
+                break
+
+    def to_dict(self):
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "mean": self.sum / self.count if self.count else None,
+            "buckets": dict(zip(map(str, self.buckets), self.bucket_counts)),
+        }
+
+
+# the metrics of one run, safe to record from many threads at once
+class PipelineMetrics:
+    def __init__(self, run):
+        self.run = run
+        self.start = time.time()
+        self.counters = {}
+        self.gauges = {}
+        self.histograms = {}
+        self.stages = {}
+        self.lock = threading.Lock()
+
+    # adds the value to a counter
+    def count(self, name, value=1, **labels):
+        key = get_key(name, labels)
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    # sets a gauge to the value
+    def set(self, name, value, **labels):
+        with self.lock:
+            self.gauges[get_key(name, labels)] = value
+
+    # adds the value to a histogram, with seconds buckets unless others are given
+    def observe(self, name, value, buckets=SECONDS_BUCKETS, **labels):
+        key = get_key(name, labels)
+        with self.lock:
+            if key not in self.histograms:
+                self.histograms[key] = Histogram(buckets)
+            self.histograms[key].observe(value)
+
+    # times the wrapped block into a histogram of seconds
+    @contextmanager
+    def timer(self, name, **labels):
+        a = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - a, **labels)
+
+    # times the wrapped block as a stage of the run, along with the peak RSS at its end
+    # a stage run more than once (i.e. per day file) adds up its time
+    @contextmanager
+    def stage(self, name):
+        a = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - a
+            with self.lock:
+                stage = self.stages.setdefault(name, {"seconds": 0, "runs": 0})
+                stage["seconds"] += seconds
+                stage["runs"] += 1
+                stage["peak_rss_bytes"] = get_peak_rss()
+
+    def to_dict(self):
+        with self.lock:
+            return {
+                "run": self.run,
+                "start": self.start,
+                "seconds": time.time() - self.start,
+                "peak_rss_bytes": get_peak_rss(),
+                "stages": {name: dict(stage) for name, stage in self.stages.items()},
+                "counters": [
+                    {"name": name, "labels": dict(labels), "value": value}
+                    for (name, labels), value in self.counters.items()
+                ],
+                "gauges": [
+                    {"name": name, "labels": dict(labels), "value": value}
+                    for (name, labels), value in self.gauges.items()
+                ],
+                "histograms": [
+                    {"name": name, "labels": dict(labels), **histogram.to_dict()}
+                    for (name, labels), histogram in self.histograms.items()
+                ],
+            }
+
+    def to_json(self):
+        return json.dumps(self.to_dict(), indent=2)
+
+    def to_prometheus(self):
+        run = (("run", self.run),)
+        lines = [
+            get_prometheus_name(("run_seconds", run)) + f" {time.time() - self.start}",
+            get_prometheus_name(("peak_rss_bytes", run)) + f" {get_peak_rss()}",
+        ]
+        with self.lock:
+            for name, stage in self.stages.items():
+                key = ("stage_seconds", run + (("stage", name),))
+                lines.append(get_prometheus_name(key) + f" {stage['seconds']}")
+                key = ("stage_peak_rss_bytes", run + (("stage", name),))
+                lines.append(get_prometheus_name(key) + f" {stage['peak_rss_bytes']}")
+            for (name, labels), value in self.counters.items():
+                key = (name, run + labels)
+                lines.append(get_prometheus_name(key, "_total") + f" {value}")
+            for (name, labels), value in self.gauges.items():
+                lines.append(get_prometheus_name((name, run + labels)) + f" {value}")
+            for (name, labels), histogram in self.histograms.items():
+                key = (name, run + labels)
+                cumulative = 0
+                for bound, count in zip(histogram.buckets, histogram.bucket_counts):
+                    cumulative += count
+                    le = (("le", bound),)
+                    lines.append(
+                        get_prometheus_name(key, "_bucket", le) + f" {cumulative}"
+                    )
+                le = (("le", "+Inf"),)
+                lines.append(
+                    get_prometheus_name(key, "_bucket", le) + f" {histogram.count}"
+                )
+                lines.append(get_prometheus_name(key, "_sum") + f" {histogram.sum}")
+                lines.append(get_prometheus_name(key, "_count") + f" {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    # returns the metrics as JSON, or as Prometheus text for a .prom filename
+    def serialize(self, filename):
+        if filename.endswith(".prom"):
+            return self.to_prometheus()
+        return self.to_json()
+
+    # writes the metrics to the given file
+    def write(self, path):
+        folder = os.path.dirname(path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        with open(path, "w") as f:
+            f.write(self.serialize(path))
+        print("Metrics written to", path)
+
+
+# returns the metrics file path for a run, from WORDLE_METRICS_FILE if set
+# {run} in that path is replaced by the run name, so one setting can serve every script
+def get_metrics_file_path(run, default_folder="data/metrics"):
+    path = os.environ.get("WORDLE_METRICS_FILE")
+    if path:
+        return path.replace("{run}", run)
+    return os.path.join(default_folder, run + ".json")
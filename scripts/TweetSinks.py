@@ -0,0 +1,189 @@
+import csv
+import gzip
+import io
+import os
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import zstandard
+from WordleTweetParser import TWEET_FIELDS
+
+# the output formats scraped tweets can be saved in, and their file extensions
+SINK_FORMATS = {
+    "csv": ".csv",
+    "csv.gz": ".csv.gz",
+    "csv.zst": ".csv.zst",
+    "arrows": ".arrows",
+}
+
+# typed schema for the columnar (arrow ipc stream) format
+ARROW_SCHEMA = pa.schema(
+    [
+        ("time", pa.timestamp("s", tz="UTC")),
+        ("tweet_id", pa.int64()),
+        ("user_id", pa.int64()),
+        ("surface", pa.string()),
+        ("is_reply", pa.int8()),
+        ("is_quote", pa.int8()),
+        ("retweets", pa.int32()),
+        ("quotes", pa.int32()),
+        ("favs", pa.int32()),
+        ("replies", pa.int32()),
+        ("language", pa.string()),
+        ("wordle_num", pa.int32()),
+        ("rounds", pa.string()),
+        ("hard", pa.int8()),
+        ("theme", pa.string()),
+        ("colorblind", pa.int8()),
+        ("win", pa.int8()),
+        ("matrix", pa.string()),
+    ]
+)
+# format of the tweet created_at times
+TWITTER_TIME_FORMAT = "%a %b %d %H:%M:%S +0000 %Y"
+# marks the end of an arrow ipc stream
+ARROW_EOS = b"\xff\xff\xff\xff\x00\x00\x00\x00"
+
+
+# Streaming sinks for scraped tweets. TweetColumns are buffered in memory by write(),
+# and only reach the file on flush(), which syncs it to disk and returns the byte offset
+# the file is complete up to. Anything after that offset can be cut off on resume.
+# Every flush is self contained (a csv block, gzip member, zstd frame or arrow record batch),
+# so files can be appended to after being cut back to a flushed offset.
+
+
+# buffered csv sink, optionally compressed with gzip or zstd
+class CSVSink:
+    def __init__(self, path, mode, compression=None):
+        self.file = open(path, mode + "b")
+        self.compression = compression
+        self.buffer = io.StringIO()
+        self.writer = csv.writer(self.buffer)
+        self.rows = 0
+        if mode == "w":
+            self.writer.writerow(TWEET_FIELDS)
+
+    # buffers the given TweetColumns
+    def write(self, clean_tweets):
+        self.writer.writerows(clean_tweets.rows())
+        self.rows += len(clean_tweets)
+
+    # writes the buffered rows to the file, returning the rows written and the file offset
+    def flush(self):
+        data = self.buffer.getvalue().encode()
+        if len(data) != 0:
+            if self.compression == "gzip":
+                data = gzip.compress(data)
+            elif self.compression == "zstd":
+                data = zstandard.ZstdCompressor().compress(data)
+            self.file.write(data)
+        self.buffer.seek(0)
+        self.buffer.truncate()
+        rows = self.rows
+        self.rows = 0
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        return rows, self.file.tell()
+
+    # the offset the file is written up to, where the next flush continues from
+    def tell(self):
+        return self.file.tell()
+
+    def close(self):
+        rows, offset = self.flush()
+        self.file.close()
+        return rows, offset
+
+
+# typed columnar sink, writing an arrow ipc stream with one record batch per flush
+class ArrowSink:
+    def __init__(self, path, mode):
+        self.batches = []
+        if mode == "w":
+            self.file = open(path, "wb")
+            self.file.write(ARROW_SCHEMA.serialize().to_pybytes())
+        else:
+            # remove the end of stream marker, so more batches can be appended
+            self.file = open(path, "r+b")
+            size = self.file.seek(0, os.SEEK_END)
+            if size >= len(ARROW_EOS):
+                self.file.seek(size - len(ARROW_EOS))
+                if self.file.read() == ARROW_EOS:
+                    self.file.truncate(size - len(ARROW_EOS))
+            self.file.seek(0, os.SEEK_END)
+
+    # converts the given TweetColumns to a record batch, to be written on flush
+    def write(self, clean_tweets):
+        if len(clean_tweets) != 0:
+            self.batches.append(get_record_batch(clean_tweets))
+
+    def flush(self):
+        rows = sum(batch.num_rows for batch in self.batches)
+        for batch in self.batches:
+            self.file.write(batch.serialize().to_pybytes())
+        self.batches = []
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        return rows, self.file.tell()
+
+    # the offset the file is written up to, where the next flush continues from
+    # in append mode, that's before the end of stream marker the file was closed with
+    def tell(self):
+        return self.file.tell()
+
+    def close(self):
+        rows, _ = self.flush()
+        self.file.write(ARROW_EOS)
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        offset = self.file.tell()
+        self.file.close()
+        return rows, offset
+
+
+# returns a typed array column of the TweetColumns as an arrow array
+def get_array(column, type):
+    return pa.array(np.frombuffer(column, dtype=column.typecode), type=type)
+
+
+# returns the given TweetColumns as a record batch with the ARROW_SCHEMA
+def get_record_batch(clean_tweets):
+    time = pc.strptime(pa.array(clean_tweets.time), TWITTER_TIME_FORMAT, unit="s")
+    surface_codes = pa.array(np.frombuffer(clean_tweets.surface, dtype="h"))
+    language_codes = pa.array(np.frombuffer(clean_tweets.language, dtype="h"))
+    arrays = {
+        "time": time.cast(pa.timestamp("s", tz="UTC")),
+        "tweet_id": get_array(clean_tweets.tweet_id, pa.int64()),
+        "user_id": get_array(clean_tweets.user_id, pa.int64()),
+        "surface": pa.array(clean_tweets.surfaces, pa.string()).take(surface_codes),
+        "is_reply": get_array(clean_tweets.is_reply, pa.int8()),
+        "is_quote": get_array(clean_tweets.is_quote, pa.int8()),
+        "retweets": get_array(clean_tweets.retweets, pa.int32()),
+        "quotes": pa.nulls(len(clean_tweets), pa.int32()),
+        "favs": get_array(clean_tweets.favs, pa.int32()),
+        "replies": pa.nulls(len(clean_tweets), pa.int32()),
+        "language": pa.array(clean_tweets.languages, pa.string()).take(language_codes),
+        "wordle_num": get_array(clean_tweets.wordle_num, pa.int32()),
+        "rounds": pa.array(clean_tweets.get_rounds_values(), pa.string()),
+        "hard": get_array(clean_tweets.hard, pa.int8()),
+        "theme": pa.array(list(clean_tweets.theme.decode()), pa.string()),
+        "colorblind": get_array(clean_tweets.colorblind, pa.int8()),
+        "win": get_array(clean_tweets.win, pa.int8()),
+        "matrix": pa.array(clean_tweets.matrix, pa.string()),
+    }
+    return pa.record_batch(
+        [arrays[field] for field in TWEET_FIELDS], schema=ARROW_SCHEMA
+    )
+
+
+# opens a sink of the given format, in "w" (new file) or "a" (append) mode
+def open_sink(path, mode, format="csv"):
+    if format == "csv":
+        return CSVSink(path, mode)
+    if format == "csv.gz":
+        return CSVSink(path, mode, "gzip")
+    if format == "csv.zst":
+        return CSVSink(path, mode, "zstd")
+    if format == "arrows":
+        return ArrowSink(path, mode)
+    raise Exception("unknown output format", format)
@@ -0,0 +1,190 @@
+import json
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# the fraction of the rate limit below which the remaining calls are paced
+PACE_BELOW = 0.1
+
+
+# schedules API calls against the rate limit reported by the x-rate-limit-* response headers
+# calls go out as fast as they are made until the remaining budget is low (PACE_BELOW of the
+# limit), then the rest are spaced out evenly until the reset time, and when the budget is used
+# up, calls wait until the real reset time. waiting threads don't hold the lock
+class RateLimitScheduler:
+    def __init__(
+        self, limit, window, pace_below=PACE_BELOW, clock=time.time, sleep=time.sleep
+    ):
+        self.limit = limit
+        self.window = window
+        self.pace_remaining = int(limit * pace_below)
+        self.clock = clock
+        self.sleep = sleep
+        # before the first response, assume a full budget for one window
+        self.remaining = limit
+        self.reset = None
+        self.in_flight = 0
+        self.last_call = None
+        # the reset time last waited for, to only print the pause once
+        self.paused_reset = None
+        self.lock = threading.Lock()
+
+    # blocks until a call can be made within the rate limit, and reserves it
+    def acquire(self):
+        while True:
+            pause_seconds = self.reserve()
+            if pause_seconds is None:
+                return
+            self.sleep(pause_seconds)
+
+    # reserves a call if one can be made now, or else returns the seconds to wait before
+    # trying again
+    def reserve(self):
+        with self.lock:
+            now = self.clock()
+            if self.reset is not None and now >= self.reset:
+                # the window has reset, the next response will give the real budget
+                self.remaining = self.limit
+                self.reset = None
+            if self.remaining <= 0:
+                if self.reset is None:
+                    # the budget was used up before any response, wait out a whole window
+                    self.reset = now + self.window
+                if self.paused_reset != self.reset:
+                    self.paused_reset = self.reset
+                    print(
+                        "RATE LIMIT REACHED - pausing for",
+                        int(self.reset - now + 1),
+                        "seconds",
+                    )
+                return self.reset - now + 1
+            if (
+                self.remaining <= self.pace_remaining
+                and self.reset is not None
+                and self.last_call is not None
+            ):
+                # spread the remaining calls evenly over the rest of the window
+                interval = (self.reset - now) / self.remaining
+                pause_seconds = self.last_call + interval - now
+                if pause_seconds > 0:
+                    return pause_seconds
+            self.remaining -= 1
+            self.in_flight += 1
+            self.last_call = now
+            return None
+
+    # updates the budget from the rate limit headers of a finished call
+    def release(self, headers):
+        with self.lock:
+            self.in_flight -= 1
+            if "x-rate-limit-remaining" not in headers:
+                return
+            remaining = int(headers["x-rate-limit-remaining"])
+            reset = int(headers["x-rate-limit-reset"])
+            if self.reset is None or reset > self.reset:
+                # first response of a new window, calls still in flight aren't counted yet
+                self.remaining = remaining - self.in_flight
+                self.reset = reset
+            else:
+                self.remaining = min(self.remaining, remaining)
+
+    # marks the budget as used up after a 429, until the given reset time
+    def rate_limited(self, headers):
+        with self.lock:
+            self.in_flight -= 1
+            self.remaining = 0
+            if "x-rate-limit-reset" in headers:
+                self.reset = int(headers["x-rate-limit-reset"])
+            else:
+                self.reset = self.clock() + self.window
+
+
+# retries of server errors, where each retry is another call through the rate limit scheduler
+class ScheduledRetry(Retry):
+    def __init__(self, *args, scheduler=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.scheduler = scheduler
+
+    def new(self, **kw):
+        kw.setdefault("scheduler", self.scheduler)
+        return super().new(**kw)
+
+    # ends the failed call, and reserves the next one
+    def increment(self, method=None, url=None, response=None, error=None, *args, **kw):
+        retry = super().increment(method, url, response, error, *args, **kw)
+        if self.scheduler is not None:
+            self.scheduler.release(response.headers if response is not None else {})
+            self.scheduler.acquire()
+        return retry
+
+
+# a keep-alive session for the search API, with retries and backoff for server errors
+# every call (retries included) goes through the rate limit scheduler, so it can be shared by many threads
+# if a record file is given, every raw response (with its headers) is appended to it as JSONL,
+# to be served back later by TwitterStubServer.py in replay mode
+# if PipelineMetrics are given, the latency and status of every call are recorded in them
+class TwitterClient:
+    def __init__(
+        self, bearer_token, scheduler, pool_size=10, record_file=None, metrics=None
+    ):
+        self.bearer_token = bearer_token
+        self.scheduler = scheduler
+        self.record_file = record_file
+        self.metrics = metrics
+        self.record_lock = threading.Lock()
+        self.session = requests.Session()
+        retry = ScheduledRetry(
+            scheduler=scheduler,
+            total=5,
+            backoff_factor=1,
+            status_forcelist=[500, 502, 503, 504],
+            allowed_methods=["GET"],
+        )
+        adapter = HTTPAdapter(
+            max_retries=retry, pool_connections=pool_size, pool_maxsize=pool_size
+        )
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers["Authorization"] = f"Bearer {bearer_token}"
+        self.session.headers["User-Agent"] = "v2RecentSearchPython"
+
+    # gets the response for the given url and params, waiting out any rate limit
+    def get(self, url, params):
+        while True:
+            self.scheduler.acquire()
+            a = time.perf_counter()
+            try:
+                response = self.session.get(url, params=params)
+            except Exception:
+                self.scheduler.release({})
+                if self.metrics is not None:
+                    self.metrics.count("http_requests", status="error")
+                raise
+            if self.metrics is not None:
+                seconds = time.perf_counter() - a
+                self.metrics.observe("http_request_seconds", seconds)
+                self.metrics.count("http_requests", status=response.status_code)
+            if self.record_file is not None:
+                self.record(params, response)
+            if response.status_code != 429:
+                self.scheduler.release(response.headers)
+                return response
+            print("RATE LIMIT HIT - waiting for reset")
+            self.scheduler.rate_limited(response.headers)
+
+    # appends the response for the given params to the record file
+    def record(self, params, response):
+        line = json.dumps(
+            {
+                "time": time.time(),
+                "params": {k: v for k, v in params.items() if v is not None},
+                "status": response.status_code,
+                "headers": dict(response.headers),
+                "body": response.text,
+            }
+        )
+        with self.record_lock:
+            with open(self.record_file, "a") as f:
+                f.write(line + "\n")
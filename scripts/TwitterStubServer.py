@@ -0,0 +1,229 @@
+import json
+import re
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlencode, urlparse
+
+# A local stand-in for the search API, which enforces a rate limit the same way twitter does.
+# It can also replay a recording made by the scraper with TWITTER_RECORD_FILE set,
+# serving back the recorded pages, 429s and rate limit headers.
+# Point the scraper at it with:
+# export TWITTER_SEARCH_URL=http://localhost:<port>/1.1/search/tweets.json
+
+WORDLE_DAY_ONE = datetime.fromisoformat("2021-06-18")
+TWITTER_EPOCH_MS = 1288834974657
+
+
+# counts calls in fixed windows, like the search API's 15 min rate limit windows
+class RateLimit:
+    def __init__(self, limit, window):
+        self.limit = limit
+        self.window = window
+        self.calls = 0
+        self.reset = int(time.time()) + window
+        self.lock = threading.Lock()
+
+    # returns whether the call is allowed, and the rate limit headers to send
+    def take(self):
+        with self.lock:
+            now = time.time()
+            if now >= self.reset:
+                self.calls = 0
+                self.reset = int(now) + self.window
+            allowed = self.calls < self.limit
+            if allowed:
+                self.calls += 1
+            return allowed, {
+                "x-rate-limit-limit": str(self.limit),
+                "x-rate-limit-remaining": str(self.limit - self.calls),
+                "x-rate-limit-reset": str(self.reset),
+            }
+
+
+# generates a fixed set of statuses for the given wordle number, spread over its 3 day window
+def generate_statuses(wordle_num, count):
+    wordle_start = WORDLE_DAY_ONE + timedelta(days=wordle_num)
+    start_ms = int(wordle_start.timestamp() * 1000) - TWITTER_EPOCH_MS
+    step_ms = 3 * 24 * 60 * 60 * 1000 // count
+    statuses = []
+    for i in range(count):
+        # the sequence bits keep ids unique between numbers with overlapping windows
+        tweet_id = ((start_ms + i * step_ms) << 22) | (wordle_num % 1024) << 2
+        created_at = wordle_start + timedelta(milliseconds=i * step_ms)
+        rounds = i % 6 + 1
+        rows = ["⬛🟨⬛⬛🟩"] * (rounds - 1) + ["🟩🟩🟩🟩🟩"]
+        statuses.append(
+            {
+                "created_at": created_at.strftime("%a %b %d %H:%M:%S +0000 %Y"),
+                "id": tweet_id,
+                "user": {"id": i % 1000 + 1},
+                "source": '<a href="https://twitter.com">Twitter for iPhone</a>',
+                "in_reply_to_user_id": None,
+                "is_quote_status": False,
+                "retweet_count": 0,
+                "favorite_count": i % 3,
+                "lang": "en",
+                "text": f"Wordle {wordle_num} {rounds}/6\n\n" + "\n".join(rows),
+            }
+        )
+    statuses.reverse()  # newest first, like the search API
+    return statuses
+
+
+# pages through the statuses newest first, using the max_id and since_id params
+def search_statuses(statuses, params):
+    max_id = int(params["max_id"]) if params.get("max_id") else None
+    since_id = int(params["since_id"]) if params.get("since_id") else None
+    count = int(params.get("count", 15))
+    page = []
+    for status in statuses:
+        if max_id is not None and status["id"] > max_id:
+            continue
+        if since_id is not None and status["id"] <= since_id:
+            continue
+        page.append(status)
+        if len(page) == count:
+            break
+    metadata = {"count": count, "query": params.get("q", "")}
+    if len(page) == count:
+        next_params = dict(params, max_id=page[-1]["id"] - 1)
+        metadata["next_results"] = "?" + urlencode(next_params)
+    return {"statuses": page, "search_metadata": metadata}
+
+
+# returns a key for the given search params, matching recorded params to requested ones
+def get_params_key(params):
+    return tuple(sorted((k, str(v)) for k, v in params.items() if v is not None))
+
+
+# recorded responses, served back in the order they were recorded for each set of params
+class Recording:
+    def __init__(self, filename, time_scale=1):
+        self.time_scale = time_scale
+        self.responses = {}
+        self.lock = threading.Lock()
+        with open(filename) as f:
+            for line in f:
+                if line.strip() == "":
+                    continue
+                response = json.loads(line)
+                key = get_params_key(response["params"])
+                self.responses.setdefault(key, []).append(response)
+
+    # returns the next recorded response for the params, repeating the last one once used up
+    def take(self, params):
+        with self.lock:
+            responses = self.responses.get(get_params_key(params))
+            if responses is None:
+                return None
+            return responses.pop(0) if len(responses) > 1 else responses[0]
+
+    # returns the recorded rate limit headers, with the reset time moved to the same
+    # distance from now as it was when recorded (shrunk by the time scale)
+    def get_headers(self, response):
+        headers = {
+            k.lower(): v
+            for k, v in response["headers"].items()
+            if k.lower().startswith("x-rate-limit")
+        }
+        if "x-rate-limit-reset" in headers:
+            reset_seconds = int(headers["x-rate-limit-reset"]) - response["time"]
+            headers["x-rate-limit-reset"] = str(
+                int(time.time() + max(reset_seconds, 0) / self.time_scale)
+            )
+        return headers
+
+
+class StubServer(ThreadingHTTPServer):
+    def __init__(self, address, rate_limit, tweets_per_wordle, recording=None):
+        super().__init__(address, StubHandler)
+        self.rate_limit = rate_limit
+        self.tweets_per_wordle = tweets_per_wordle
+        self.recording = recording
+        self.statuses = {}
+        self.lock = threading.Lock()
+
+    def get_statuses(self, wordle_num):
+        with self.lock:
+            if wordle_num not in self.statuses:
+                self.statuses[wordle_num] = generate_statuses(
+                    wordle_num, self.tweets_per_wordle
+                )
+            return self.statuses[wordle_num]
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.server.recording is not None:
+            self.replay()
+            return
+        allowed, headers = self.server.rate_limit.take()
+        if not allowed:
+            self.send_json(
+                429,
+                {"errors": [{"code": 88, "message": "Rate limit exceeded"}]},
+                headers,
+            )
+            return
+        params = {k: v[0] for k, v in parse_qs(urlparse(self.path).query).items()}
+        wordle_nums = re.findall(r"wordle (\d+)", params.get("q", ""), re.IGNORECASE)
+        statuses = []
+        for wordle_num in wordle_nums:
+            statuses += self.server.get_statuses(int(wordle_num))
+        statuses.sort(key=lambda status: status["id"], reverse=True)
+        self.send_json(200, search_statuses(statuses, params), headers)
+
+    def replay(self):
+        params = {k: v[0] for k, v in parse_qs(urlparse(self.path).query).items()}
+        response = self.server.recording.take(params)
+        if response is None:
+            body = {"errors": [{"code": 404, "message": "No recorded response"}]}
+            self.send_json(404, body, {})
+            return
+        headers = self.server.recording.get_headers(response)
+        self.send_json(response["status"], response["body"], headers)
+
+    def send_json(self, status, body, headers):
+        data = (body if isinstance(body, str) else json.dumps(body)).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for key, value in headers.items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+# usage: python3 scripts/TwitterStubServer.py <port> <limit> <window seconds> <tweets per wordle>
+# or, to replay a recording: python3 scripts/TwitterStubServer.py replay <recording.jsonl> <port> <time scale>
+def main():
+    if len(sys.argv) > 2 and sys.argv[1] == "replay":
+        port = int(sys.argv[3]) if len(sys.argv) > 3 else 8450
+        time_scale = float(sys.argv[4]) if len(sys.argv) > 4 else 1
+        server = StubServer(
+            ("localhost", port), None, None, Recording(sys.argv[2], time_scale)
+        )
+        print(
+            f"replaying {sys.argv[2]} on http://localhost:{port}/1.1/search/tweets.json"
+        )
+        server.serve_forever()
+        return
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 8450
+    limit = int(sys.argv[2]) if len(sys.argv) > 2 else 450
+    window = int(sys.argv[3]) if len(sys.argv) > 3 else 15 * 60
+    tweets_per_wordle = int(sys.argv[4]) if len(sys.argv) > 4 else 10000
+    server = StubServer(
+        ("localhost", port), RateLimit(limit, window), tweets_per_wordle
+    )
+    print(f"stub search API on http://localhost:{port}/1.1/search/tweets.json")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
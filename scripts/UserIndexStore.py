@@ -0,0 +1,245 @@
+import io
+import os
+import numpy as np
+import pandas as pd
+
+# Persistent map of user ids to anon user indexes, used by the local compiler (PosterCounter) and
+# the Cloud Function (UserCounter). New user ids are given the next index, in order of first
+# appearance, so a whole column of ids is looked up (and any new ones added) at once.
+#
+# The map is kept as a snapshot plus deltas, under a folder or a bucket prefix:
+# * user_index.snapshot.npy is a (2, users) int64 array of every user id in sorted order,
+#   over the index of each one. It is memory mapped (or read in one go from a bucket),
+#   with nothing to parse, and ids are looked up with a binary search.
+# * user_index.delta.<first index>.npy holds the ids given indexes by one run, in index order.
+#   Runs only ever add a delta, and once there are STORE_MAX_DELTAS of them they are
+#   compacted into a new snapshot.
+# A legacy user_id_map.csv (user_id,user_index) is imported into an empty store.
+
+SNAPSHOT_NAME = "user_index.snapshot.npy"
+DELTA_PREFIX = "user_index.delta."
+LEGACY_MAP_NAME = "user_id_map.csv"
+# deltas kept before they are compacted into a new snapshot
+STORE_MAX_DELTAS = 16
+
+
+# stores the files of the map in a local folder
+class FolderStorage:
+    def __init__(self, folder):
+        self.folder = folder
+
+    def get_path(self, name):
+        return os.path.join(self.folder, name)
+
+    # returns the array saved under the name, memory mapped, or None if there isn't one
+    def read_array(self, name):
+        path = self.get_path(name)
+        return np.load(path, mmap_mode="r") if os.path.exists(path) else None
+
+    def read_csv(self, name):
+        path = self.get_path(name)
+        return pd.read_csv(path) if os.path.exists(path) else None
+
+    def write_array(self, name, array):
+        os.makedirs(self.folder, exist_ok=True)
+        temp_path = self.get_path(name + ".tmp")
+        with open(temp_path, "wb") as f:
+            np.save(f, array)
+        os.replace(temp_path, self.get_path(name))
+
+    def delete(self, name):
+        if os.path.exists(self.get_path(name)):
+            os.remove(self.get_path(name))
+
+    def list(self, prefix):
+        if not os.path.exists(self.folder):
+            return []
+        return sorted(
+            name for name in os.listdir(self.folder) if name.startswith(prefix)
+        )
+
+
+# stores the files of the map in a GCS bucket (or the local stand-in), under a prefix
+class BucketStorage:
+    def __init__(self, bucket, prefix):
+        self.bucket = bucket
+        self.prefix = prefix
+
+    def get_blob_name(self, name):
+        return self.prefix + "/" + name
+
+    def read_array(self, name):
+        blob = self.bucket.get_blob(self.get_blob_name(name))
+        return None if blob is None else np.load(io.BytesIO(blob.download_as_bytes()))
+
+    def read_csv(self, name):
+        blob = self.bucket.get_blob(self.get_blob_name(name))
+        return (
+            None if blob is None else pd.read_csv(io.BytesIO(blob.download_as_bytes()))
+        )
+
+    def write_array(self, name, array):
+        buffer = io.BytesIO()
+        np.save(buffer, array)
+        self.bucket.blob(self.get_blob_name(name)).upload_from_string(buffer.getvalue())
+
+    def delete(self, name):
+        blob = self.bucket.get_blob(self.get_blob_name(name))
+        if blob is not None:
+            blob.delete()
+
+    def list(self, prefix):
+        blobs = self.bucket.list_blobs(prefix=self.get_blob_name(prefix))
+        return sorted(blob.name[len(self.prefix) + 1 :] for blob in blobs)
+
+
+# returns the given user ids as an int64 array, parsing them if they are strings
+def to_id_array(user_ids):
+    ids = np.asarray(user_ids)
+    if ids.dtype != np.int64:
+        ids = ids.astype(np.int64)
+    return ids
+
+
+def get_delta_name(first_index):
+    return f"{DELTA_PREFIX}{first_index:012d}.npy"
+
+
+# returns the first index of a delta, from its name
+def get_delta_first_index(name):
+    return int(name[len(DELTA_PREFIX) :].split(".")[0])
+
+
+class UserIndexStore:
+    def __init__(self, storage):
+        self.storage = storage
+        # (sorted ids, their indexes) runs, merged like a binary counter as new ids are added
+        self.runs = []
+        self.count = 0
+        # the count when the store was loaded or last saved
+        self.saved_count = 0
+        # ids given indexes since then, in index order
+        self.new_ids = []
+        self.load()
+
+    @classmethod
+    def local(cls, folder):
+        return cls(FolderStorage(folder))
+
+    @classmethod
+    def bucket(cls, bucket, prefix="metadata"):
+        return cls(BucketStorage(bucket, prefix))
+
+    def __len__(self):
+        return self.count
+
+    def load(self):
+        snapshot = self.storage.read_array(SNAPSHOT_NAME)
+        if snapshot is None:
+            legacy = self.storage.read_csv(LEGACY_MAP_NAME)
+            if legacy is not None:
+                print(f"Importing {len(legacy)} user indexes from {LEGACY_MAP_NAME}")
+                expected = np.arange(1, len(legacy) + 1)
+                if not np.array_equal(legacy["user_index"].to_numpy(), expected):
+                    raise Exception("user indexes of the legacy map aren't in order")
+                self.add_run(to_id_array(legacy["user_id"]), 1)
+                self.count = len(legacy)
+                self.write_snapshot()
+        else:
+            self.runs.append((snapshot[0], snapshot[1]))
+            self.count = snapshot.shape[1]
+        for name in self.storage.list(DELTA_PREFIX):
+            first_index = get_delta_first_index(name)
+            if first_index <= self.count:
+                continue  # already compacted into the snapshot
+            if first_index != self.count + 1:
+                raise Exception("user index delta out of order", name)
+            ids = self.storage.read_array(name)
+            self.add_run(ids, first_index)
+            self.count += len(ids)
+        self.saved_count = self.count
+
+    # adds ids that were given consecutive indexes from first_index, in index order
+    def add_run(self, ids, first_index):
+        if len(ids) == 0:
+            return
+        order = np.argsort(ids, kind="stable")
+        run_ids, run_indexes = ids[order], order.astype(np.int64) + first_index
+        while len(self.runs) != 0 and len(self.runs[-1][0]) <= len(run_ids):
+            last_ids, last_indexes = self.runs.pop()
+            run_ids = np.concatenate([last_ids, run_ids])
+            run_indexes = np.concatenate([last_indexes, run_indexes])
+            # both halves are sorted, which the stable sort merges in linear time
+            order = np.argsort(run_ids, kind="stable")
+            run_ids, run_indexes = run_ids[order], run_indexes[order]
+        self.runs.append((run_ids, run_indexes))
+
+    # returns the index of each of the given unique ids, or 0 for ids not in the store
+    def lookup(self, ids):
+        indexes = np.zeros(len(ids), dtype=np.int64)
+        for run_ids, run_indexes in self.runs:
+            positions = np.minimum(np.searchsorted(run_ids, ids), len(run_ids) - 1)
+            found = run_ids[positions] == ids
+            indexes[found] = run_indexes[positions[found]]
+        return indexes
+
+    # returns the index of each of the given user ids, giving new ids the next indexes
+    # in order of first appearance
+    def get_indexes(self, user_ids):
+        codes, uniques = pd.factorize(to_id_array(user_ids))
+        indexes = self.lookup(uniques)
+        new = indexes == 0
+        new_count = int(new.sum())
+        if new_count != 0:
+            indexes[new] = np.arange(self.count + 1, self.count + 1 + new_count)
+            new_ids = uniques[new]
+            self.add_run(new_ids, self.count + 1)
+            self.new_ids.append(new_ids)
+            self.count += new_count
+        return indexes[codes]
+
+    def get_index(self, user_id):
+        return int(self.get_indexes([user_id])[0])
+
+    # returns every (sorted id, index) pair, as a (2, users) array
+    def get_snapshot(self):
+        ids = np.concatenate([ids for ids, _ in self.runs] or [np.zeros(0, np.int64)])
+        indexes = np.concatenate(
+            [indexes for _, indexes in self.runs] or [np.zeros(0, np.int64)]
+        )
+        order = np.argsort(ids, kind="stable")
+        return np.stack([ids[order], indexes[order]])
+
+    # writes every index to a new snapshot, and drops the deltas
+    def write_snapshot(self):
+        self.storage.write_array(SNAPSHOT_NAME, self.get_snapshot())
+        for name in self.storage.list(DELTA_PREFIX):
+            self.storage.delete(name)
+
+    # saves the indexes given since the last save as a delta,
+    # compacting the deltas into a new snapshot once there are too many
+    def save(self):
+        if self.count == self.saved_count:
+            return
+        self.storage.write_array(
+            get_delta_name(self.saved_count + 1), np.concatenate(self.new_ids)
+        )
+        self.new_ids = []
+        self.saved_count = self.count
+        if len(self.storage.list(DELTA_PREFIX)) >= STORE_MAX_DELTAS:
+            print("Compacting user index deltas")
+            self.write_snapshot()
+
+    # drops every index after the first count, and saves the store
+    def truncate(self, count):
+        if count >= self.count:
+            return
+        keep = []
+        for ids, indexes in self.runs:
+            kept = indexes <= count
+            keep.append((ids[kept], indexes[kept]))
+        self.runs = [run for run in keep if len(run[0]) != 0]
+        self.count = count
+        self.saved_count = count
+        self.new_ids = []
+        self.write_snapshot()
@@ -0,0 +1,297 @@
+import os
+import sys
+import glob
+import time
+from multiprocessing import Pool
+import numpy as np
+import pandas as pd
+from WordleDataset import DATASET_FOLDER, read_csv_columns, read_dataset
+from WordleMatrix import encode_matrices
+from WordlePatterns import get_first_patterns, get_guesses, get_transitions
+
+# Local aggregation engine for the data views. Computes the same group-by counts as the BigQuery
+# summary tables (like wordle_rounds_count) from the local condensed data, so the views can be
+# rebuilt from the archive without the warehouse. The Cloud Function uses it too, to compute
+# the daily aggregates from the condensed rows in memory, see GCPCompileFiles.py.
+# The data is split by wordle number, so each worker of a process pool counts whole numbers,
+# reading only the columns needed. Each group-by column is factorized into small int codes, and
+# every combination of them is counted with one np.bincount over the combined code.
+# Groups are ordered like BigQuery's ORDER BY, by wordle number then each column, NULLs first.
+# Views of guess patterns are counted over the guesses of the games, see WordlePatterns.py.
+
+VIEWS_FOLDER = "data_views"
+CONDENSED_FOLDER = "data/condensed"
+# worker processes counting wordle numbers
+AGGREGATE_WORKERS = os.cpu_count()
+
+# the columns each aggregate groups by, after wordle_num, by the name of its view
+# wordle_rounds_count is the same as the BigQuery table of that name
+AGGREGATES = {
+    "wordle_rounds_count": ["rounds"],
+    "wordle_hard_rounds_count": ["hard", "rounds"],
+    "wordle_theme_count": ["theme"],
+    "wordle_surface_count": ["surface"],
+    "wordle_language_count": ["language"],
+    "wordle_hour_count": ["hour"],
+    "wordle_hard_wins": ["hard"],
+    "wordle_theme_wins": ["theme"],
+    "wordle_colorblind_wins": ["colorblind"],
+    "wordle_surface_wins": ["surface"],
+    "wordle_language_wins": ["language"],
+    "wordle_hour_wins": ["hour"],
+    "wordle_first_pattern_wins": ["first_pattern"],
+    "wordle_pattern_wins": ["pattern"],
+    "wordle_transition_count": [
+        "guess",
+        "greens",
+        "yellows",
+        "next_greens",
+        "next_yellows",
+    ],
+}
+# the frame each view is counted over, if not the games: every guess of every game, or every
+# guess followed by another one, with the greens and yellows of both, see WordlePatterns.py
+AGGREGATE_SOURCES = {
+    "wordle_pattern_wins": "guesses",
+    "wordle_transition_count": "transitions",
+}
+# columns summed over each group besides the row count, as {name: column}, by the name of the view
+# the win rate of a group is wins / count, and unlike the rate, both add up across chunks
+AGGREGATE_SUMS = {
+    name: {"wins": "win"} for name in AGGREGATES if name.endswith("_wins")
+}
+# the views the Cloud Function computes from each day's rows besides wordle_rounds_count, and
+# loads to the daily_aggregates table, as comma separated names of AGGREGATES
+DAILY_VIEWS = [
+    name
+    for name in os.environ.get(
+        "WORDLE_DAILY_VIEWS",
+        "wordle_hard_wins,wordle_theme_wins,wordle_colorblind_wins,"
+        "wordle_surface_wins,wordle_language_wins,wordle_hour_wins,"
+        "wordle_first_pattern_wins,wordle_pattern_wins,wordle_transition_count",
+    ).split(",")
+    if name
+]
+# the dtypes of the columns of the views, nullable like their BigQuery columns,
+# so a view reads and writes the same whichever rows are in it
+VIEW_DTYPES = {
+    "wordle_num": "Int64",
+    "rounds": "string",
+    "hard": "boolean",
+    "theme": "string",
+    "colorblind": "boolean",
+    "surface": "Int64",
+    "language": "string",
+    "hour": "Int64",
+    "first_pattern": "string",
+    "pattern": "string",
+    "guess": "Int64",
+    "greens": "Int64",
+    "yellows": "Int64",
+    "next_greens": "Int64",
+    "next_yellows": "Int64",
+    "count": "Int64",
+    "wins": "Int64",
+}
+# columns that aren't in the condensed data, with the column they are computed from
+DERIVED_COLUMNS = {
+    "hour": "time",
+    "first_pattern": "matrix",
+    "pattern": "matrix",
+    "guess": "matrix",
+    "greens": "matrix",
+    "yellows": "matrix",
+    "next_greens": "matrix",
+    "next_yellows": "matrix",
+}
+# columns of the games kept for each of their guesses, for the views over guesses
+GUESS_GAME_COLUMNS = ["wordle_num", "win"]
+
+
+# returns the UTC hour of each time, given as int timestamps or datetimes
+def get_hours(times):
+    if pd.api.types.is_datetime64_any_dtype(times):
+        return pd.DatetimeIndex(times).hour.to_numpy()
+    return (np.asarray(times, dtype=np.int64) // 3600) % 24
+
+
+# returns the count of each combination of values of the given columns, and the sum of each of
+# the given sums ({name: column}) over them, as a frame of those columns plus count and the sums,
+# sorted by each column in turn with NULLs first
+def count_groups(df, columns, sums=None):
+    key = np.zeros(len(df), dtype=np.int64)
+    levels = []
+    for column in columns:
+        codes, uniques = pd.factorize(df[column])
+        # sort by value, as dictionary encoded (categorical) columns sort by first appearance
+        uniques = pd.Index(np.asarray(uniques))
+        order = uniques.argsort()
+        ranks = np.empty(len(order), dtype=np.int64)
+        ranks[order] = np.arange(len(order))
+        codes = np.where(codes >= 0, ranks[codes], -1)
+        uniques = uniques[order]
+        # code 0 is NULL, so the NULL group comes first
+        key = key * (len(uniques) + 1) + codes + 1
+        levels.append(uniques)
+    shape = [len(uniques) + 1 for uniques in levels]
+    counts = np.bincount(key, minlength=int(np.prod(shape)))
+    groups = np.flatnonzero(counts)
+    result = {}
+    for column, uniques, codes in zip(columns, levels, np.unravel_index(groups, shape)):
+        positions = codes - 1
+        if (positions == -1).any():
+            result[column] = uniques.take(positions, allow_fill=True, fill_value=np.nan)
+        else:
+            result[column] = uniques.take(positions)
+        result[column] = np.asarray(result[column])
+    result["count"] = counts[groups]
+    for name, column in (sums or {}).items():
+        weights = np.nan_to_num(np.asarray(df[column], dtype=np.float64))
+        totals = np.bincount(key, weights=weights, minlength=len(counts))
+        result[name] = totals[groups].astype(np.int64)
+    return pd.DataFrame(result)
+
+
+# returns the columns of the frames of an aggregate
+def get_aggregate_columns(name):
+    return (
+        ["wordle_num"]
+        + AGGREGATES[name]
+        + ["count"]
+        + list(AGGREGATE_SUMS.get(name, {}))
+    )
+
+
+# returns the condensed columns needed to compute the given aggregates
+def get_source_columns(names):
+    columns = {"wordle_num"}
+    for name in names:
+        columns.update(DERIVED_COLUMNS.get(c, c) for c in AGGREGATES[name])
+        columns.update(AGGREGATE_SUMS.get(name, {}).values())
+    return sorted(columns)
+
+
+# returns the frames the given aggregates are counted over, by source (see AGGREGATE_SOURCES),
+# with the derived columns added, leaving the frame of condensed rows as it was
+def get_sources(df, names):
+    columns = {column for name in names for column in AGGREGATES[name]}
+    kinds = {AGGREGATE_SOURCES.get(name, "games") for name in names}
+    games = df
+    if "time" in df:
+        games = games.assign(hour=get_hours(df["time"]))
+    sources = {}
+    if "matrix" in df:
+        packed, rows = encode_matrices(df["matrix"])
+        kept = [column for column in GUESS_GAME_COLUMNS if column in df]
+        if "first_pattern" in columns:
+            games = games.assign(first_pattern=get_first_patterns(packed))
+        if "guesses" in kinds:
+            sources["guesses"] = get_guesses(df, packed, rows, kept)
+        if "transitions" in kinds:
+            sources["transitions"] = get_transitions(df, packed, rows, kept)
+    sources["games"] = games
+    return sources
+
+
+# computes the given aggregates of a frame of condensed rows, by name
+# only the columns they need are used, and the frame is left as it was
+def aggregate_frame(df, names=AGGREGATES):
+    sources = get_sources(df[get_source_columns(names)], names)
+    return {
+        name: count_groups(
+            sources[AGGREGATE_SOURCES.get(name, "games")],
+            ["wordle_num"] + AGGREGATES[name],
+            AGGREGATE_SUMS.get(name),
+        )
+        for name in names
+    }
+
+
+# merges the aggregates of several chunks of condensed rows, like aggregate_frame of all of them
+def merge_aggregates(chunks):
+    merged = {}
+    for name in chunks[0]:
+        frame = pd.concat([chunk[name] for chunk in chunks], ignore_index=True)
+        columns = ["wordle_num"] + AGGREGATES[name]
+        # the count and sums of the chunks are summed over each group, and the sum of count
+        # replaces the number of rows
+        totals = get_aggregate_columns(name)[len(columns) :]
+        merged[name] = count_groups(frame, columns, {total: total for total in totals})
+    return merged
+
+
+# returns the wordle numbers of the local condensed data, from the dataset if there is one,
+# or else from the per-number condensed files
+def get_wordle_nums(use_dataset):
+    if use_dataset:
+        paths = glob.glob(os.path.join(DATASET_FOLDER, "wordle_num=*"))
+        return sorted(int(path.split("=")[-1]) for path in paths)
+    paths = glob.glob(os.path.join(CONDENSED_FOLDER, "wordle.*.csv"))
+    return sorted(int(path.split(".")[-2]) for path in paths)
+
+
+# reads the given columns of the condensed rows of a wordle number
+def read_wordle_num(wordle_num, columns, use_dataset):
+    if use_dataset:
+        return read_dataset(columns=columns, wordle_nums=[wordle_num])
+    filename = os.path.join(CONDENSED_FOLDER, f"wordle.{wordle_num}.csv")
+    return read_csv_columns(filename, columns)
+
+
+# computes the given aggregates of a wordle number, run in the worker processes
+def aggregate_wordle_num(wordle_num, names, use_dataset):
+    df = read_wordle_num(wordle_num, get_source_columns(names), use_dataset)
+    return aggregate_frame(df, names)
+
+
+# computes the given aggregates over every local wordle number, by name
+# with more than one worker, the numbers are counted in a process pool
+def aggregate_local(names=AGGREGATES, workers=AGGREGATE_WORKERS):
+    names = list(names)
+    use_dataset = os.path.exists(DATASET_FOLDER)
+    nums = get_wordle_nums(use_dataset)
+    print(
+        "aggregating",
+        len(nums),
+        "wordle numbers from the",
+        "dataset" if use_dataset else "condensed csv files",
+    )
+    tasks = [(num, names, use_dataset) for num in nums]
+    if workers > 1 and len(tasks) > 1:
+        with Pool(workers) as pool:
+            results = pool.starmap(aggregate_wordle_num, tasks, chunksize=4)
+    else:
+        results = [aggregate_wordle_num(*task) for task in tasks]
+    frames = {}
+    for name in names:
+        parts = [result[name] for result in results]
+        frames[name] = (
+            pd.concat(parts, ignore_index=True)
+            if parts
+            else pd.DataFrame(columns=get_aggregate_columns(name))
+        )
+    return frames
+
+
+# writes each aggregate to data_views/<name>.csv
+def write_views(frames, folder=VIEWS_FOLDER):
+    os.makedirs(folder, exist_ok=True)
+    for name, df in frames.items():
+        df.to_csv(os.path.join(folder, name + ".csv"), index=False)
+        print("wrote", len(df), "rows to", name)
+
+
+# usage: python3 scripts/WordleAggregate.py [aggregate names...]
+# computes every aggregate by default, see AGGREGATES
+def main():
+    names = sys.argv[1:] or list(AGGREGATES)
+    for name in names:
+        if name not in AGGREGATES:
+            raise Exception("unknown aggregate", name)
+    a = time.time()
+    write_views(aggregate_local(names))
+    print(f"aggregated in {time.time() - a:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
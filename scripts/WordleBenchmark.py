@@ -0,0 +1,597 @@
+import contextlib
+import csv
+import glob
+import io
+import json
+import multiprocessing
+import os
+import re
+import shutil
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+import tracemalloc
+import numpy as np
+import pandas as pd
+from WordleTweetParser import parse_statuses, TweetColumns, TWEET_FIELDS
+from WordleMatrix import encode_matrices, decode_matrices, contains_interior_win, is_win
+from WordlePatterns import get_guesses, get_transitions
+from WordleCleaning import filter_rows, get_surface_ids, get_timestamps, map_ids
+from WordleSynthetic import write_day_files, write_status_pages
+from PipelineMetrics import PipelineMetrics, get_peak_rss
+
+
+# the original per-tweet parsing loop, kept as the baseline for the parser benchmark
+def legacy_parse_statuses(tweets, wordle_num):
+    text_invalid = 0
+    squares_invalid = 0
+    clean_tweets = []
+
+    for tweet in tweets:
+        clean_tweet = {
+            "time": tweet["created_at"],
+            "tweet_id": tweet["id"],
+            "user_id": tweet["user"]["id"],
+            "surface": tweet["source"].split(">")[1].split("<")[0],
+            "is_reply": 1 if tweet["in_reply_to_user_id"] != None else 0,
+            "is_quote": 1 if tweet["is_quote_status"] else 0,
+            "retweets": tweet["retweet_count"],
+            "quotes": None,
+            "favs": tweet["favorite_count"],
+            "replies": None,
+            "language": tweet["lang"],
+        }
+        text = tweet["text"]
+
+        wordleRegex = re.compile(
+            r"Wordle[()#!,\-.:\s]*(\d*)[()#!,\-.:\s]*([1-6X])\/6\*?", re.IGNORECASE
+        )
+        wordleText = wordleRegex.search(text)
+        if wordleText is not None:
+            clean_tweet["wordle_num"] = wordleText.group(1)
+            clean_tweet["rounds"] = (
+                6 if wordleText.group(2) == "X" else wordleText.group(2)
+            )
+            clean_tweet["hard"] = 1 if "/6*" in wordleText.string else 0
+        else:
+            text_invalid += 1
+            continue
+
+        if clean_tweet["wordle_num"] != str(wordle_num):
+            text_invalid += 1
+            continue
+
+        valid_chars = ["⬛", "🟨", "🟩", "⬜", "🟧", "🟦", "\n"]
+        raw_rows = "".join(c for c in text if c in valid_chars).split("\n")
+        rows = [row for row in raw_rows if row != ""]
+
+        if len(rows) > 6 or len(rows) < 1:
+            squares_invalid += 1
+            continue
+
+        if any([len(row) != 5 for row in rows]):
+            squares_invalid += 1
+            continue
+
+        squares = "".join(rows)
+
+        if "⬛" in squares:
+            clean_tweet["theme"] = "d"
+        elif "⬜" in squares:
+            clean_tweet["theme"] = "l"
+        else:
+            clean_tweet["theme"] = "u"
+
+        clean_tweet["colorblind"] = 1 if "🟧" in squares or "🟦" in squares else 0
+        squares = (
+            squares.replace("⬛", "A")
+            .replace("⬜", "A")
+            .replace("🟨", "B")
+            .replace("🟦", "B")
+            .replace("🟧", "C")
+            .replace("🟩", "C")
+        )
+        clean_tweet["win"] = 1 if squares[-5:] == "CCCCC" else 0
+        clean_tweet["matrix"] = squares
+
+        clean_tweets.append(clean_tweet)
+
+    return clean_tweets, text_invalid, squares_invalid
+
+
+# the original string check for a win not in the final row, kept as the matrix baseline
+def legacy_contains_interior_win(matrix):
+    rows = [matrix[i : i + 5] for i in range(0, len(matrix), 5)]
+    try:
+        return rows.index("CCCCC") != len(rows) - 1
+    except:
+        return False
+
+
+# the rows of a matrix by string slicing, none if it isn't 1 to 6 full rows of A/B/C squares,
+# kept as the pattern baseline
+def legacy_guess_rows(matrix):
+    if not isinstance(matrix, str) or not re.fullmatch(r"(?:[ABC]{5}){1,6}", matrix):
+        return []
+    return [matrix[i : i + 5] for i in range(0, len(matrix), 5)]
+
+
+# the original row by row cleaning steps of the compilers, kept as the cleaning baseline
+def legacy_get_surface_id(surface_string):
+    if surface_string == "Twitter for iPhone":
+        return 1
+    if surface_string == "Twitter for Android":
+        return 2
+    if surface_string == "Twitter Web App":
+        return 3
+    if surface_string == "Twitter for iPad":
+        return 4
+    if surface_string == "Tweetbot for iΟS":
+        return 5
+    if surface_string == "TweetDeck":
+        return 6
+    return 7
+
+
+def legacy_get_timestamp(time_string):
+    return int(datetime.strptime(time_string, "%a %b %d %H:%M:%S +0000 %Y").timestamp())
+
+
+# the original validation rules, each adding a column and filtering the frame in turn
+def legacy_filter_rows(df):
+    rejected = {}
+    interior_win = df["matrix"].map(legacy_contains_interior_win).to_numpy(bool)
+    rejected["interior_win"] = int(interior_win.sum())
+    df = df[~interior_win]
+    df.loc[(df["colorblind"] == 1) & df["matrix"].str.endswith("CCCCC"), "win"] = 1
+    df.loc[df["rounds"] == "x", "rounds"] = "X"
+    df.loc[(df["rounds"] == "6") & (df["win"] == 0), "rounds"] = "X"
+    df["matrix_size_mismatch"] = df["matrix"].str.len() / 5 != pd.to_numeric(
+        np.where(df["rounds"] == "X", 6, df["rounds"])
+    )
+    rejected["matrix_size_mismatch"] = int(df["matrix_size_mismatch"].sum())
+    df = df[df["matrix_size_mismatch"] == False]
+    df.drop("matrix_size_mismatch", axis=1, inplace=True)
+    df["matrix_win_mismatch"] = ((df["win"] == 1) & (df["rounds"] == "X")) | (
+        (df["win"] == 0) & (df["rounds"] != "X")
+    )
+    rejected["matrix_win_mismatch"] = int(df["matrix_win_mismatch"].sum())
+    df = df[df["matrix_win_mismatch"] == False]
+    df.drop("matrix_win_mismatch", axis=1, inplace=True)
+    return df, rejected
+
+
+# loads recorded search API pages from a JSONL file, one response body per line,
+# or a recording made with TWITTER_RECORD_FILE, where the body is a field of each line
+def load_status_pages(filename):
+    pages = []
+    with open(filename) as f:
+        for line in f:
+            if line.strip() == "":
+                continue
+            page = json.loads(line)
+            if "body" in page:
+                if page["status"] != 200:
+                    continue
+                page = json.loads(page["body"])
+            pages.append(page["statuses"])
+    return pages
+
+
+# times the given parse function over every page, returning tweets per second
+def time_parser(parse, pages, wordle_num, repeat=3):
+    tweet_count = sum(len(page) for page in pages)
+    best = None
+    for _ in range(repeat):
+        a = time.perf_counter()
+        for page in pages:
+            parse(page, wordle_num)
+        b = time.perf_counter()
+        best = b - a if best is None else min(best, b - a)
+    return tweet_count / best
+
+
+# writes legacy tweet dicts to csv text, the way the scraper used to save them
+def legacy_to_csv(clean_tweets):
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, TWEET_FIELDS)
+    writer.writerows(clean_tweets)
+    return buffer.getvalue()
+
+
+# writes TweetColumns to csv text, the way the scraper saves them
+def columns_to_csv(clean_tweets):
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(clean_tweets.rows())
+    return buffer.getvalue()
+
+
+# checks that both parsers give the same tweets and counts for the page
+def check_parsers_match(page, wordle_num):
+    legacy_tweets, *legacy_counts = legacy_parse_statuses(page, wordle_num)
+    clean_tweets, *counts = parse_statuses(page, wordle_num)
+    if legacy_counts != counts:
+        return False
+    return legacy_to_csv(legacy_tweets) == columns_to_csv(clean_tweets)
+
+
+# compares the legacy and batch parsers over recorded pages
+def bench_parse(filename, wordle_num):
+    pages = load_status_pages(filename)
+    for page in pages:
+        if not check_parsers_match(page, wordle_num):
+            raise Exception("parser output mismatch", filename)
+    before = time_parser(legacy_parse_statuses, pages, wordle_num)
+    after = time_parser(parse_statuses, pages, wordle_num)
+    print(f"parse | before: {before:,.0f} tweets/sec | after: {after:,.0f} tweets/sec")
+    print(f"parse | speedup: {after / before:.1f}x")
+
+
+# returns the bytes allocated by holding the result of the given function, and the result
+def measure_allocated(function):
+    tracemalloc.start()
+    result = function()
+    allocated = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return allocated, result
+
+
+# compares memory per tweet and serialization time of tweet dicts against TweetColumns,
+# holding every recorded page in memory at once, like all_tweets between saves
+def bench_records(filename, wordle_num):
+    pages = load_status_pages(filename)
+
+    def collect_dicts():
+        all_tweets = []
+        for page in pages:
+            all_tweets += legacy_parse_statuses(page, wordle_num)[0]
+        return all_tweets
+
+    def collect_columns():
+        all_tweets = TweetColumns()
+        for page in pages:
+            all_tweets.extend(parse_statuses(page, wordle_num)[0])
+        return all_tweets
+
+    dict_bytes, dict_tweets = measure_allocated(collect_dicts)
+    column_bytes, column_tweets = measure_allocated(collect_columns)
+    tweet_count = len(dict_tweets)
+    print(
+        f"records | dicts: {dict_bytes / tweet_count:,.0f} bytes/tweet",
+        f"| columns: {column_bytes / tweet_count:,.0f} bytes/tweet",
+    )
+
+    a = time.perf_counter()
+    legacy_to_csv(dict_tweets)
+    b = time.perf_counter()
+    columns_to_csv(column_tweets)
+    c = time.perf_counter()
+    print(
+        f"records | serialize dicts: {tweet_count / (b - a):,.0f} tweets/sec",
+        f"| columns: {tweet_count / (c - b):,.0f} tweets/sec",
+    )
+
+
+# compares the string matrix checks of the compile step against the packed mask checks,
+# over the matrices of every recorded page, repeated up to about a million tweets
+def bench_matrix(filename, wordle_num):
+    matrices = []
+    for page in load_status_pages(filename):
+        matrices += parse_statuses(page, wordle_num)[0].matrix
+    matrices = pd.Series(matrices * max(1, 1000000 // max(1, len(matrices))))
+
+    a = time.perf_counter()
+    legacy_interior = matrices.map(legacy_contains_interior_win).to_numpy(bool)
+    legacy_win = matrices.str.endswith("CCCCC").to_numpy()
+    legacy_rows = (matrices.str.len() / 5).to_numpy()
+    b = time.perf_counter()
+    packed, rows = encode_matrices(matrices)
+    c = time.perf_counter()
+    interior = contains_interior_win(packed, rows)
+    win = is_win(packed, rows)
+    d = time.perf_counter()
+
+    if (
+        decode_matrices(packed) != matrices.tolist()
+        or not np.array_equal(legacy_interior, interior)
+        or not np.array_equal(legacy_win, win)
+        or not np.array_equal(legacy_rows, rows)
+    ):
+        raise Exception("matrix check mismatch", filename)
+    print(
+        f"matrix | strings: {len(matrices) / (b - a):,.0f} tweets/sec",
+        f"| packed: {len(matrices) / (d - b):,.0f} tweets/sec",
+        f"| checks only: {len(matrices) / (d - c):,.0f} tweets/sec",
+    )
+
+
+# compares the guesses and transitions of WordlePatterns.py against string slicing, with
+# empty, invalid and too long matrices added to the parsed ones
+def bench_patterns(filename, wordle_num):
+    matrices = ["", "ABCA", "ABXAB", "CCCCC" * 7]
+    for page in load_status_pages(filename):
+        matrices += parse_statuses(page, wordle_num)[0].matrix
+    matrices = pd.Series(matrices * max(1, 200000 // len(matrices)))
+
+    a = time.perf_counter()
+    legacy_guesses = []
+    legacy_transitions = []
+    for game, matrix in enumerate(matrices):
+        rows = legacy_guess_rows(matrix)
+        counts = [(row.count("C"), row.count("B")) for row in rows]
+        for i, row in enumerate(rows):
+            legacy_guesses.append((game, i + 1, row))
+            if i + 1 < len(rows):
+                legacy_transitions.append((game, i + 1, *counts[i], *counts[i + 1]))
+    b = time.perf_counter()
+    games = pd.DataFrame({"game": np.arange(len(matrices))})
+    packed, rows = encode_matrices(matrices)
+    guesses = get_guesses(games, packed, rows, ["game"])
+    transitions = get_transitions(games, packed, rows, ["game"])
+    c = time.perf_counter()
+
+    guesses["pattern"] = guesses["pattern"].astype(str)
+    if (
+        list(guesses.itertuples(index=False, name=None)) != legacy_guesses
+        or list(transitions.itertuples(index=False, name=None)) != legacy_transitions
+    ):
+        raise Exception("pattern check mismatch", filename)
+    print(
+        f"patterns | strings: {len(matrices) / (b - a):,.0f} tweets/sec",
+        f"| packed: {len(matrices) / (c - b):,.0f} tweets/sec",
+    )
+
+
+# returns the rows per second of the given function over the frame, and its result
+# the function is given a copy, so every step runs on the same input
+def time_rows(function, df):
+    df = df.copy()
+    a = time.perf_counter()
+    result = function(df)
+    return len(df) / (time.perf_counter() - a), result
+
+
+# compares each row by row cleaning step of the compilers against its vectorized kernel
+# in WordleCleaning.py, over the tweets of every recorded page, repeated up to about a million
+def bench_cleaning(filename, wordle_num):
+    tweets = TweetColumns()
+    for page in load_status_pages(filename):
+        tweets.extend(parse_statuses(page, wordle_num)[0])
+    df = pd.read_csv(io.StringIO(columns_to_csv(tweets)), names=TWEET_FIELDS)
+    df = pd.concat([df] * max(1, 1000000 // max(1, len(df))), ignore_index=True)
+    df["rounds"] = df["rounds"].astype(str)
+
+    def legacy_map_ids(df):
+        ids = {}
+        return df["user_id"].map(lambda id: ids.setdefault(id, len(ids) + 1))
+
+    def new_map_ids(df):
+        ids = {}
+        return map_ids(df["user_id"], lambda id: ids.setdefault(id, len(ids) + 1))
+
+    steps = [
+        (
+            "surface",
+            lambda df: df["surface"].map(legacy_get_surface_id),
+            lambda df: get_surface_ids(df["surface"]),
+        ),
+        (
+            "time",
+            lambda df: df["time"].map(legacy_get_timestamp),
+            lambda df: get_timestamps(df["time"]),
+        ),
+        ("user_id", legacy_map_ids, new_map_ids),
+        ("filter", legacy_filter_rows, filter_rows),
+    ]
+    for name, legacy, new in steps:
+        before, legacy_result = time_rows(legacy, df)
+        after, result = time_rows(new, df)
+        if name == "filter":
+            same = legacy_result[1] == result[1] and legacy_result[0]["matrix"].equals(
+                result[0]["matrix"]
+            )
+        else:
+            same = np.array_equal(np.asarray(legacy_result), np.asarray(result))
+        if not same:
+            raise Exception("cleaning step mismatch", name)
+        print(
+            f"cleaning {name} | before: {before:,.0f} rows/sec",
+            f"| after: {after:,.0f} rows/sec | speedup: {after / before:.1f}x",
+        )
+
+
+# the stages timed by the stage benchmark, in the order they run
+STAGES = [
+    "process_response",
+    "create_combined_file",
+    "condense_file",
+    "split_condensed_file",
+    "condense_day_file",
+]
+# the stage benchmark spreads its rows over day files of this many wordle numbers
+STAGE_WORDLE_NUMS = 10
+STAGE_FIRST_NUM = 300
+# statuses parsed by the process_response stage, at most, as pages of json are large
+STAGE_MAX_STATUSES = 1_000_000
+STAGE_BUCKET = "benchmark"
+# runs of each stage, each in a fresh process, of which the fastest is reported,
+# as the time of a single run varies by 20-30% from one run to the next
+STAGE_REPEATS = 3
+
+
+# returns the number of rows of a csv file, without its header
+def count_csv_rows(filename):
+    with open(filename, "rb") as f:
+        lines = sum(chunk.count(b"\n") for chunk in iter(lambda: f.read(1 << 20), b""))
+    return lines - 1
+
+
+# parses every page of the generated statuses with the scraper's process_response
+# returns the statuses and bytes read, and the seconds spent parsing
+def run_process_response():
+    from WordleTwitterAPIScrape import process_response
+
+    statuses = 0
+    seconds = 0
+    with open("pages.jsonl") as f:
+        for line in f:
+            page = json.loads(line)
+            statuses += len(page["statuses"])
+            a = time.perf_counter()
+            process_response(page, STAGE_FIRST_NUM)
+            seconds += time.perf_counter() - a
+    return statuses, os.path.getsize("pages.jsonl"), seconds
+
+
+def run_create_combined_file():
+    from WordleCompileFiles import create_combined_file, get_filenames_for_all_wordles
+
+    filenames = get_filenames_for_all_wordles()
+    a = time.perf_counter()
+    create_combined_file(filenames, None)
+    seconds = time.perf_counter() - a
+    rows = sum(count_csv_rows(filename) for filename in filenames)
+    size = sum(os.path.getsize(filename) for filename in filenames)
+    return rows, size, seconds
+
+
+def run_condense_file():
+    from WordleCompileFiles import COMBINED_FILE, CONDENSED_FILE, PosterCounter
+    from WordleCompileFiles import condense_file
+
+    if os.path.exists(CONDENSED_FILE):
+        os.remove(CONDENSED_FILE)
+    shutil.rmtree("data/metadata", ignore_errors=True)
+    a = time.perf_counter()
+    condense_file(PosterCounter())
+    seconds = time.perf_counter() - a
+    return count_csv_rows(COMBINED_FILE), os.path.getsize(COMBINED_FILE), seconds
+
+
+def run_split_condensed_file():
+    from WordleCompileFiles import CONDENSED_FILE, split_condensed_file
+
+    for filename in glob.glob("data/condensed/wordle.*.csv"):
+        os.remove(filename)
+    a = time.perf_counter()
+    split_condensed_file()
+    seconds = time.perf_counter() - a
+    return count_csv_rows(CONDENSED_FILE), os.path.getsize(CONDENSED_FILE), seconds
+
+
+# condenses the first day file with the Cloud Function's condense_day_file, from a local bucket
+def run_condense_day_file():
+    shutil.rmtree("cloud", ignore_errors=True)
+    os.environ["WORDLE_LOCAL_CLOUD_DIR"] = os.path.abspath("cloud")
+    from GCPCompileFiles import condense_day_file, get_storage_client
+
+    name = f"day_files/wordle.{STAGE_FIRST_NUM}.api.csv"
+    filename = f"data/wordle.{STAGE_FIRST_NUM}.api.csv"
+    bucket = get_storage_client().bucket(STAGE_BUCKET)
+    bucket.blob(name).upload_from_filename(filename)
+    a = time.perf_counter()
+    condense_day_file(STAGE_BUCKET, name, PipelineMetrics("benchmark"))
+    seconds = time.perf_counter() - a
+    return count_csv_rows(filename), os.path.getsize(filename), seconds
+
+
+# runs a stage in the work dir, with its output hidden, returning its rows, input bytes,
+# seconds and the peak memory of the process. each stage runs in a fresh process
+# (started with exec), so the peak is its own
+def run_stage(stage, work_dir):
+    os.chdir(work_dir)
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        rows, size, seconds = globals()["run_" + stage]()
+    return {
+        "rows": rows,
+        "bytes": size,
+        "seconds": seconds,
+        "rows_per_second": rows / seconds,
+        "mb_per_second": size / seconds / 1e6,
+        "peak_rss_mb": get_peak_rss() / 1e6,
+    }
+
+
+# generates the inputs of the stage benchmark in the work dir, unless they are already there
+def make_stage_inputs(rows, work_dir):
+    inputs_file = os.path.join(work_dir, "inputs.json")
+    inputs = {"rows": rows, "wordle_nums": STAGE_WORDLE_NUMS}
+    if os.path.exists(inputs_file):
+        with open(inputs_file) as f:
+            if json.load(f) == inputs:
+                return
+    shutil.rmtree(work_dir, ignore_errors=True)
+    nums = range(STAGE_FIRST_NUM, STAGE_FIRST_NUM + STAGE_WORDLE_NUMS)
+    write_day_files(os.path.join(work_dir, "data"), nums, rows // STAGE_WORDLE_NUMS)
+    os.makedirs(os.path.join(work_dir, "data", "condensed"))
+    write_status_pages(
+        os.path.join(work_dir, "pages.jsonl"),
+        STAGE_FIRST_NUM,
+        min(rows, STAGE_MAX_STATUSES),
+    )
+    with open(inputs_file, "w") as f:
+        json.dump(inputs, f)
+
+
+# times each pipeline stage over synthetic data of about the given number of rows
+# (see WordleSynthetic.py), reporting the throughput of the fastest of the given number of
+# runs and the highest peak memory, and the change in throughput since the last run of the
+# same size, saved to benchmark.json in the work dir
+def bench_stages(rows, work_dir, repeats=STAGE_REPEATS):
+    work_dir = os.path.abspath(work_dir)
+    make_stage_inputs(rows, work_dir)
+    results_file = os.path.join(work_dir, "benchmark.json")
+    previous = {}
+    if os.path.exists(results_file):
+        with open(results_file) as f:
+            previous = json.load(f)
+    results = {}
+    context = multiprocessing.get_context("spawn")
+    for stage in STAGES:
+        runs = []
+        for _ in range(repeats):
+            with ProcessPoolExecutor(1, mp_context=context) as pool:
+                runs.append(pool.submit(run_stage, stage, work_dir).result())
+        result = min(runs, key=lambda run: run["seconds"])
+        result["peak_rss_mb"] = max(run["peak_rss_mb"] for run in runs)
+        result["run_seconds"] = [run["seconds"] for run in runs]
+        results[stage] = result
+        change = ""
+        if stage in previous:
+            before = previous[stage]["rows_per_second"]
+            change = f" | vs last: {result['rows_per_second'] / before - 1:+.0%}"
+        print(
+            f"{stage} | {result['rows']:,} rows in {result['seconds']:.2f}s",
+            f"(best of {len(runs)}, slowest {max(result['run_seconds']):.2f}s)",
+            f"| {result['rows_per_second']:,.0f} rows/sec",
+            f"| {result['mb_per_second']:,.1f} MB/sec",
+            f"| peak {result['peak_rss_mb']:,.0f} MB{change}",
+        )
+    with open(results_file, "w") as f:
+        json.dump(results, f, indent=2)
+
+
+# usage: python3 scripts/WordleBenchmark.py <parse|records|matrix|patterns|cleaning> <pages.jsonl> <wordle_num>
+# or: python3 scripts/WordleBenchmark.py stages <rows> <work dir> [repeats]
+def main():
+    bench = sys.argv[1]
+    if bench == "stages":
+        repeats = int(sys.argv[4]) if len(sys.argv) > 4 else STAGE_REPEATS
+        bench_stages(int(sys.argv[2]), sys.argv[3], repeats)
+    elif bench == "parse":
+        bench_parse(sys.argv[2], int(sys.argv[3]))
+    elif bench == "records":
+        bench_records(sys.argv[2], int(sys.argv[3]))
+    elif bench == "matrix":
+        bench_matrix(sys.argv[2], int(sys.argv[3]))
+    elif bench == "patterns":
+        bench_patterns(sys.argv[2], int(sys.argv[3]))
+    elif bench == "cleaning":
+        bench_cleaning(sys.argv[2], int(sys.argv[3]))
+    else:
+        raise Exception("unknown benchmark", bench)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+import time
+import numpy as np
+import pandas as pd
+from WordleMatrix import encode_matrices, contains_interior_win, is_win
+
+# Vectorized cleaning steps shared by the local (WordleCompileFiles.py) and Cloud Function
+# (GCPCompileFiles.py) compilers. Each step works on whole columns at once: values that repeat
+# (surfaces, times, user ids) are factorized and only their unique values are looked up or parsed,
+# and the matrix checks use the packed masks of WordleMatrix.py.
+# Every validation rule builds a mask over the same rows, and the masks are applied in one
+# filter, so the frame is only copied once.
+
+# surface ids of the known surfaces (clients), any other surface is OTHER_SURFACE_ID
+SURFACE_IDS = {
+    "Twitter for iPhone": 1,
+    "Twitter for Android": 2,
+    "Twitter Web App": 3,
+    "Twitter for iPad": 4,
+    "Tweetbot for iΟS": 5,
+    "TweetDeck": 6,
+}
+OTHER_SURFACE_ID = 7
+# the format of the tweet time strings, i.e. "Wed Jan 12 10:01:02 +0000 2022"
+TIME_FORMAT = "%a %b %d %H:%M:%S +0000 %Y"
+# the validation rules, in the order they are checked
+# a row failing several rules is counted under the first one only
+REJECTION_REASONS = ["interior_win", "matrix_size_mismatch", "matrix_win_mismatch"]
+
+
+# returns the surface id of each surface string, as an int array
+def get_surface_ids(surfaces):
+    codes, uniques = pd.factorize(surfaces)
+    # the extra last value is the id of missing surfaces, which have a code of -1
+    ids = [SURFACE_IDS.get(surface, OTHER_SURFACE_ID) for surface in uniques]
+    return np.array(ids + [OTHER_SURFACE_ID], dtype=np.int64)[codes]
+
+
+# returns each time string as a datetime, in UTC without a time zone
+# many tweets share a second, so only the unique strings are parsed
+def parse_times(times):
+    codes, uniques = pd.factorize(times)
+    parsed = pd.to_datetime(uniques, format=TIME_FORMAT).to_numpy()
+    return pd.Series(parsed[codes], index=getattr(times, "index", None))
+
+
+# returns each time string as an int timestamp, reading the time as local time
+# (like datetime.timestamp() of the naive time, which the local compiler has always used)
+def get_timestamps(times):
+    parsed = parse_times(times)
+    if time.timezone == 0 and not time.daylight:
+        # local time is UTC, so no conversion is needed
+        return ((parsed - pd.Timestamp(0)) // pd.Timedelta(seconds=1)).to_numpy()
+    codes, uniques = pd.factorize(parsed)
+    stamps = [int(t.timestamp()) for t in uniques.to_pydatetime()]
+    return np.array(stamps, dtype=np.int64)[codes]
+
+
+# returns the index of each id, calling get_index once for each unique id,
+# in order of first appearance, so new ids are numbered in the same order as a row by row map
+def map_ids(ids, get_index):
+    codes, uniques = pd.factorize(ids, use_na_sentinel=False)
+    return np.array([get_index(id) for id in uniques], dtype=np.int64)[codes]
+
+
+# fixes the win and rounds columns of the frame, and returns a mask for each validation rule
+# the packed and matrix_rows columns must hold the packed matrices, see WordleMatrix.py
+def get_rejection_masks(df):
+    packed, rows = df["packed"].to_numpy(), df["matrix_rows"].to_numpy()
+    masks = {}
+    # filter out interior win matrices
+    masks["interior_win"] = contains_interior_win(packed, rows)
+
+    # fix wins to include colorblind wins
+    colorblind_win = (df["colorblind"] == 1).to_numpy() & is_win(packed, rows)
+    df["win"] = df["win"].mask(colorblind_win, 1)
+    # fix lowercase x to uppercase
+    df["rounds"] = df["rounds"].mask(df["rounds"] == "x", "X")
+    # fix rounds for when rounds = 6 and win = 0
+    df["rounds"] = df["rounds"].mask((df["rounds"] == "6") & (df["win"] == 0), "X")
+
+    # drop rows where round count != matrix rows
+    is_loss = df["rounds"] == "X"
+    round_count = pd.to_numeric(df["rounds"].mask(is_loss, "6"))
+    masks["matrix_size_mismatch"] = (rows != round_count).to_numpy()
+
+    # drop rows where round = X and win = 1, or round != X and win = 0
+    masks["matrix_win_mismatch"] = (
+        ((df["win"] == 1) & is_loss) | ((df["win"] == 0) & ~is_loss)
+    ).to_numpy()
+    return masks
+
+
+# applies the fixes and validation rules to the frame in one filter
+# returns the rows that pass, and the number of rows rejected for each reason
+def filter_rows(df):
+    df["packed"], df["matrix_rows"] = encode_matrices(df["matrix"])
+    masks = get_rejection_masks(df)
+    rejected = {}
+    reject = np.zeros(len(df), dtype=bool)
+    for reason in REJECTION_REASONS:
+        rejected[reason] = int((masks[reason] & ~reject).sum())
+        reject |= masks[reason]
+    df = df[~reject]
+    return df.drop(columns=["packed", "matrix_rows"]), rejected
+
+
+# maps the surfaces and user ids of a frame of tweets, applies the fixes and validation rules,
+# and drops the tweet ids, returning the condensed rows and the number rejected for each reason
+# get_user_indexes returns the index of each id of the user id column, numbering new ids in order
+# of first appearance, like UserIndexStore.get_indexes
+def condense_rows(df, get_user_indexes):
+    # map surface string to id
+    df["surface"] = get_surface_ids(df["surface"])
+    # map user id to user anon index
+    df["user_id"] = get_user_indexes(df["user_id"])
+    df, rejected = filter_rows(df)
+    # drop tweet ids
+    return df.drop(columns="tweet_id"), rejected
@@ -1,123 +1,229 @@
 import csv
+import io
 import os
+import sys
+import shutil
 import time
-from datetime import datetime
+from collections import OrderedDict
+from itertools import accumulate
+from multiprocessing import Pool
 import glob
 import pandas as pd
 import numpy as np
+from WordleCleaning import condense_rows, get_timestamps, map_ids
+from WordleDedup import SortedIdSet, dedup_lines, get_range_ids
+from WordleDataset import DATASET_FOLDER, convert_csv
+from WordleManifest import CompileManifest, TWEET_IDS_FOLDER, get_file_info
+from UserIndexStore import UserIndexStore
+from PipelineMetrics import PipelineMetrics, get_metrics_file_path
 
-# returns the surface index for the given surface string
-def get_surface_id(surface_string):
-    if surface_string == "Twitter for iPhone":
-        return 1
-    if surface_string == "Twitter for Android":
-        return 2
-    if surface_string == "Twitter Web App":
-        return 3
-    if surface_string == "Twitter for iPad":
-        return 4
-    if surface_string == "Tweetbot for iΟS":
-        return 5
-    if surface_string == "TweetDeck":
-        return 6
-    return 7
-
-
-# returns the given datetime string in timestamp form
-def get_timestamp(time_string):
-    return int(datetime.strptime(time_string, "%a %b %d %H:%M:%S +0000 %Y").timestamp())
-
-
-# whether the given matrix contains a win not in the final row
-# this signals that the matrix is invalid
-def contains_interior_win(matrix):
-    rows = [matrix[i : i + 5] for i in range(0, len(matrix), 5)]
-    try:
-        return rows.index("CCCCC") != len(rows) - 1
-    except:
-        return False
+# metrics of this run, written to data/metrics/ when it ends
+metrics = PipelineMetrics("local_compile")
+
+COMBINED_FILE = "data/all_wordle.csv"
+CONDENSED_FILE = "data/condensed/all_wordle.csv"
+# folder of the UserIndexStore of user indexes given so far, kept between runs
+USER_INDEX_FOLDER = "data/metadata"
+
+# rows of data/all_wordle.csv condensed at a time
+CONDENSE_CHUNK_ROWS = 100000
+# worker processes used by the "parallel" flag
+CONDENSE_WORKERS = os.cpu_count()
+# files kept open at once when splitting the condensed file by wordle number
+SPLIT_OPEN_FILES = 64
 
 
 # counter class used to replace the user id with an increasing index
-# newly seen user ids are given the next index
+# newly seen user ids are given the next index, kept between runs in a UserIndexStore
 class PosterCounter:
-    poster_count = 0
-    poster_id_map = {}
-
-    def get_poster_index(self, id):
-        if id in self.poster_id_map:
-            return self.poster_id_map[id]
-        else:
-            self.poster_count += 1
-            self.poster_id_map[id] = self.poster_count
-            return self.poster_count
+    def __init__(self, folder=USER_INDEX_FOLDER):
+        self.store = UserIndexStore.local(folder)
 
+    @property
+    def poster_count(self):
+        return len(self.store)
 
-# Opens data/all_wordle.csv, containing every wordle tweet in full form,
-# and condenses it into data/condensed/all_wordle.csv
-def condense_file():
-    i = 0
-    PC = PosterCounter()
-    with open("data/condensed/all_wordle.csv", "w") as f:
-        f.write("")
-    for df in pd.read_csv("data/all_wordle.csv", chunksize=100000, dtype={12: str}):
+    def get_poster_index(self, id):
+        return self.store.get_index(id)
+
+    # returns the index of each user id of a column, see UserIndexStore.get_indexes
+    def get_poster_indexes(self, ids):
+        return self.store.get_indexes(ids)
+
+    # continues from the first count indexes, dropping any after them
+    def load(self, count):
+        self.store.truncate(count)
+
+    def save(self):
+        self.store.save()
+
+
+# condenses a chunk of data/all_wordle.csv, mapping the user id column to anon indexes with the
+# given function, returning the condensed chunk, and the number of rows rejected by each check
+# see WordleCleaning.py for the cleaning steps, shared with the Cloud Function
+def condense_chunk(df, get_user_indexes):
+    # map time string to timestamp
+    df["time"] = get_timestamps(df["time"])
+    return condense_rows(df, get_user_indexes)
+
+
+# records the rows read, rejected and written for a condensed chunk
+def record_chunk_metrics(rows_read, rejected, rows_written):
+    metrics.count("rows_read", rows_read)
+    for reason, count in rejected.items():
+        metrics.count("rejected_rows", count, reason=reason)
+    metrics.count("rows_written", rows_written, file="condensed")
+
+
+# returns the header line of the file, and the (start, end) byte offsets of each chunk of
+# CONDENSE_CHUNK_ROWS rows in the given byte range (by default every row after the header),
+# the same rows read_csv gives for each chunk (rows of the files never contain newlines)
+def get_chunk_ranges(filename, start=None, end=None):
+    ranges = []
+    with open(filename, "rb") as f:
+        header = f.readline()
+        start = f.tell() if start is None else max(start, f.tell())
+        end = os.path.getsize(filename) if end is None else end
+        f.seek(start)
+        offset = start
+        rows = 0
+        while offset < end:
+            block = f.read(min(8 << 20, end - offset))
+            if len(block) == 0:
+                break  # the file is shorter than the range
+            newlines = np.flatnonzero(np.frombuffer(block, dtype=np.uint8) == 10)
+            # the newline ending the last row of each chunk in this block
+            ends = np.arange(
+                CONDENSE_CHUNK_ROWS - rows - 1, len(newlines), CONDENSE_CHUNK_ROWS
+            )
+            for newline in newlines[ends]:
+                ranges.append((start, offset + int(newline) + 1))
+                start = offset + int(newline) + 1
+            rows = (rows + len(newlines)) % CONDENSE_CHUNK_ROWS
+            offset += len(block)
+        if offset > start:
+            ranges.append((start, offset))
+    return header, ranges
+
+
+# reads the rows of the file (data/all_wordle.csv by default) in the given byte range,
+# as read_csv would for the chunk
+def read_chunk(header, chunk_range, filename=COMBINED_FILE, **kwargs):
+    start, end = chunk_range
+    with open(filename, "rb") as f:
+        f.seek(start)
+        data = f.read(end - start)
+    return pd.read_csv(io.BytesIO(header + data), dtype={12: str}, **kwargs)
+
+
+# worker for the first parallel pass, returns the user ids of a chunk in order of first appearance
+def get_chunk_user_ids(header, chunk_range):
+    df = read_chunk(header, chunk_range, usecols=["user_id"])
+    return pd.unique(df["user_id"]).tolist()
+
+
+# worker for the second parallel pass, condenses a chunk with the user indexes given for it
+# returns the condensed rows as csv text, along with the chunk's row counts
+def condense_chunk_range(header, chunk_range, user_indexes, write_header):
+    df = read_chunk(header, chunk_range)
+    rows_read = len(df)
+    df, rejected = condense_chunk(
+        df, lambda ids: map_ids(ids, user_indexes.__getitem__)
+    )
+    text = df.to_csv(index=False, header=write_header)
+    return text, rows_read, rejected, len(df)
+
+
+# condenses the chunks in order, writing them to the open condensed file
+# returns the size of the condensed file and the user count after each chunk
+def condense_chunks(header, ranges, PC, write_header, f):
+    chunk_ends = []
+    for i, chunk_range in enumerate(ranges):
         print(i)
-        # map surface string to id
-        df["surface"] = df["surface"].map(get_surface_id)
-        # map time string to timestamp
-        df["time"] = df["time"].map(get_timestamp)
-        # map user id to user anon index
-        df["user_id"] = df["user_id"].map(PC.get_poster_index)
-
-        # add column for interior win matrices, then filter by it and drop it
-        df["contains_interior_win"] = df["matrix"].map(contains_interior_win)
-        df = df[df["contains_interior_win"] == False]
-        df.drop("contains_interior_win", axis=1, inplace=True)
-
-        # fix wins to include colorblind wins
-        df.loc[(df["colorblind"] == 1) & df["matrix"].str.endswith("CCCCC"), "win"] = 1
-        # fix lowercase x to uppercase
-        df.loc[df["rounds"] == "x", "rounds"] = "X"
-        # fix rounds for when rounds = 6 and win = 0
-        df.loc[(df["rounds"] == "6") & (df["win"] == 0), "rounds"] = "X"
-
-        # drop rows where round count != matrix length * 5
-        df["matrix_size_mismatch"] = df["matrix"].str.len() / 5 != pd.to_numeric(
-            np.where(df["rounds"] == "X", 6, df["rounds"])
-        )
-        df = df[df["matrix_size_mismatch"] == False]
-        df.drop("matrix_size_mismatch", axis=1, inplace=True)
-
-        # drop rows where round = X and win = 1, or round != X and win = 0
-        df["matrix_win_mismatch"] = ((df["win"] == 1) & (df["rounds"] == "X")) | (
-            (df["win"] == 0) & (df["rounds"] != "X")
+        df = read_chunk(header, chunk_range)
+        rows_read = len(df)
+        df, rejected = condense_chunk(df, PC.get_poster_indexes)
+        record_chunk_metrics(rows_read, rejected, len(df))
+        df.to_csv(f, index=False, header=write_header and i == 0)
+        chunk_ends.append((f.tell(), PC.poster_count))
+    print(len(ranges))
+    return chunk_ends
+
+
+# condense_chunks, with the chunks condensed in a pool of worker processes
+# user indexes must be given in order of first appearance, like the serial version, so for each
+# window of chunks the workers first return each chunk's user ids, which are then numbered in order
+# here, before the chunks are condensed with them. the output is the same, byte for byte
+def condense_chunks_parallel(header, ranges, PC, write_header, f, pool, workers):
+    window = workers * 4
+    print("condensing", len(ranges), "chunks with", workers, "workers")
+    chunk_ends = []
+    for window_start in range(0, len(ranges), window):
+        window_ranges = ranges[window_start : window_start + window]
+        chunk_user_ids = pool.starmap(
+            get_chunk_user_ids, [(header, r) for r in window_ranges]
         )
-        df = df[df["matrix_win_mismatch"] == False]
-        df.drop("matrix_win_mismatch", axis=1, inplace=True)
-
-        # drop rows where round count
-        # print(df)
-        # print(df.info())
-        # break
-
-        # # drop tweet ids
-        df.drop("tweet_id", axis=1, inplace=True)
-        print(i)
-        if i == 0:
-            df.to_csv("data/condensed/all_wordle.csv", index=False, mode="w")
+        tasks = []
+        user_counts = []
+        for i, (chunk_range, user_ids) in enumerate(zip(window_ranges, chunk_user_ids)):
+            indexes = PC.get_poster_indexes(np.array(user_ids, dtype=np.int64))
+            user_indexes = dict(zip(user_ids, indexes.tolist()))
+            user_counts.append(PC.poster_count)
+            is_first = write_header and window_start + i == 0
+            tasks.append((header, chunk_range, user_indexes, is_first))
+        for i, (text, rows_read, rejected, rows_written) in enumerate(
+            pool.starmap(condense_chunk_range, tasks)
+        ):
+            print(window_start + i)
+            record_chunk_metrics(rows_read, rejected, rows_written)
+            f.write(text)
+            chunk_ends.append((f.tell(), user_counts[i]))
+    print(len(ranges))
+    return chunk_ends
+
+
+# Condenses the rows of data/all_wordle.csv, containing every wordle tweet in full form,
+# in the given byte range (all of them by default), appending them to
+# data/condensed/all_wordle.csv, with user ids replaced by indexes from the given counter.
+# With a pool, the chunks are condensed in its worker processes, all of the range at once.
+# The range can be split into parts at the given end offsets (i.e. one part per day file), so no
+# chunk spans two parts, and the size of the condensed file and the user count after each part
+# are returned
+def condense_file(
+    PC, start=None, end=None, pool=None, workers=CONDENSE_WORKERS, part_ends=None
+):
+    points = [start] + (part_ends or [end])
+    ranges = []
+    last_chunks = []
+    for part_start, part_end in zip(points, points[1:]):
+        header, part_ranges = get_chunk_ranges(COMBINED_FILE, part_start, part_end)
+        ranges += part_ranges
+        last_chunks.append(len(ranges) - 1)
+    with open(CONDENSED_FILE, "a", newline="") as f:
+        offset = f.tell()
+        write_header = offset == 0
+        # a part with no rows ends where the one before it did
+        last_end = (offset, PC.poster_count)
+        if pool is None:
+            chunk_ends = condense_chunks(header, ranges, PC, write_header, f)
         else:
-            df.to_csv(
-                "data/condensed/all_wordle.csv",
-                mode="a",
-                header=False,
-                index=False,
+            chunk_ends = condense_chunks_parallel(
+                header, ranges, PC, write_header, f, pool, workers
             )
-        i += 1
-    print(i)
-
-
-def create_combined_file(filenames, wordle_num):
-    ids = {}
+        metrics.count("bytes_written", f.tell() - offset, file="condensed")
+    part_ends = []
+    for last_chunk in last_chunks:
+        if last_chunk >= 0:
+            last_end = chunk_ends[last_chunk]
+        part_ends.append(last_end)
+    return part_ends
+
+
+# combines the data files into one, keeping only the first row of each tweet id
+# see WordleDedup.py for how ids are deduped within bounded memory
+# to append to the combined file, give the ids seen in it, see dedup_lines
+# returns the number of bytes written for each file
+def create_combined_file(filenames, wordle_num, seen=None, seen_strings=None):
     dupes = 0
     a = time.time()
     if wordle_num is None:
@@ -125,28 +231,43 @@ def create_combined_file(filenames, wordle_num):
     else:
         write_file = "data/all_wordle." + str(wordle_num) + ".csv"
 
-    with open(write_file, "w") as fout:
-        for filename in filenames:
-            print(filename)
-            file_rows = 0
-            file_dupes = 0
-            with open(filename) as f:
-                if filename != filenames[0]:
-                    f.__next__()
-                for line in f:
-                    tweet_id = line.split(",")[1]
-                    if tweet_id not in ids:
-                        ids[tweet_id] = 1
-                        file_rows += 1
-                        fout.write(line)
-                    else:
-                        file_dupes += 1
-                        dupes += 1
-            print(file_rows, "saved | ", file_dupes, "dupes")
+    file_rows = [0] * len(filenames)
+    file_dupes = [0] * len(filenames)
+    file_bytes = [0] * len(filenames)
+
+    # prints and records the counts of a finished file
+    def finish_file(file_index):
+        print(file_rows[file_index], "saved | ", file_dupes[file_index], "dupes")
+        metrics.count("rows_written", file_rows[file_index], file="combined")
+        metrics.count("duplicate_tweets", file_dupes[file_index])
+        metrics.count("bytes_read", os.path.getsize(filenames[file_index]))
+
+    # the output is written as bytes, with lines exactly as read in text mode
+    with open(write_file, "wb" if seen is None else "ab") as fout:
+        current_file = None
+        for block, keep in dedup_lines(filenames, seen=seen, seen_strings=seen_strings):
+            file_index = block.file_index
+            if file_index != current_file:
+                if current_file is not None:
+                    finish_file(current_file)
+                current_file = file_index
+                print(filenames[file_index])
+            kept = int(keep.sum())
+            file_rows[file_index] += kept
+            file_dupes[file_index] += len(block) - kept
+            dupes += len(block) - kept
+            data = block.get_kept(keep)
+            file_bytes[file_index] += len(data)
+            fout.write(data)
+        if current_file is not None:
+            finish_file(current_file)
     b = time.time()
+    metrics.count("bytes_written", sum(file_bytes), file="combined")
     print("time:", b - a)
     print("duplicates:", dupes)
-    print("saved", len(ids))
+    # every kept row is the first of its id
+    print("saved", sum(file_rows))
+    return file_bytes
 
 
 def get_filenames_for_wordle_num(wordle_num):
@@ -165,68 +286,257 @@ def compile_files(wordle_num=None):
     create_combined_file(files, wordle_num)
 
 
-# splits the condensed file into individual wordle number files
-def split_condensed_file():
-    chunk_num = 0
-    wordle_num = None
-    continuation = False
-    for df in pd.read_csv(
-        "data/condensed/all_wordle.csv", chunksize=100000, dtype={12: str}
+# returns the per-number condensed file of the wordle number
+def get_split_filename(wordle_num, folder="data/condensed"):
+    return os.path.join(folder, "wordle." + str(wordle_num) + ".csv")
+
+
+# Writes rows to one csv file per wordle number, keeping up to max_open of the files open,
+# closing the least recently used one when another is needed. Each file is created with a
+# header the first time its number is seen, and appended to after that, so rows for a number
+# can come in any order, from any chunk. With append, files from earlier runs are appended to.
+class PartitionedWriter:
+    def __init__(self, folder, max_open=SPLIT_OPEN_FILES, append=False):
+        self.folder = folder
+        self.max_open = max_open
+        self.append = append
+        self.files = OrderedDict()
+        self.rows = {}
+
+    def get_filename(self, wordle_num):
+        return get_split_filename(wordle_num, self.folder)
+
+    # returns the open file for the wordle number, opening it if needed
+    def get_file(self, wordle_num):
+        f = self.files.get(wordle_num)
+        if f is not None:
+            self.files.move_to_end(wordle_num)
+            return f
+        if len(self.files) >= self.max_open:
+            self.files.popitem(last=False)[1].close()
+        mode = "a" if self.append or wordle_num in self.rows else "w"
+        f = open(self.get_filename(wordle_num), mode, newline="")
+        self.files[wordle_num] = f
+        return f
+
+    # writes the rows of the dataframe, which all have the given wordle number
+    # with a header if the file is empty
+    def write(self, wordle_num, df):
+        f = self.get_file(wordle_num)
+        df.to_csv(f, header=f.tell() == 0, index=False)
+        self.rows[wordle_num] = self.rows.get(wordle_num, 0) + len(df)
+
+    # writes each wordle number's rows of the dataframe to its file
+    def write_groups(self, df, column="wordle_num"):
+        for wordle_num, group in df.groupby(column, sort=False):
+            self.write(int(wordle_num), group)
+
+    def close(self):
+        while len(self.files) != 0:
+            self.files.popitem()[1].close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+# splits the rows of the condensed file in the given byte range (all of them by default)
+# into a file per wordle number, in one pass over its chunks, returning the size of each file
+# written to. the rows don't need to be sorted by wordle number
+def split_condensed_file(start=None, end=None, append=False):
+    header, ranges = get_chunk_ranges(CONDENSED_FILE, start, end)
+    with PartitionedWriter("data/condensed", append=append) as writer:
+        for chunk_num, chunk_range in enumerate(ranges):
+            print("getting chunk", chunk_num)
+            df = read_chunk(header, chunk_range, CONDENSED_FILE)
+            writer.write_groups(df)
+            metrics.count("rows_written", len(df), file="split")
+    for wordle_num, rows in sorted(writer.rows.items()):
+        print("saved wordle", wordle_num, "-", str(rows), "tweets")
+    metrics.count("split_files", len(writer.rows))
+    return {num: os.path.getsize(writer.get_filename(num)) for num in writer.rows}
+
+
+# cuts the file back to the given size
+def truncate_file(filename, size):
+    with open(filename, "r+b") as f:
+        f.truncate(size)
+
+
+# removes every compiled output, for a full rebuild
+def remove_outputs():
+    for filename in [COMBINED_FILE, CONDENSED_FILE] + list(
+        get_split_filenames().values()
     ):
-        print("getting chunk", chunk_num)
-        if wordle_num == None:
-            wordle_num = df.loc[0]["wordle_num"]
-        while True:
-            tweets_for_num = df[df["wordle_num"] == wordle_num]
-            tweets_for_next_num = df[df["wordle_num"] == wordle_num + 1]
-            # if there are tweets for the current num, save them
-            if len(tweets_for_num) > 0:
-                # if it is a continuation from the last chunk,
-                # append to the existing file
-                if continuation:
-                    print(
-                        "continuing to save wordle",
-                        wordle_num,
-                        "-",
-                        str(len(tweets_for_num)),
-                        "tweets",
-                    )
-                    tweets_for_num.to_csv(
-                        "data/condensed/wordle." + str(wordle_num) + ".csv",
-                        mode="a",
-                        header=False,
-                        index=False,
-                    )
-                    continuation = False
-                else:
-                    print(
-                        "saving wordle",
-                        wordle_num,
-                        "-",
-                        str(len(tweets_for_num)),
-                        "tweets",
-                    )
-                    tweets_for_num.to_csv(
-                        "data/condensed/wordle." + str(wordle_num) + ".csv",
-                        index=False,
-                        mode="w",
-                    )
-            # if there are no tweets for the next number,
-            # set continuation to true, and break to get next chunk
-            if len(tweets_for_next_num) == 0:
-                continuation = True
-                break
-
-            # if there are tweets for the next number,
-            # incriment the wordle_num
-            wordle_num += 1
-        chunk_num += 1
+        if os.path.exists(filename):
+            os.remove(filename)
+    shutil.rmtree(DATASET_FOLDER, ignore_errors=True)
+    shutil.rmtree(TWEET_IDS_FOLDER, ignore_errors=True)
+
+
+# returns the per-number condensed files, by wordle number
+def get_split_filenames():
+    filenames = {}
+    for filename in glob.glob(get_split_filename("*")):
+        num = filename.split(".")[-2]
+        if num.isdigit():
+            filenames[int(num)] = filename
+    return filenames
+
+
+# whether every output is at least as long as the manifest says it was before the given index
+def outputs_reach(manifest, index):
+    checkpoint = manifest.get_checkpoint(index)
+    sizes = {
+        COMBINED_FILE: checkpoint["combined_end"],
+        CONDENSED_FILE: checkpoint["condensed_end"],
+    }
+    for num, size in manifest.get_partition_sizes(index).items():
+        sizes[get_split_filename(num)] = size
+    for filename, size in sizes.items():
+        if not os.path.exists(filename) or os.path.getsize(filename) < size:
+            return False
+    for i in range(index):
+        if not os.path.exists(manifest.get_ids_path(i)):
+            return False
+    return len(PosterCounter().store) >= checkpoint["user_count"]
+
+
+# returns the manifest of the last run, and the index of the first day file to process
+# everything is rebuilt (from index 0) with full, or if the outputs don't match the manifest
+def get_compile_start(filenames, full):
+    manifest = None if full else CompileManifest.load()
+    if manifest is None:
+        return CompileManifest(), 0
+    index = manifest.get_rewind_index(filenames)
+    if not outputs_reach(manifest, index):
+        print("Compiled outputs don't match the manifest, rebuilding everything")
+        return CompileManifest(), 0
+    return manifest, index
+
+
+# cuts every output back to where it was before the day file at the given index,
+# including any written by a run that didn't finish. returns the wordle numbers whose files changed
+def rewind_outputs(manifest, index):
+    checkpoint = manifest.get_checkpoint(index)
+    truncate_file(COMBINED_FILE, checkpoint["combined_end"])
+    truncate_file(CONDENSED_FILE, checkpoint["condensed_end"])
+    sizes = manifest.get_partition_sizes(index)
+    changed_nums = set()
+    for num, filename in get_split_filenames().items():
+        if num not in sizes:
+            os.remove(filename)
+        elif os.path.getsize(filename) != sizes[num]:
+            truncate_file(filename, sizes[num])
+        else:
+            continue
+        changed_nums.add(num)
+    manifest.truncate(index)
+    return changed_nums
+
+
+# rewrites the dataset partitions of the given wordle numbers from their condensed files
+def update_dataset(wordle_nums):
+    filenames = []
+    for num in sorted(wordle_nums):
+        if os.path.exists(get_split_filename(num)):
+            filenames.append(get_split_filename(num))
+        else:
+            shutil.rmtree(
+                os.path.join(DATASET_FOLDER, f"wordle_num={num}"), ignore_errors=True
+            )
+    convert_csv(filenames)
+
+
+# compiles the day files that are new or changed since the last run (or every one, with full),
+# appending them to the combined, condensed and per-number files, and updating the dataset
+# partitions they touch. each file is combined, condensed and split in turn, so the manifest
+# can record where each output ended after it, see WordleManifest.py
+def compile_day_files(full=False, parallel=False):
+    filenames = get_filenames_for_all_wordles()
+    manifest, index = get_compile_start(filenames, full)
+    if index == len(filenames) == len(manifest.files):
+        print("No new or changed day files")
+        return
+    if index == 0:
+        print("Compiling every day file")
+        remove_outputs()
+        manifest.truncate(0)
+        touched_nums = set()
+    else:
+        print("Compiling from", filenames[index], "-", index, "files unchanged")
+        touched_nums = rewind_outputs(manifest, index)
+    new_filenames = filenames[index:]
+    metrics.set("day_files_compiled", len(new_filenames))
+    metrics.set("day_files_skipped", index)
+    checkpoint = manifest.get_checkpoint(index)
+    PC = PosterCounter()
+    PC.load(checkpoint["user_count"])
 
+    with metrics.stage("combine"):
+        if index == 0:
+            file_bytes = create_combined_file(new_filenames, None)
+        else:
+            runs, strings = manifest.get_seen_ids(index)
+            file_bytes = create_combined_file(
+                new_filenames, None, SortedIdSet(runs), strings
+            )
 
+    # the new files are condensed in one pass, so in parallel mode the chunks of every file
+    # are spread across the pool together, and each file's offsets come from its last chunk
+    combined_ends = list(accumulate(file_bytes, initial=checkpoint["combined_end"]))
+    pool = Pool(CONDENSE_WORKERS) if parallel else None
+    try:
+        with metrics.stage("condense"):
+            file_ends = condense_file(
+                PC,
+                combined_ends[0],
+                combined_ends[-1],
+                pool,
+                part_ends=combined_ends[1:],
+            )
+    finally:
+        if pool is not None:
+            pool.close()
+
+    condensed_end = checkpoint["condensed_end"]
+    for i, filename in enumerate(new_filenames):
+        print("compiling", filename)
+        combined_start, combined_end = combined_ends[i], combined_ends[i + 1]
+        ids, id_strings = get_range_ids(COMBINED_FILE, combined_start, combined_end)
+        condensed_start, (condensed_end, user_count) = condensed_end, file_ends[i]
+        with metrics.stage("split"):
+            sizes = split_condensed_file(condensed_start, condensed_end, True)
+        touched_nums.update(sizes)
+        manifest.add_file(
+            get_file_info(filename),
+            ids,
+            id_strings,
+            combined_end=combined_end,
+            condensed_end=condensed_end,
+            user_count=user_count,
+            partitions={str(num): size for num, size in sizes.items()},
+        )
+    PC.save()
+
+    # typed, partitioned copy of the condensed data, see WordleDataset.py
+    with metrics.stage("dataset"):
+        update_dataset(touched_nums)
+    manifest.save()
+
+
+# usage: python3 scripts/WordleCompileFiles.py [parallel] [--full]
+# with the "parallel" flag, the condense step runs on every core
+# only the day files that are new or changed since the last run are compiled,
+# unless the "--full" flag is given, which rebuilds everything
 def main():
-    compile_files()
-    condense_file()
-    split_condensed_file()
+    args = sys.argv[1:]
+    try:
+        compile_day_files(full="--full" in args, parallel="parallel" in args)
+    finally:
+        metrics.write(get_metrics_file_path("all_wordle.compile"))
 
 
 if __name__ == "__main__":
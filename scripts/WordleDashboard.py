@@ -0,0 +1,209 @@
+import os
+import glob
+import gzip
+import json
+import time
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from GHQueryForViewData import get_view_path
+
+# Compact, dashboard-ready artifacts of the rounds view (data_views/wordle_rounds_count.csv),
+# written to data_views/dashboard/. Each wordle number is one wide row: the count of each round,
+# totals, the win rate and mean rounds of wins, percentiles, and the cumulative distribution, so a
+# dashboard plots them without pivoting. Rows are split into shards of SHARD_NUMBERS numbers,
+# each as gzip compressed columnar JSON and as zstd compressed Parquet, and index.json.gz lists
+# the shards, with the latest number's row for a first paint. Each shard is compared with the
+# rows of its Parquet file, and only the shards that changed are rewritten, whichever numbers the
+# download changed, so an update and a dashboard's first load stay small as the numbers grow.
+
+DASHBOARD_FOLDER = "data_views/dashboard"
+INDEX_NAME = "index.json.gz"
+# files of the artifacts, all removed when there is no index, i.e. from the uncompressed layout
+ARTIFACT_NAMES = ["index.json", "rounds.*"]
+# wordle numbers of each shard, enough that the columns of a shard compress well
+SHARD_NUMBERS = 1000
+# the rounds of the view, in order, X (not solved) last
+ROUNDS = ["1", "2", "3", "4", "5", "6", "X"]
+# percentiles of the rounds of all games, where 7 means not solved
+PERCENTILES = [25, 50, 75, 90]
+# decimals of the fractions written to json
+JSON_DECIMALS = 4
+# zstd level of the parquet files, which are small and written once a day
+PARQUET_ZSTD_LEVEL = 19
+
+# the columns of the artifacts
+SCHEMA = pa.schema(
+    [("wordle_num", pa.int32())]
+    + [(f"count_{r.lower()}", pa.int32()) for r in ROUNDS]
+    + [
+        ("total", pa.int32()),
+        ("wins", pa.int32()),
+        ("win_rate", pa.float32()),
+        ("mean_rounds", pa.float32()),
+    ]
+    + [(f"p{p}", pa.int8()) for p in PERCENTILES]
+    + [(f"cdf_{r}", pa.float32()) for r in ROUNDS[:-1]]
+)
+
+
+# returns the wide rows of the given (wordle_num, rounds, count) rows, one per wordle number
+def get_distributions(counts):
+    wide = counts.pivot_table(
+        index="wordle_num", columns="rounds", values="count", aggfunc="sum"
+    )
+    wide = wide.reindex(columns=ROUNDS).fillna(0)
+    matrix = wide.to_numpy(np.int64)
+    total = matrix.sum(axis=1)
+    wins = total - matrix[:, -1]
+    cumulative = np.cumsum(matrix, axis=1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = (matrix[:, :-1] @ np.arange(1, len(ROUNDS))) / wins
+    columns = {"wordle_num": wide.index.to_numpy()}
+    for i, r in enumerate(ROUNDS):
+        columns[f"count_{r.lower()}"] = matrix[:, i]
+    columns["total"] = total
+    columns["wins"] = wins
+    columns["win_rate"] = wins / total
+    columns["mean_rounds"] = mean
+    for p in PERCENTILES:
+        # the first round by which p% of the games were done, 1 based
+        reached = cumulative * 100 >= total[:, None] * p
+        columns[f"p{p}"] = reached.argmax(axis=1) + 1
+    for i, r in enumerate(ROUNDS[:-1]):
+        columns[f"cdf_{r}"] = cumulative[:, i] / total
+    return pa.Table.from_pydict(columns).cast(SCHEMA).to_pandas()
+
+
+# returns the shard of each wordle number
+def get_shards(wordle_nums):
+    return np.asarray(wordle_nums, dtype=np.int64) // SHARD_NUMBERS
+
+
+def get_shard_name(shard):
+    return f"rounds.{shard:05d}"
+
+
+# returns the rows as columnar json, {column: [values]}, with fractions rounded and NaN as null
+def to_json_columns(df):
+    columns = {}
+    for column in df.columns:
+        values = df[column]
+        if pd.api.types.is_float_dtype(values):
+            values = values.astype(np.float64).round(JSON_DECIMALS)
+            columns[column] = [None if np.isnan(v) else v for v in values.tolist()]
+        else:
+            columns[column] = values.tolist()
+    return columns
+
+
+# writes the object as gzip compressed json, with no time stamp, so the same object gives
+# the same bytes
+def write_json_gz(path, obj, **kwargs):
+    with open(path, "wb") as f:
+        f.write(gzip.compress(json.dumps(obj, **kwargs).encode(), mtime=0))
+
+
+# writes the rows of a shard as json and parquet, returning its index entry
+def write_shard(folder, shard, rows):
+    name = get_shard_name(shard)
+    write_json_gz(
+        os.path.join(folder, name + ".json.gz"),
+        to_json_columns(rows),
+        separators=(",", ":"),
+    )
+    table = pa.Table.from_pandas(rows, schema=SCHEMA, preserve_index=False)
+    # the counts and fractions rarely repeat, so dictionaries only add to the size
+    pq.write_table(
+        table.replace_schema_metadata(None),
+        os.path.join(folder, name + ".parquet"),
+        compression="zstd",
+        compression_level=PARQUET_ZSTD_LEVEL,
+        use_dictionary=False,
+        use_byte_stream_split=[f.name for f in SCHEMA if pa.types.is_floating(f.type)],
+        write_statistics=False,
+    )
+    return {
+        "shard": shard,
+        "first": int(rows["wordle_num"].min()),
+        "last": int(rows["wordle_num"].max()),
+        "numbers": len(rows),
+        "json": name + ".json.gz",
+        "parquet": name + ".parquet",
+    }
+
+
+# returns the rows of a shard as written, or None if any of its files is missing
+def read_shard(folder, shard):
+    path = os.path.join(folder, get_shard_name(shard))
+    if not (os.path.exists(path + ".json.gz") and os.path.exists(path + ".parquet")):
+        return None
+    return pq.read_table(path + ".parquet").to_pandas()
+
+
+def delete_shard(folder, shard):
+    for extension in [".json.gz", ".parquet"]:
+        path = os.path.join(folder, get_shard_name(shard) + extension)
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def read_index(folder):
+    path = os.path.join(folder, INDEX_NAME)
+    if not os.path.exists(path):
+        return None
+    with gzip.open(path, "rt") as f:
+        return json.load(f)
+
+
+# writes the artifacts of the rounds view, only rewriting the shards whose rows changed
+def export_dashboard(folder=DASHBOARD_FOLDER):
+    os.makedirs(folder, exist_ok=True)
+    index = read_index(folder)
+    if index is None:
+        for pattern in ARTIFACT_NAMES:
+            for path in glob.glob(os.path.join(folder, pattern)):
+                os.remove(path)
+        index = {"shards": []}
+    entries = {entry["shard"]: entry for entry in index["shards"]}
+    counts = pd.read_csv(get_view_path("wordle_rounds_count"), dtype={"rounds": str})
+    rows = get_distributions(counts)
+    shards = get_shards(rows["wordle_num"])
+    written = 0
+    for shard in sorted(set(shards.tolist()) | set(entries)):
+        shard_rows = rows[shards == shard].reset_index(drop=True)
+        if len(shard_rows) == 0:
+            delete_shard(folder, shard)
+            del entries[shard]
+            continue
+        existing = read_shard(folder, shard) if shard in entries else None
+        if existing is not None and existing.equals(shard_rows):
+            continue
+        entries[shard] = write_shard(folder, shard, shard_rows)
+        written += 1
+    entries = [entries[shard] for shard in sorted(entries)]
+    latest = None
+    if len(rows) != 0:
+        last = rows.iloc[[rows["wordle_num"].idxmax()]]
+        latest = {c: v[0] for c, v in to_json_columns(last).items()}
+    index = {
+        "columns": SCHEMA.names,
+        "shard_numbers": SHARD_NUMBERS,
+        "shards": entries,
+        "latest": latest,
+    }
+    write_json_gz(os.path.join(folder, INDEX_NAME), index, indent=1)
+    print(f"wrote {written} of {len(entries)} dashboard shards to {folder}")
+
+
+# usage: python3 scripts/WordleDashboard.py
+# the shards whose rows are already written as they are now are left as they are
+def main():
+    a = time.time()
+    export_dashboard()
+    print(f"exported in {time.time() - a:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,209 @@
+import os
+import sys
+import time
+import glob
+from itertools import chain
+import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pv
+import pyarrow.dataset as ds
+from pyarrow import fs
+
+# Typed, columnar copy of the condensed data, as a Parquet dataset partitioned by wordle number
+# (data/condensed/dataset/wordle_num=N/part-0.parquet). Unlike the condensed csv files, readers
+# get typed columns without dtype hints, can read only the columns they need, and with a
+# wordle_nums filter only open the partitions of those numbers. Files are memory mapped.
+
+DATASET_FOLDER = "data/condensed/dataset"
+# bytes of a condensed csv file converted at a time
+CONVERT_BLOCK_BYTES = 16 << 20
+
+# the columns of the condensed data, see condense_rows in WordleCleaning.py
+# time is the int timestamp written by the compiler, and the flags are booleans like in BigQuery
+# language, rounds and theme have a few distinct values, so they are dictionary encoded
+SCHEMA = pa.schema(
+    [
+        ("time", pa.int64()),
+        ("user_id", pa.int64()),
+        ("surface", pa.int8()),
+        ("is_reply", pa.bool_()),
+        ("is_quote", pa.bool_()),
+        ("retweets", pa.int32()),
+        ("quotes", pa.int32()),
+        ("favs", pa.int32()),
+        ("replies", pa.int32()),
+        ("language", pa.dictionary(pa.int16(), pa.string())),
+        ("wordle_num", pa.int32()),
+        ("rounds", pa.dictionary(pa.int8(), pa.string())),
+        ("hard", pa.bool_()),
+        ("theme", pa.dictionary(pa.int8(), pa.string())),
+        ("colorblind", pa.bool_()),
+        ("win", pa.bool_()),
+        ("matrix", pa.string()),
+    ]
+)
+PARTITIONING = ds.partitioning(pa.schema([("wordle_num", pa.int32())]), flavor="hive")
+
+
+# returns the csv read options for a condensed file, with every column typed by the schema
+def get_convert_options(columns):
+    types = {name: SCHEMA.field(name).type for name in columns}
+    # dictionary columns are read as strings, then encoded when cast to the schema
+    for name, type in types.items():
+        if pa.types.is_dictionary(type):
+            types[name] = pa.string()
+    return pv.ConvertOptions(
+        column_types=types,
+        true_values=["1", "True", "true"],
+        false_values=["0", "False", "false"],
+        strings_can_be_null=True,
+    )
+
+
+# returns the schema of the columns present, in the order of the full schema
+def get_schema(columns):
+    return pa.schema([field for field in SCHEMA if field.name in columns])
+
+
+# yields the record batches of a condensed csv file, cast to the dataset schema
+def read_csv_batches(filename):
+    with open(filename) as f:
+        columns = f.readline().strip().split(",")
+    schema = get_schema(columns)
+    reader = pv.open_csv(
+        filename,
+        read_options=pv.ReadOptions(block_size=CONVERT_BLOCK_BYTES),
+        convert_options=get_convert_options(columns),
+    )
+    for batch in reader:
+        yield batch.select(schema.names).cast(schema)
+
+
+# reads the given columns of a condensed csv file into a dataframe, typed like the dataset
+def read_csv_columns(filename, columns):
+    schema = get_schema(columns)
+    options = get_convert_options(columns)
+    options.include_columns = schema.names
+    table = pv.read_csv(filename, convert_options=options)
+    return table.cast(schema).to_pandas()
+
+
+# writes the record batches to the dataset, replacing the partitions of every wordle number in them
+def write_batches(batches, schema, folder=DATASET_FOLDER):
+    ds.write_dataset(
+        batches,
+        folder,
+        schema=schema,
+        format="parquet",
+        partitioning=PARTITIONING,
+        basename_template="part-{i}.parquet",
+        existing_data_behavior="delete_matching",
+    )
+
+
+# writes a frame of condensed rows to the dataset, replacing the partitions of its wordle numbers
+def write_frame(df, folder=DATASET_FOLDER):
+    schema = get_schema(df.columns)
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    table = table.select(schema.names).cast(schema)
+    write_batches(table.to_batches(), schema, folder)
+
+
+# converts condensed csv files to the dataset, streaming a block at a time
+def convert_csv(filenames, folder=DATASET_FOLDER):
+    for filename in filenames:
+        print("converting", filename)
+        batches = read_csv_batches(filename)
+        first = next(batches, None)
+        if first is None:
+            continue
+        write_batches(chain([first], batches), first.schema, folder)
+    print("dataset written to", folder)
+
+
+# returns the dataset, read through memory maps
+def open_dataset(folder=DATASET_FOLDER):
+    return ds.dataset(
+        folder,
+        format="parquet",
+        partitioning=PARTITIONING,
+        filesystem=fs.LocalFileSystem(use_mmap=True),
+    )
+
+
+# reads the given columns (or all) of the given wordle numbers (or all) into a dataframe
+# only the partitions of those numbers are opened
+def read_dataset(columns=None, wordle_nums=None, folder=DATASET_FOLDER):
+    dataset = open_dataset(folder)
+    filter = None
+    if wordle_nums is not None:
+        filter = ds.field("wordle_num").isin([int(num) for num in wordle_nums])
+    return dataset.to_table(columns=columns, filter=filter).to_pandas()
+
+
+# returns the total size of the given files, in bytes
+def get_files_size(filenames):
+    return sum(os.path.getsize(filename) for filename in filenames)
+
+
+# returns the seconds taken by the given function
+def time_function(function):
+    a = time.perf_counter()
+    function()
+    return time.perf_counter() - a
+
+
+# compares the size of the condensed csv files with the dataset, and the time to scan
+# everything, and a few columns of a few numbers, from each
+def compare_with_csv(folder=DATASET_FOLDER):
+    csv_filenames = glob.glob("data/condensed/wordle.*.csv")
+    dataset_filenames = glob.glob(os.path.join(folder, "*", "*.parquet"))
+    csv_size = get_files_size(csv_filenames)
+    dataset_size = get_files_size(dataset_filenames)
+    print(
+        f"size | csv: {csv_size:,} bytes | dataset: {dataset_size:,} bytes",
+        f"| ratio: {csv_size / max(1, dataset_size):.1f}x",
+    )
+
+    csv_seconds = time_function(
+        lambda: [pd.read_csv(name, dtype={12: str}) for name in csv_filenames]
+    )
+    dataset_seconds = time_function(lambda: read_dataset(folder=folder))
+    print(
+        f"full scan | csv: {csv_seconds:.3f}s | dataset: {dataset_seconds:.3f}s",
+        f"| speedup: {csv_seconds / dataset_seconds:.1f}x",
+    )
+
+    # the last 3 numbers, the way the daily views use them
+    nums = sorted(int(name.split(".")[-2]) for name in csv_filenames)[-3:]
+    columns = ["wordle_num", "rounds", "win"]
+    csv_seconds = time_function(
+        lambda: [
+            pd.read_csv(f"data/condensed/wordle.{num}.csv", usecols=columns)
+            for num in nums
+        ]
+    )
+    dataset_seconds = time_function(
+        lambda: read_dataset(columns=columns, wordle_nums=nums, folder=folder)
+    )
+    print(
+        f"3 numbers, 3 columns | csv: {csv_seconds:.3f}s",
+        f"| dataset: {dataset_seconds:.3f}s",
+        f"| speedup: {csv_seconds / dataset_seconds:.1f}x",
+    )
+
+
+# usage: python3 scripts/WordleDataset.py [convert [csv files...] | compare]
+# convert defaults to data/condensed/all_wordle.csv
+def main():
+    command = sys.argv[1] if len(sys.argv) > 1 else "convert"
+    if command == "convert":
+        convert_csv(sys.argv[2:] or ["data/condensed/all_wordle.csv"])
+    elif command == "compare":
+        compare_with_csv()
+    else:
+        raise Exception("unknown command", command)
+
+
+if __name__ == "__main__":
+    main()
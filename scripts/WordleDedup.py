@@ -0,0 +1,285 @@
+import os
+import shutil
+import tempfile
+import numpy as np
+
+# Memory-bounded tweet id dedup for combining data files, keeping the first line seen for each id.
+# Files are read in raw blocks, and the line ends, commas and tweet id digits of a whole block are
+# found with vectorized NumPy ops. Ids are kept as int64 in a SortedIdSet, instead of a dict of
+# Python strings (~100 bytes per id). Any id that isn't a plain number, like the "tweet_id" header,
+# is kept as a string, so the rows kept are exactly those of a dict of id strings.
+#
+# Inputs with up to DEDUP_MEMORY_ROWS rows are deduped in one pass, peaking at about 16 bytes
+# per unique id (8 for the id, 8 more while merging sorted runs), so ~800MB at the limit.
+# Larger inputs are deduped externally in two passes: (id, line number) pairs are spilled to
+# DEDUP_PARTITIONS partition files by id, each partition is sorted to find the first line of
+# each id, and the lines to keep are flagged in a bool array of 1 byte per row.
+# For a 100M row input that peaks at about 100MB of flags, plus about 3 x 16 bytes per row
+# of one partition (~75MB with 64 partitions), plus about 4 x DEDUP_BLOCK_BYTES for a block,
+# for roughly 250MB in all, against ~1.6GB for the in memory set and ~10GB for the dict.
+
+# bytes read from a file at once
+DEDUP_BLOCK_BYTES = 8 << 20
+# inputs with more rows than this are deduped externally
+DEDUP_MEMORY_ROWS = 50_000_000
+# number of partition files used by the external dedup
+DEDUP_PARTITIONS = 64
+# longest tweet id that fits in an int64, in digits
+MAX_ID_DIGITS = 19
+INT64_MAX = np.iinfo(np.int64).max
+# (id, line number) pairs, as spilled to the partition files
+ID_SEQ_DTYPE = np.dtype([("id", "<i8"), ("seq", "<i8")])
+
+
+# A set of int64 ids kept as sorted runs, merged like a binary counter so every id is only
+# copied O(log n) times. Checking ids does a binary search in each run.
+# Runs of ids seen before (i.e. memory mapped from an earlier compile) can be given to start from.
+class SortedIdSet:
+    def __init__(self, runs=()):
+        self.runs = [run for run in runs if len(run) != 0]
+
+    def __len__(self):
+        return sum(len(run) for run in self.runs)
+
+    # returns whether each of the given ids is in the set
+    def contains(self, ids):
+        found = np.zeros(len(ids), dtype=bool)
+        for run in self.runs:
+            index = np.minimum(np.searchsorted(run, ids), len(run) - 1)
+            found |= run[index] == ids
+        return found
+
+    # adds the given ids, which must be unique and not already in the set
+    def add(self, ids):
+        run = np.sort(ids)
+        while len(self.runs) != 0 and len(self.runs[-1]) <= len(run):
+            run = np.concatenate([self.runs.pop(), run])
+            # both halves are sorted, which the stable sort merges in linear time
+            run.sort(kind="stable")
+        if len(run) != 0:
+            self.runs.append(run)
+
+
+# A block of whole lines read from a data file, with newlines translated like a text mode read
+class LineBlock:
+    def __init__(self, file_index, data):
+        self.file_index = file_index
+        self.data = data
+        self.bytes = np.frombuffer(data, dtype=np.uint8)
+        self.ends = np.flatnonzero(self.bytes == ord("\n")) + 1
+        if len(data) != 0 and data[-1:] != b"\n":
+            # the last line of a file, without a newline
+            self.ends = np.append(self.ends, len(data))
+        self.starts = np.zeros(len(self.ends), dtype=np.int64)
+        self.starts[1:] = self.ends[:-1]
+
+    def __len__(self):
+        return len(self.ends)
+
+    # returns the lines flagged in keep, joined back together
+    def get_kept(self, keep):
+        if keep.all():
+            return self.data
+        return self.bytes[np.repeat(keep, self.ends - self.starts)].tobytes()
+
+
+# yields a LineBlock at a time for every data file, in order, skipping the header row of
+# every file but the first (or of every file, when appending to earlier ones).
+# every file yields at least one (maybe empty) block
+def read_blocks(filenames, skip_first_header=False):
+    for file_index, filename in enumerate(filenames):
+        with open(filename, "rb") as f:
+            rest = b""
+            skip_header = file_index != 0 or skip_first_header
+            yielded = False
+            while True:
+                data = f.read(DEDUP_BLOCK_BYTES)
+                at_end = len(data) == 0
+                if data.endswith(b"\r"):
+                    data += f.read(1)
+                if b"\r" in data:
+                    data = data.replace(b"\r\n", b"\n").replace(b"\r", b"\n")
+                data = rest + data
+                cut = len(data) if at_end else data.rfind(b"\n") + 1
+                block, rest = data[:cut], data[cut:]
+                if skip_header and (b"\n" in block or at_end):
+                    block = block[block.find(b"\n") + 1 :] if b"\n" in block else b""
+                    skip_header = False
+                if len(block) != 0 or (at_end and not yielded):
+                    yield LineBlock(file_index, block)
+                    yielded = True
+                if at_end:
+                    break
+
+
+# returns the number of rows in the data files, or slightly more
+def count_rows(filenames):
+    rows = 0
+    for filename in filenames:
+        with open(filename, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                rows += chunk.count(b"\n")
+        rows += 1  # in case of no trailing newline
+    return rows
+
+
+# returns the given id string as an int, if it is a plain number within the int64 range
+def parse_numeric_id(string):
+    if not (string.isascii() and string.isdigit()) or len(string) > MAX_ID_DIGITS:
+        return None
+    if len(string) > 1 and string[0] == "0":
+        return None  # leading zeros would make different strings the same number
+    number = int(string)
+    return number if number <= INT64_MAX else None
+
+
+# returns the tweet id (the second field) of every line of the block,
+# as (int64 ids, whether each id is numeric, {line: id string} of the ids that aren't)
+def get_block_ids(block):
+    data = block.bytes
+    commas = np.flatnonzero(data == ord(","))
+    # the id runs from the first comma of the line to the second, or to the end of the line
+    first = np.searchsorted(commas, block.starts)
+    if (first >= len(commas)).any() or (commas[first] >= block.ends).any():
+        raise Exception("line without a tweet id", block.file_index)
+    second = np.minimum(first + 1, len(commas) - 1)
+    has_second = (first + 1 < len(commas)) & (commas[second] < block.ends)
+    id_starts = commas[first] + 1
+    id_ends = np.where(has_second, commas[second], block.ends)
+    lengths = id_ends - id_starts
+
+    # parse every id of up to 19 ascii digits at once, one digit position at a time
+    numeric = has_second & (lengths > 0) & (lengths <= MAX_ID_DIGITS)
+    ids = np.zeros(len(block), dtype=np.uint64)
+    for i in range(MAX_ID_DIGITS):
+        in_id = numeric & (i < lengths)
+        digits = data[np.minimum(id_starts + i, len(data) - 1)].astype(np.int64) - 48
+        numeric &= ~in_id | ((digits >= 0) & (digits <= 9))
+        ids = np.where(in_id, ids * np.uint64(10) + digits.astype(np.uint64), ids)
+    leading_zero = (lengths > 1) & (data[np.minimum(id_starts, len(data) - 1)] == 48)
+    numeric &= ~leading_zero & (ids <= np.uint64(INT64_MAX))
+    ids = ids.astype(np.int64)
+
+    # anything else is checked as a string, like the header row
+    strings = {}
+    for i in np.flatnonzero(~numeric):
+        string = block.data[id_starts[i] : id_ends[i]].decode()
+        number = parse_numeric_id(string)
+        if number is None:
+            strings[i] = string
+        else:
+            ids[i] = number
+            numeric[i] = True
+    return ids, numeric, strings
+
+
+# yields (LineBlock, keep) for each block, keeping the first line of each id seen
+# with the ids of every kept line held in memory, after any seen in earlier files
+def dedup_in_memory(filenames, seen=None, seen_strings=None):
+    appending = seen is not None
+    seen = SortedIdSet() if seen is None else seen
+    seen_strings = set() if seen_strings is None else set(seen_strings)
+    for block in read_blocks(filenames, skip_first_header=appending):
+        ids, numeric, strings = get_block_ids(block)
+        keep = np.zeros(len(block), dtype=bool)
+        numeric_index = np.flatnonzero(numeric)
+        unique_ids, first = np.unique(ids[numeric_index], return_index=True)
+        new = ~seen.contains(unique_ids)
+        keep[numeric_index[first[new]]] = True
+        seen.add(unique_ids[new])
+        for i, string in strings.items():
+            if string not in seen_strings:
+                seen_strings.add(string)
+                keep[i] = True
+        yield block, keep
+
+
+# yields (LineBlock, keep) for each block, keeping the first line of each id seen,
+# finding them with two passes over the files and partition files in a temporary folder
+def dedup_external(filenames):
+    temp_dir = tempfile.mkdtemp(prefix="wordle_dedup_")
+    try:
+        paths = [
+            os.path.join(temp_dir, f"part.{i}.bin") for i in range(DEDUP_PARTITIONS)
+        ]
+        partition_files = [open(path, "wb") for path in paths]
+        seen_strings = set()
+        string_keep = []
+        seq = 0
+        try:
+            # first pass, spill the (id, line number) of every numeric id to its partition
+            for block in read_blocks(filenames):
+                ids, numeric, strings = get_block_ids(block)
+                pairs = np.empty(len(block), dtype=ID_SEQ_DTYPE)
+                pairs["id"] = ids
+                pairs["seq"] = np.arange(seq, seq + len(block))
+                pairs = pairs[numeric]
+                partitions = pairs["id"] % DEDUP_PARTITIONS
+                for i in np.unique(partitions):
+                    pairs[partitions == i].tofile(partition_files[i])
+                for i, string in strings.items():
+                    if string not in seen_strings:
+                        seen_strings.add(string)
+                        string_keep.append(seq + i)
+                seq += len(block)
+        finally:
+            for f in partition_files:
+                f.close()
+
+        # flag the first line of each id, partition by partition
+        keep = np.zeros(seq, dtype=bool)
+        keep[string_keep] = True
+        for path in paths:
+            pairs = np.fromfile(path, dtype=ID_SEQ_DTYPE)
+            os.remove(path)
+            # pairs are in line order, so a stable sort by id puts each id's first line first
+            pairs = pairs[np.argsort(pairs["id"], kind="stable")]
+            first = np.ones(len(pairs), dtype=bool)
+            first[1:] = pairs["id"][1:] != pairs["id"][:-1]
+            keep[pairs["seq"][first]] = True
+            del pairs, first
+
+        # second pass, with the lines to keep known
+        seq = 0
+        for block in read_blocks(filenames):
+            yield block, keep[seq : seq + len(block)]
+            seq += len(block)
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+# yields (LineBlock, keep) for every block of the data files, where keep flags the first line
+# seen of each tweet id, deduping in memory or externally depending on the input size
+# to append to earlier files, give the SortedIdSet and string ids seen in them, and the new
+# files (which are much smaller than what came before) are deduped in memory, without headers
+def dedup_lines(filenames, memory_rows=DEDUP_MEMORY_ROWS, seen=None, seen_strings=None):
+    if seen is not None:
+        return dedup_in_memory(filenames, seen, seen_strings)
+    if count_rows(filenames) <= memory_rows:
+        return dedup_in_memory(filenames)
+    print("Large input, deduping on disk")
+    return dedup_external(filenames)
+
+
+# returns the tweet ids of the lines in the given byte range of a combined file,
+# as (sorted int64 ids, list of the ids that aren't plain numbers)
+def get_range_ids(filename, start, end):
+    runs = []
+    strings = []
+    with open(filename, "rb") as f:
+        f.seek(start)
+        rest = b""
+        while start < end:
+            data = f.read(min(DEDUP_BLOCK_BYTES, end - start))
+            if len(data) == 0:
+                break
+            start += len(data)
+            data = rest + data
+            cut = len(data) if start >= end else data.rfind(b"\n") + 1
+            data, rest = data[:cut], data[cut:]
+            if len(data) == 0:
+                continue
+            ids, numeric, block_strings = get_block_ids(LineBlock(0, data))
+            runs.append(ids[numeric])
+            strings += block_strings.values()
+    return np.sort(np.concatenate(runs or [np.zeros(0, np.int64)])), strings
@@ -0,0 +1,130 @@
+import hashlib
+import json
+import os
+import numpy as np
+
+# Manifest of the day files processed by the local compiler (WordleCompileFiles.py), so a run
+# only has to process the files that are new or changed since the last one.
+# Files are processed in sorted order, and each one appends to the combined, condensed and
+# per-number outputs, so the entry of each file records where those outputs ended after it
+# (byte offsets, the last user index, and the size of each per-number file it wrote to),
+# along with the tweet ids it kept, in data/metadata/tweet_ids/. A run finds the first file that
+# is new, changed or gone, cuts the outputs back to where they were before it, and processes
+# every file from there on, so the outputs are the same as a full rebuild.
+
+MANIFEST_FILE = "data/metadata/compile_manifest.json"
+TWEET_IDS_FOLDER = "data/metadata/tweet_ids"
+# bumped when the entries change, so older manifests cause a full rebuild
+MANIFEST_VERSION = 1
+
+
+# returns the sha256 hash of the file's contents
+def get_file_hash(filename):
+    sha = hashlib.sha256()
+    with open(filename, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+# returns the path, size, modified time and content hash of a day file
+def get_file_info(filename):
+    stat = os.stat(filename)
+    return {
+        "path": filename,
+        "size": stat.st_size,
+        "mtime": stat.st_mtime,
+        "sha256": get_file_hash(filename),
+    }
+
+
+class CompileManifest:
+    def __init__(self, path=MANIFEST_FILE, ids_folder=TWEET_IDS_FOLDER):
+        self.path = path
+        self.ids_folder = ids_folder
+        self.files = []
+
+    # returns the manifest saved at the path, or None if there isn't a usable one
+    @classmethod
+    def load(cls, path=MANIFEST_FILE, ids_folder=TWEET_IDS_FOLDER):
+        if not os.path.exists(path):
+            return None
+        with open(path) as f:
+            data = json.load(f)
+        if data.get("version") != MANIFEST_VERSION:
+            print("Manifest version changed")
+            return None
+        manifest = cls(path, ids_folder)
+        manifest.files = data["files"]
+        return manifest
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        temp_path = self.path + ".tmp"
+        with open(temp_path, "w") as f:
+            json.dump({"version": MANIFEST_VERSION, "files": self.files}, f, indent=1)
+        os.replace(temp_path, self.path)
+
+    # whether the file at the given index of the manifest is still the same
+    # files with the same size and modified time are taken as unchanged without hashing them
+    def is_unchanged(self, index, filename):
+        entry = self.files[index]
+        if entry["path"] != filename or not os.path.exists(filename):
+            return False
+        stat = os.stat(filename)
+        if stat.st_size != entry["size"]:
+            return False
+        if stat.st_mtime == entry["mtime"]:
+            return True
+        if get_file_hash(filename) != entry["sha256"]:
+            return False
+        # only touched, so skip hashing it next time
+        entry["mtime"] = stat.st_mtime
+        return True
+
+    # returns the index of the first of the given (sorted) files to process, which is the first
+    # one that is new or changed, or where a processed file is gone
+    def get_rewind_index(self, filenames):
+        for i in range(min(len(filenames), len(self.files))):
+            if not self.is_unchanged(i, filenames[i]):
+                return i
+        return min(len(filenames), len(self.files))
+
+    # returns the entry of the last file before the given index, or the start of every output
+    def get_checkpoint(self, index):
+        if index == 0:
+            return {"combined_end": 0, "condensed_end": 0, "user_count": 0}
+        return self.files[index - 1]
+
+    # returns the size each per-number file had before the file at the given index was processed
+    def get_partition_sizes(self, index):
+        sizes = {}
+        for entry in self.files[:index]:
+            for num, size in entry["partitions"].items():
+                sizes[int(num)] = size
+        return sizes
+
+    def get_ids_path(self, index):
+        return os.path.join(self.ids_folder, f"ids.{index}.npy")
+
+    # returns the sorted tweet ids kept from each file before the given index, memory mapped,
+    # and the set of ids that aren't plain numbers
+    def get_seen_ids(self, index):
+        runs = [np.load(self.get_ids_path(i), mmap_mode="r") for i in range(index)]
+        strings = set()
+        for entry in self.files[:index]:
+            strings.update(entry["id_strings"])
+        return runs, strings
+
+    # drops the entries of the files from the given index on
+    def truncate(self, index):
+        for i in range(index, len(self.files)):
+            if os.path.exists(self.get_ids_path(i)):
+                os.remove(self.get_ids_path(i))
+        self.files = self.files[:index]
+
+    # adds the entry of the next file processed, saving the tweet ids it kept
+    def add_file(self, info, ids, id_strings, **entry):
+        os.makedirs(self.ids_folder, exist_ok=True)
+        np.save(self.get_ids_path(len(self.files)), ids)
+        self.files.append({**info, **entry, "id_strings": id_strings})
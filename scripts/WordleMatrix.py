@@ -0,0 +1,159 @@
+import numpy as np
+
+# Packed form of the wordle square matrices, for vectorized checks over many tweets at once.
+# A matrix string of up to 6 rows of 5 "A" (miss), "B" (wrong place) or "C" (right place)
+# letters is packed into one uint64, 2 bits per square, with row r in bits 10r to 10r + 9.
+# Empty squares are 0, so the number of rows is kept alongside, in a uint8 array.
+
+MAX_ROWS = 6
+ROW_LENGTH = 5
+MAX_SQUARES = MAX_ROWS * ROW_LENGTH
+SQUARE_BITS = 2
+ROW_BITS = ROW_LENGTH * SQUARE_BITS
+ROW_MASK = (1 << ROW_BITS) - 1
+
+# codes of each square letter, 0 is an empty square
+SQUARE_CODES = {"A": 1, "B": 2, "C": 3}
+# the packed value of a winning row, "CCCCC"
+WIN_ROW = int("11" * ROW_LENGTH, 2)
+
+# maps each byte of a matrix string to its square code, or to 0xFF if it isn't a square letter
+BYTE_CODES = np.full(256, 0xFF, dtype=np.uint8)
+BYTE_CODES[0] = 0
+for letter, code in SQUARE_CODES.items():
+    BYTE_CODES[ord(letter)] = code
+# maps each square code back to its letter byte, with empty squares as null padding
+CODE_BYTES = np.frombuffer(b"\x00ABC", dtype=np.uint8)
+# the bit shift of each square in the packed value
+SQUARE_SHIFTS = np.arange(MAX_SQUARES, dtype=np.uint64) * np.uint64(SQUARE_BITS)
+
+
+# returns a table of the number of squares with the given code in each possible packed row
+def get_row_count_table(code):
+    table = np.zeros(ROW_MASK + 1, dtype=np.uint8)
+    for row in range(ROW_MASK + 1):
+        for i in range(ROW_LENGTH):
+            if (row >> (i * SQUARE_BITS)) & 3 == code:
+                table[row] += 1
+    return table
+
+
+# numbers of "B" (yellow) and "C" (green) squares in each packed row value
+YELLOWS_TABLE = get_row_count_table(SQUARE_CODES["B"])
+GREENS_TABLE = get_row_count_table(SQUARE_CODES["C"])
+# the number of patterns of a full row, coded in base 3 with A = 0, B = 1 and C = 2 and the
+# first square as the most significant digit, so codes sort like the pattern strings
+PATTERN_COUNT = 3**ROW_LENGTH
+# the pattern code of rows that aren't full, i.e. past the end of the matrix
+NO_PATTERN = 255
+# the pattern string of each pattern code
+PATTERN_STRINGS = [
+    "".join("ABC"[(code // 3 ** (ROW_LENGTH - 1 - i)) % 3] for i in range(ROW_LENGTH))
+    for code in range(PATTERN_COUNT)
+]
+
+
+# returns a table of the pattern code of each possible packed row, NO_PATTERN for rows
+# with empty squares
+def get_pattern_table():
+    table = np.full(ROW_MASK + 1, NO_PATTERN, dtype=np.uint8)
+    for row in range(ROW_MASK + 1):
+        squares = [(row >> (i * SQUARE_BITS)) & 3 for i in range(ROW_LENGTH)]
+        if all(squares):
+            table[row] = sum(
+                (square - 1) * 3 ** (ROW_LENGTH - 1 - i)
+                for i, square in enumerate(squares)
+            )
+    return table
+
+
+PATTERN_TABLE = get_pattern_table()
+
+
+# packs the given matrix strings, returning the packed values and their row counts
+# matrices that aren't 1 to 6 full rows of A/B/C squares get 0 rows, so they fail every check
+def encode_matrices(matrices):
+    # null padded fixed width bytes, as (tweets, squares) codes
+    # anything too long is cut to one past the max, and missing values become "nan",
+    # so both fail the checks below
+    width = f"S{MAX_SQUARES + 1}"
+    try:
+        fixed = np.array(matrices, dtype=width)
+    except UnicodeEncodeError:
+        strings = [m if str(m).isascii() else "" for m in matrices]
+        fixed = np.array(strings, dtype=width)
+    squares = np.frombuffer(fixed.tobytes(), dtype=np.uint8).reshape(
+        len(fixed), MAX_SQUARES + 1
+    )
+    codes = BYTE_CODES[squares[:, :MAX_SQUARES]]
+    lengths = np.char.str_len(fixed)
+
+    valid = (lengths > 0) & (lengths <= MAX_SQUARES) & (lengths % ROW_LENGTH == 0)
+    valid &= (codes != 0xFF).all(axis=1)
+    codes[~valid] = 0
+
+    packed = np.bitwise_or.reduce(codes.astype(np.uint64) << SQUARE_SHIFTS, axis=1)
+    rows = np.where(valid, lengths // ROW_LENGTH, 0).astype(np.uint8)
+    return packed, rows
+
+
+# unpacks the given packed matrices back into their matrix strings
+def decode_matrices(packed):
+    packed = np.asarray(packed, dtype=np.uint64)
+    codes = (packed[:, None] >> SQUARE_SHIFTS) & np.uint64(3)
+    letters = CODE_BYTES[codes.astype(np.uint8)]
+    fixed = np.frombuffer(letters.tobytes(), dtype=f"S{MAX_SQUARES}")
+    return fixed.astype(str).tolist()
+
+
+# returns the packed values of the given row of each matrix, 0 where the matrix is shorter
+def get_row(packed, row):
+    return (packed >> np.uint64(row * ROW_BITS)) & np.uint64(ROW_MASK)
+
+
+# returns the packed values of the last row of each matrix
+def get_last_row(packed, rows):
+    shifts = (np.maximum(rows, 1).astype(np.uint64) - np.uint64(1)) * np.uint64(
+        ROW_BITS
+    )
+    return (packed >> shifts) & np.uint64(ROW_MASK)
+
+
+# whether the last row of each matrix is a win
+def is_win(packed, rows):
+    packed, rows = np.asarray(packed, dtype=np.uint64), np.asarray(rows)
+    return (rows > 0) & (get_last_row(packed, rows) == WIN_ROW)
+
+
+# whether each matrix contains a win not in the final row
+# this signals that the matrix is invalid
+def contains_interior_win(packed, rows):
+    packed, rows = np.asarray(packed, dtype=np.uint64), np.asarray(rows)
+    interior_win = np.zeros(len(packed), dtype=bool)
+    for row in range(MAX_ROWS - 1):
+        interior_win |= (get_row(packed, row) == WIN_ROW) & (rows > row + 1)
+    return interior_win
+
+
+# returns the number of squares of each row of each matrix found in the given row count table,
+# as a (tweets, 6) array, with 0 for rows past the end of the matrix
+def get_row_counts(packed, table):
+    packed = np.asarray(packed, dtype=np.uint64)
+    counts = np.empty((len(packed), MAX_ROWS), dtype=np.uint8)
+    for row in range(MAX_ROWS):
+        counts[:, row] = table[get_row(packed, row)]
+    return counts
+
+
+def get_greens_per_row(packed):
+    return get_row_counts(packed, GREENS_TABLE)
+
+
+def get_yellows_per_row(packed):
+    return get_row_counts(packed, YELLOWS_TABLE)
+
+
+# returns the pattern code of each row of each matrix as a (tweets, 6) uint8 array,
+# with NO_PATTERN for rows past the end of the matrix
+def get_row_patterns(packed):
+    return get_row_counts(packed, PATTERN_TABLE)
@@ -0,0 +1,61 @@
+import numpy as np
+import pandas as pd
+from WordleMatrix import (
+    MAX_ROWS,
+    NO_PATTERN,
+    PATTERN_STRINGS,
+    get_greens_per_row,
+    get_row_patterns,
+    get_yellows_per_row,
+)
+
+# Guess pattern engine for the data views (see WordleAggregate.py). Matrices are packed once
+# (see WordleMatrix.py), and each row is looked up as a base 3 pattern code (0 to 242) and its
+# numbers of greens and yellows, as (games, 6) uint8 arrays, with no string slicing.
+# Patterns are returned as categoricals of the pattern strings, so they are counted by code.
+# Views over guesses rather than games take the frame of every guess of every game, or of every
+# pair of consecutive guesses, built with one nonzero over the (games, 6) mask of the rows.
+
+
+# returns the pattern codes as a categorical of the pattern strings, NULL for NO_PATTERN
+def to_pattern_categorical(codes):
+    codes = np.where(codes == NO_PATTERN, -1, codes).astype(np.int16)
+    return pd.Categorical.from_codes(codes, categories=PATTERN_STRINGS)
+
+
+# returns the pattern of the first guess of each game
+def get_first_patterns(packed):
+    return to_pattern_categorical(get_row_patterns(packed)[:, 0])
+
+
+# returns the values of the given columns of the games at each of the given positions
+def take_columns(df, columns, games):
+    return {column: df[column].to_numpy()[games] for column in columns}
+
+
+# returns a frame of every guess of every game: the given columns of its game, the guess
+# number (from 1) and the pattern of the guess
+def get_guesses(df, packed, rows, columns):
+    patterns = get_row_patterns(packed)
+    games, guesses = np.nonzero(np.arange(MAX_ROWS) < rows[:, None])
+    frame = take_columns(df, columns, games)
+    frame["guess"] = guesses + 1
+    frame["pattern"] = to_pattern_categorical(patterns[games, guesses])
+    return pd.DataFrame(frame)
+
+
+# returns a frame of every guess of every game that was followed by another guess: the given
+# columns of its game, the guess number (from 1), and the greens and yellows of the guess and
+# of the next one
+def get_transitions(df, packed, rows, columns):
+    greens, yellows = get_greens_per_row(packed), get_yellows_per_row(packed)
+    # the row counts are unsigned, so games with no rows would wrap around below 0
+    rows = np.asarray(rows, dtype=np.int64)
+    games, guesses = np.nonzero(np.arange(MAX_ROWS - 1) < rows[:, None] - 1)
+    frame = take_columns(df, columns, games)
+    frame["guess"] = guesses + 1
+    frame["greens"] = greens[games, guesses]
+    frame["yellows"] = yellows[games, guesses]
+    frame["next_greens"] = greens[games, guesses + 1]
+    frame["next_yellows"] = yellows[games, guesses + 1]
+    return pd.DataFrame(frame)
@@ -0,0 +1,327 @@
+import os
+import sys
+import json
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pv
+from WordleTweetParser import TWEET_FIELDS
+from WordleMatrix import MAX_ROWS, ROW_LENGTH, SQUARE_SHIFTS, decode_matrices
+from WordleCleaning import TIME_FORMAT, condense_rows, get_timestamps, map_ids
+
+# Synthetic wordle tweets, since the real data can't be shared. Generates search API status pages,
+# raw day files (wordle.N.api.csv) and condensed files at any scale, a chunk of rows at a time,
+# so 100M rows never have to be held in memory. The rates of duplicates, invalid matrices,
+# colorblind squares and hard mode are set by SYNTHETIC_RATES, and everything is seeded,
+# so the same arguments always give the same files.
+#
+# Matrices are generated packed (see WordleMatrix.py): every guess before the last has fewer
+# greens than a win, the last row is a win unless the game was lost, and invalid matrices either
+# have a win before the last row or rounds that don't match their number of rows.
+
+WORDLE_DAY_ONE = pd.Timestamp("2021-06-18")
+TWITTER_EPOCH_MS = 1288834974657
+# rows generated at a time
+GENERATE_CHUNK_ROWS = 1_000_000
+# statuses in each search API page, like the count param of the scraper
+PAGE_STATUSES = 100
+
+# fraction of the rows with each property
+SYNTHETIC_RATES = {
+    # repeats of an earlier row of the same file, like overlapping saves of the scraper
+    "duplicate": 0.03,
+    # matrices failing the compile checks, half interior wins and half size mismatches
+    "invalid_matrix": 0.01,
+    # lost games, with rounds of 6 (or "x")
+    "loss": 0.04,
+    "lowercase_x": 0.1,  # of the losses
+    "colorblind": 0.03,
+    "hard": 0.08,
+    "light": 0.3,  # of the matrices with a miss square, the rest are dark
+    "reply": 0.04,
+    "quote": 0.01,
+    # statuses the scraper rejects, for the pages only
+    "text_invalid": 0.02,
+    "squares_invalid": 0.01,
+}
+# the share of wins taking each number of rounds, 1 to 6
+ROUND_WEIGHTS = [0.005, 0.06, 0.23, 0.34, 0.25, 0.115]
+SURFACE_WEIGHTS = {
+    "Twitter for iPhone": 0.52,
+    "Twitter for Android": 0.25,
+    "Twitter Web App": 0.14,
+    "Twitter for iPad": 0.04,
+    "Tweetbot for iΟS": 0.01,
+    "TweetDeck": 0.01,
+    "Twitter for Mac": 0.03,
+}
+LANGUAGE_WEIGHTS = {
+    "en": 0.78,
+    "es": 0.05,
+    "fr": 0.03,
+    "de": 0.02,
+    "pt": 0.02,
+    "ja": 0.02,
+    "in": 0.02,
+    "und": 0.06,
+}
+# tweets per user on average, the number of users grows with the rows generated
+ROWS_PER_USER = 3
+# mean time from the start of a wordle number's window to its tweets, in hours
+MEAN_TWEET_HOURS = 10
+# the emoji of each square code (miss, wrong place, right place), by theme and colorblind mode
+SQUARE_EMOJI = {
+    (False, False): ["", "⬛", "🟨", "🟩"],
+    (True, False): ["", "⬜", "🟨", "🟩"],
+    (False, True): ["", "⬛", "🟦", "🟧"],
+    (True, True): ["", "⬜", "🟦", "🟧"],
+}
+
+
+# returns a random choice of the keys of the weights for each of n rows
+def choose(rng, weights, n):
+    keys = list(weights)
+    p = np.array([weights[key] for key in keys])
+    return np.array(keys, dtype=object)[rng.choice(len(keys), n, p=p / p.sum())]
+
+
+# returns n random square matrices, as (packed matrices, rows, rounds text, colorblind flags)
+def generate_matrices(rng, n, rates):
+    loss = rng.random(n) < rates["loss"]
+    weights = np.array(ROUND_WEIGHTS)
+    rows = np.where(loss, MAX_ROWS, rng.choice(np.arange(1, 7), n, p=weights))
+    # each square is a miss, wrong place or right place, with more greens in later guesses
+    draw = rng.random((n, MAX_ROWS, ROW_LENGTH), dtype=np.float32)
+    green = 0.15 + 0.12 * np.arange(MAX_ROWS)[None, :, None]
+    codes = np.where(draw < green, 3, np.where(draw < green + 0.25, 2, 1))
+    # only the last row of a win is all greens
+    all_green = (codes == 3).all(axis=2)
+    codes[:, :, 0] = np.where(all_green, 1, codes[:, :, 0])
+    last = rows - 1
+    codes[np.arange(n), last] = np.where(loss[:, None], codes[np.arange(n), last], 3)
+    codes[np.arange(MAX_ROWS)[None, :] >= rows[:, None]] = 0
+
+    rounds = rows.astype(str).astype(object)
+    lowercase = loss & (rng.random(n) < rates["lowercase_x"])
+    rounds[lowercase] = "x"
+    invalid = np.flatnonzero(rng.random(n) < rates["invalid_matrix"])
+    interior = invalid[(rows[invalid] > 1) & (rng.random(len(invalid)) < 0.5)]
+    codes[interior, rng.integers(0, rows[interior] - 1)] = 3
+    mismatch = np.setdiff1d(invalid, interior)
+    shown = np.clip(rows[mismatch] + rng.choice([-1, 1], len(mismatch)), 1, 6)
+    shown = np.where(shown == rows[mismatch], 7 - shown, shown)
+    rounds[mismatch] = shown.astype(str)
+
+    packed = (codes.reshape(n, -1).astype(np.uint64) << SQUARE_SHIFTS).sum(
+        axis=1, dtype=np.uint64
+    )
+    colorblind = rng.random(n) < rates["colorblind"]
+    return packed, rows, rounds, colorblind
+
+
+# returns the time strings of the given times, formatting each distinct second once
+def format_times(times):
+    codes, uniques = pd.factorize(times)
+    return np.asarray(pd.DatetimeIndex(uniques).strftime(TIME_FORMAT), dtype=object)[
+        codes
+    ]
+
+
+# returns a frame of n generated tweets of the wordle number, in TWEET_FIELDS order,
+# like the rows of a day file. the first_row makes the tweet ids of each chunk unique
+def generate_tweets(wordle_num, n, seed=0, first_row=0, rates=SYNTHETIC_RATES):
+    rng = np.random.default_rng([seed, wordle_num, first_row])
+    start = WORDLE_DAY_ONE + pd.Timedelta(days=wordle_num)
+    hours = np.minimum(rng.exponential(MEAN_TWEET_HOURS, n), 72 - 1e-6)
+    times = start + pd.to_timedelta(np.round(hours * 3600 * 1000), unit="ms")
+    ms = (times - pd.Timestamp(0)) // pd.Timedelta(milliseconds=1)
+    sequence = (np.arange(first_row, first_row + n) % (1 << 22)).astype(np.int64)
+    tweet_ids = ((ms.to_numpy() - TWITTER_EPOCH_MS) << 22) | sequence
+
+    # a few users post most of the tweets, and the same users post every day
+    users = max(1, (first_row + n) // ROWS_PER_USER)
+    user_ids = 10_000_000 + (users * rng.random(n) ** 2).astype(np.int64) * 7919
+
+    packed, rows, rounds, colorblind = generate_matrices(rng, n, rates)
+    matrices = np.array(decode_matrices(packed), dtype=object)
+    has_miss = pd.Series(matrices).str.contains("A", regex=False).to_numpy()
+    light = rng.random(n) < rates["light"]
+    df = pd.DataFrame(
+        {
+            "time": format_times(times.floor("s")),
+            "tweet_id": tweet_ids,
+            "user_id": user_ids,
+            "surface": choose(rng, SURFACE_WEIGHTS, n),
+            "is_reply": (rng.random(n) < rates["reply"]).astype(int),
+            "is_quote": (rng.random(n) < rates["quote"]).astype(int),
+            "retweets": rng.geometric(0.8, n) - 1,
+            "quotes": np.nan,
+            "favs": rng.geometric(0.4, n) - 1,
+            "replies": np.nan,
+            "language": choose(rng, LANGUAGE_WEIGHTS, n),
+            "wordle_num": wordle_num,
+            # the scraper saves a lost game ("X") as 6
+            "rounds": rounds,
+            "hard": (rng.random(n) < rates["hard"]).astype(int),
+            "theme": np.where(has_miss, np.where(light, "l", "d"), "u"),
+            "colorblind": colorblind.astype(int),
+            "win": pd.Series(matrices).str.endswith("CCCCC").to_numpy().astype(int),
+            "matrix": matrices,
+        }
+    )
+
+    # repeat earlier rows, which the compile steps drop
+    duplicate = np.flatnonzero(rng.random(n) < rates["duplicate"])
+    duplicate = duplicate[duplicate > 0]
+    order = np.arange(n)
+    order[duplicate] = (rng.random(len(duplicate)) * duplicate).astype(np.int64)
+    return df.iloc[order].reset_index(drop=True)[TWEET_FIELDS]
+
+
+# appends a frame to a csv file opened in binary mode, the same as df.to_csv but much faster
+# generated values never need quoting
+def write_csv_chunk(f, df, header):
+    if header:
+        f.write((",".join(df.columns) + "\n").encode())
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    pv.write_csv(table, f, pv.WriteOptions(include_header=False, quoting_style="none"))
+
+
+# yields the chunks of the tweets of the given wordle numbers, rows_per_num of each
+def generate_chunks(wordle_nums, rows_per_num, seed=0, rates=SYNTHETIC_RATES):
+    for wordle_num in wordle_nums:
+        for first_row in range(0, rows_per_num, GENERATE_CHUNK_ROWS):
+            n = min(GENERATE_CHUNK_ROWS, rows_per_num - first_row)
+            yield generate_tweets(wordle_num, n, seed, first_row, rates)
+
+
+# writes a day file of rows tweets for each of the wordle numbers to the folder,
+# as wordle.N.api.csv, returning their filenames
+def write_day_files(folder, wordle_nums, rows_per_num, seed=0, rates=SYNTHETIC_RATES):
+    os.makedirs(folder, exist_ok=True)
+    filenames = []
+    for wordle_num in wordle_nums:
+        filename = os.path.join(folder, f"wordle.{wordle_num}.api.csv")
+        print("generating", filename)
+        with open(filename, "wb") as f:
+            for i, df in enumerate(
+                generate_chunks([wordle_num], rows_per_num, seed, rates)
+            ):
+                write_csv_chunk(f, df, i == 0)
+        filenames.append(filename)
+    return filenames
+
+
+# writes the condensed rows of rows tweets for each of the wordle numbers to one file,
+# condensed the same way as the compile steps, so some rows are dropped
+def write_condensed_file(
+    filename, wordle_nums, rows_per_num, seed=0, rates=SYNTHETIC_RATES
+):
+    user_indexes = {}
+
+    def get_user_index(user_id):
+        return user_indexes.setdefault(user_id, len(user_indexes) + 1)
+
+    print("generating", filename)
+    with open(filename, "wb") as f:
+        for i, df in enumerate(generate_chunks(wordle_nums, rows_per_num, seed, rates)):
+            df["rounds"] = df["rounds"].astype(str)
+            df["time"] = get_timestamps(df["time"])
+            df, _ = condense_rows(df, lambda ids: map_ids(ids, get_user_index))
+            write_csv_chunk(f, df, i == 0)
+
+
+# returns the text of each tweet, with the wordle text and the emoji squares of its matrix
+def get_texts(df, rng, rates):
+    hard = np.where(df["hard"] == 1, "*", "")
+    rounds = np.where(df["rounds"] == "6", np.where(df["win"] == 1, "6", "X"), "")
+    rounds = np.where(rounds == "", df["rounds"], rounds)
+    texts = []
+    for wordle_num, matrix, theme, colorblind, rounds_text, star in zip(
+        df["wordle_num"], df["matrix"], df["theme"], df["colorblind"], rounds, hard
+    ):
+        emoji = SQUARE_EMOJI[(theme == "l", colorblind == 1)]
+        squares = [emoji[" ABC".index(letter)] for letter in matrix]
+        grid = "\n".join(
+            "".join(squares[i : i + ROW_LENGTH])
+            for i in range(0, len(squares), ROW_LENGTH)
+        )
+        texts.append(f"Wordle {wordle_num} {rounds_text}/6{star}\n\n{grid}")
+    texts = np.array(texts, dtype=object)
+    text_invalid = rng.random(len(df)) < rates["text_invalid"]
+    texts[text_invalid] = "can't believe I missed today's wordle"
+    squares_invalid = np.flatnonzero(
+        ~text_invalid & (rng.random(len(df)) < rates["squares_invalid"])
+    )
+    for i in squares_invalid:
+        # a square short in the first row
+        text = texts[i]
+        cut = text.index("\n\n") + 2
+        texts[i] = text[:cut] + text[cut + 1 :]
+    return texts
+
+
+# returns the status dicts of a frame of tweets, like the search API gives them
+def get_statuses(df, rng, rates):
+    texts = get_texts(df, rng, rates)
+    statuses = []
+    for row, text in zip(df.itertuples(index=False), texts):
+        statuses.append(
+            {
+                "created_at": row.time,
+                "id": int(row.tweet_id),
+                "user": {"id": int(row.user_id)},
+                "source": f'<a href="https://twitter.com">{row.surface}</a>',
+                "in_reply_to_user_id": 783214 if row.is_reply else None,
+                "is_quote_status": bool(row.is_quote),
+                "retweet_count": int(row.retweets),
+                "favorite_count": int(row.favs),
+                "lang": row.language,
+                "text": text,
+            }
+        )
+    return statuses
+
+
+# writes rows tweets of the wordle number as search API pages, one response body per line,
+# newest first, which WordleBenchmark.load_status_pages reads
+def write_status_pages(filename, wordle_num, rows, seed=0, rates=SYNTHETIC_RATES):
+    print("generating", filename)
+    with open(filename, "w") as f:
+        for df in generate_chunks([wordle_num], rows, seed, rates):
+            df = df.sort_values("tweet_id", ascending=False, kind="stable")
+            rng = np.random.default_rng([seed, wordle_num, len(df)])
+            statuses = get_statuses(df, rng, rates)
+            for i in range(0, len(statuses), PAGE_STATUSES):
+                page = statuses[i : i + PAGE_STATUSES]
+                metadata = {"count": PAGE_STATUSES, "query": f"wordle {wordle_num}"}
+                f.write(
+                    json.dumps(
+                        {"statuses": page, "search_metadata": metadata},
+                        ensure_ascii=False,
+                    )
+                    + "\n"
+                )
+
+
+# usage: python3 scripts/WordleSynthetic.py <pages|day|condensed> <output> <wordle num> <rows> [numbers]
+# rows are generated for each of the given number of wordle numbers, starting from the given one
+# day writes a wordle.N.api.csv file for each number into the output folder
+def main():
+    kind, output = sys.argv[1], sys.argv[2]
+    first_num, rows = int(sys.argv[3]), int(sys.argv[4])
+    wordle_nums = range(
+        first_num, first_num + (int(sys.argv[5]) if len(sys.argv) > 5 else 1)
+    )
+    if kind == "pages":
+        write_status_pages(output, first_num, rows)
+    elif kind == "day":
+        write_day_files(output, wordle_nums, rows)
+    elif kind == "condensed":
+        write_condensed_file(output, wordle_nums, rows)
+    else:
+        raise Exception("unknown output", kind)
+
+
+if __name__ == "__main__":
+    main()
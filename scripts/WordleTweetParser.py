@@ -0,0 +1,276 @@
+import re
+import sys
+from array import array
+from itertools import repeat
+
+# gets the wordle text string, i.e. "Wordle 250 2/6*"
+WORDLE_REGEX = re.compile(
+    r"Wordle[()#!,\-.:\s]*(\d*)[()#!,\-.:\s]*([1-6X])\/6\*?", re.IGNORECASE
+)
+# matches every character that can't be part of a square matrix
+NON_SQUARE_REGEX = re.compile("[^⬛🟨🟩⬜🟧🟦\n]+")
+
+# the fields of each cleaned tweet, in the column order of the data files
+TWEET_FIELDS = [
+    "time",
+    "tweet_id",
+    "user_id",
+    "surface",
+    "is_reply",
+    "is_quote",
+    "retweets",
+    "quotes",
+    "favs",
+    "replies",
+    "language",
+    "wordle_num",
+    "rounds",
+    "hard",
+    "theme",
+    "colorblind",
+    "win",
+    "matrix",
+]
+
+# maps each square emoji to its matrix letter
+# A = miss, B = wrong place, C = right place (colorblind squares included)
+SQUARES_TABLE = str.maketrans(
+    {"⬛": "A", "⬜": "A", "🟨": "B", "🟦": "B", "🟧": "C", "🟩": "C"}
+)
+
+
+# themes of the squares, saved as single characters
+THEME_DARK = ord("d")
+THEME_LIGHT = ord("l")
+THEME_UNKNOWN = ord("u")
+
+# maps the rounds text of the wordle text to its saved value, see TweetColumns.rounds
+ROUNDS_CODES = {"1": 1, "2": 2, "3": 3, "4": 4, "5": 5, "6": 6, "X": 6, "x": -1}
+
+
+# returns the surface (client) name from the html source link of the tweet
+def get_surface(source):
+    return source.split(">")[1].split("<")[0]
+
+
+# returns the cleaned square rows of the tweet text, or None if they aren't valid
+def get_square_rows(text):
+    rows = NON_SQUARE_REGEX.sub("", text).split()
+    # must have between 1 and 6 rows, and 5 squares in each row
+    if len(rows) > 6 or len(rows) < 1:
+        return None
+    for row in rows:
+        if len(row) != 5:
+            return None
+    return rows
+
+
+# Compact column builder for cleaned tweets, used instead of a dict per tweet.
+# Numbers and flags are kept in typed arrays, surface and language as small int codes
+# into lists of the values seen, and repeated time and matrix strings are shared.
+class TweetColumns:
+    def __init__(self):
+        self.time = []
+        self.tweet_id = array("q")
+        self.user_id = array("q")
+        self.surface = array("h")
+        self.is_reply = array("b")
+        self.is_quote = array("b")
+        self.retweets = array("l")
+        self.favs = array("l")
+        self.language = array("h")
+        self.wordle_num = array("l")
+        # 1 to 6, where an "X" (loss) is saved as 6, and a lowercase "x" as -1
+        self.rounds = array("b")
+        self.hard = array("b")
+        self.theme = bytearray()
+        self.colorblind = array("b")
+        self.win = array("b")
+        self.matrix = []
+        self.surfaces = []
+        self.surface_codes = {}
+        self.languages = []
+        self.language_codes = {}
+        self.strings = {}
+
+    def __len__(self):
+        return len(self.tweet_id)
+
+    # returns the int code for the given surface or language value, adding it if new
+    def get_code(self, values, codes, value):
+        code = codes.get(value)
+        if code is None:
+            code = len(values)
+            values.append(value)
+            codes[value] = code
+        return code
+
+    def get_surface_code(self, surface):
+        return self.get_code(self.surfaces, self.surface_codes, surface)
+
+    def get_language_code(self, language):
+        return self.get_code(self.languages, self.language_codes, language)
+
+    # returns the shared copy of the given string
+    def share(self, string):
+        return self.strings.setdefault(string, string)
+
+    def append(self, tweet, wordle_num, rounds, hard, theme, colorblind, win, matrix):
+        self.time.append(self.share(tweet["created_at"]))
+        self.tweet_id.append(tweet["id"])
+        self.user_id.append(tweet["user"]["id"])
+        self.surface.append(self.get_surface_code(get_surface(tweet["source"])))
+        self.is_reply.append(1 if tweet["in_reply_to_user_id"] != None else 0)
+        self.is_quote.append(1 if tweet["is_quote_status"] else 0)
+        self.retweets.append(tweet["retweet_count"])
+        self.favs.append(tweet["favorite_count"])
+        self.language.append(self.get_language_code(tweet["lang"]))
+        self.wordle_num.append(wordle_num)
+        self.rounds.append(rounds)
+        self.hard.append(hard)
+        self.theme.append(theme)
+        self.colorblind.append(colorblind)
+        self.win.append(win)
+        self.matrix.append(self.share(matrix))
+
+    # appends the tweets at the given indexes of other, in that order
+    def extend(self, other, indexes=None):
+        if indexes is None:
+            indexes = range(len(other))
+        for i in indexes:
+            self.time.append(self.share(other.time[i]))
+            self.tweet_id.append(other.tweet_id[i])
+            self.user_id.append(other.user_id[i])
+            surface = other.surfaces[other.surface[i]]
+            self.surface.append(self.get_surface_code(surface))
+            self.is_reply.append(other.is_reply[i])
+            self.is_quote.append(other.is_quote[i])
+            self.retweets.append(other.retweets[i])
+            self.favs.append(other.favs[i])
+            language = other.languages[other.language[i]]
+            self.language.append(self.get_language_code(language))
+            self.wordle_num.append(other.wordle_num[i])
+            self.rounds.append(other.rounds[i])
+            self.hard.append(other.hard[i])
+            self.theme.append(other.theme[i])
+            self.colorblind.append(other.colorblind[i])
+            self.win.append(other.win[i])
+            self.matrix.append(self.share(other.matrix[i]))
+
+    # returns the rounds values as they are written to the data files
+    def get_rounds_values(self):
+        return ["x" if r == -1 else str(r) for r in self.rounds]
+
+    # yields each tweet as a row of values, in TWEET_FIELDS order
+    def rows(self):
+        surfaces = self.surfaces
+        languages = self.languages
+        theme = self.theme.decode()
+        return zip(
+            self.time,
+            self.tweet_id,
+            self.user_id,
+            (surfaces[code] for code in self.surface),
+            self.is_reply,
+            self.is_quote,
+            self.retweets,
+            repeat(None),
+            self.favs,
+            repeat(None),
+            (languages[code] for code in self.language),
+            self.wordle_num,
+            self.get_rounds_values(),
+            self.hard,
+            theme,
+            self.colorblind,
+            self.win,
+            self.matrix,
+        )
+
+    # returns the approximate number of bytes used by the columns
+    def get_size(self):
+        size = sys.getsizeof(self.time) + sys.getsizeof(self.matrix)
+        for string in self.strings:
+            size += sys.getsizeof(string)
+        for column in [
+            self.tweet_id,
+            self.user_id,
+            self.surface,
+            self.is_reply,
+            self.is_quote,
+            self.retweets,
+            self.favs,
+            self.language,
+            self.wordle_num,
+            self.rounds,
+            self.hard,
+            self.theme,
+            self.colorblind,
+            self.win,
+        ]:
+            size += sys.getsizeof(column)
+        return size
+
+
+# parses a full page of statuses for the given wordle number
+# returns the cleaned tweets as columns, along with the text_invalid and squares_invalid counts
+def parse_statuses(statuses, wordle_num):
+    tweets_by_num, text_invalid, squares_invalid = parse_statuses_by_num(
+        statuses, {wordle_num: None}
+    )
+    return tweets_by_num[wordle_num], text_invalid, squares_invalid
+
+
+# parses a full page of statuses for several wordle numbers at once, splitting the tweets by number
+# id_windows maps each wordle number to the (first, end) tweet ids of its own search window,
+# or to None to accept any tweet id; tweets outside their number's window are text_invalid
+# returns a dict of cleaned tweet columns by number, along with the invalid counts
+def parse_statuses_by_num(statuses, id_windows):
+    search = WORDLE_REGEX.search
+    wanted = {str(num): (num, window) for num, window in id_windows.items()}
+    text_invalid = 0
+    squares_invalid = 0
+    tweets_by_num = {num: TweetColumns() for num in id_windows}
+
+    for tweet in statuses:
+        text = tweet["text"]
+
+        # must have valid text, for one of the wanted wordle nums, in that num's window
+        wordle_text = search(text)
+        match = None if wordle_text is None else wanted.get(wordle_text.group(1))
+        if match is None:
+            text_invalid += 1
+            continue
+        wordle_num, window = match
+        if window is not None and not window[0] <= tweet["id"] < window[1]:
+            text_invalid += 1
+            continue
+
+        rows = get_square_rows(text)
+        if rows is None:
+            squares_invalid += 1
+            continue
+
+        squares = "".join(rows)
+        if "⬛" in squares:
+            theme = THEME_DARK
+        elif "⬜" in squares:
+            theme = THEME_LIGHT
+        else:
+            theme = THEME_UNKNOWN
+        matrix = squares.translate(SQUARES_TABLE)
+        rounds = wordle_text.group(2)
+
+        tweets_by_num[wordle_num].append(
+            tweet,
+            int(wordle_num),
+            ROUNDS_CODES[rounds],
+            # hard mode is flagged anywhere in the text, not just the wordle text
+            1 if "/6*" in text else 0,
+            theme,
+            1 if "🟧" in squares or "🟦" in squares else 0,
+            1 if matrix[-5:] == "CCCCC" else 0,
+            matrix,
+        )
+
+    return tweets_by_num, text_invalid, squares_invalid
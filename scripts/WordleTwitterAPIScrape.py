@@ -1,30 +1,65 @@
-import requests
 import os
+import glob
 import json
-import re
-import csv
-import time
 import sys
-from datetime import datetime, timedelta
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
 import subprocess
+from WordleTweetParser import parse_statuses, parse_statuses_by_num, TweetColumns
+from TweetSinks import SINK_FORMATS, open_sink
+from TwitterClient import TwitterClient, RateLimitScheduler
+from PipelineMetrics import PipelineMetrics, COUNT_BUCKETS, get_metrics_file_path
 
 
 # To set your environment variables in your terminal run the following line:
 # export 'BEARER_TOKEN'='<your_bearer_token>'
 bearer_token = os.environ.get("BEARER_TOKEN")
 
-SEARCH_URL = "https://api.twitter.com/1.1/search/tweets.json"
+# the search url can be pointed at a local stub server for testing
+SEARCH_URL = os.environ.get(
+    "TWITTER_SEARCH_URL", "https://api.twitter.com/1.1/search/tweets.json"
+)
 WORDLE_DAY_ONE = datetime.fromisoformat("2021-06-18")
 
 # Twitter API limits to 450 calls per 15 min
 LIMIT = 450
 # Data will be saved every 50 api calls
 SAVE_INTERVAL = 50
-
-# set environment
+# The 450 call limit resets every 15 min
+RATE_LIMIT_WINDOW = 15 * 60
+
+# Twitter snowflake ids encode the tweet time, in ms since this epoch
+TWITTER_EPOCH_MS = 1288834974657
+# size of each time shard in sharded mode, and how many are fetched at once
+SHARD_HOURS = 1
+SHARD_WORKERS = 8
+# in backfill mode, up to this many consecutive wordle numbers are fetched with one combined query
+BACKFILL_GROUP_SIZE = 7
+
+# set environment and mode from the CLI flags after the wordle number
 ENV = "PC"
-if len(sys.argv) > 2 and sys.argv[2] == "github":
+if "github" in sys.argv[2:]:
     ENV = "GITHUB"
+SHARDED = "sharded" in sys.argv[2:]
+# the output format can be given as a flag too, i.e. "csv.gz", defaulting to plain csv
+OUTPUT_FORMAT = "csv"
+for flag in sys.argv[2:]:
+    if flag in SINK_FORMATS:
+        OUTPUT_FORMAT = flag
+
+# metrics of this run, written to data/metrics/ (or metrics/ on github) when it ends
+metrics = PipelineMetrics("scrape")
+
+# one keep-alive client, shared by every call (and every shard) to stay inside the rate limit
+# set TWITTER_RECORD_FILE to record every raw response, for replaying offline
+client = TwitterClient(
+    bearer_token,
+    RateLimitScheduler(LIMIT, RATE_LIMIT_WINDOW),
+    pool_size=SHARD_WORKERS,
+    record_file=os.environ.get("TWITTER_RECORD_FILE"),
+    metrics=metrics,
+)
 
 # creates a native mac notification to alert the user to the progress of the program
 def notify(title, text):
@@ -48,10 +83,28 @@ def notify(title, text):
 # sets the data file path based on the environment set from CLI args
 # when using on github actions (as opposed to locally), "github" flag should be specified
 def get_data_file_path(wordle_num):
+    extension = SINK_FORMATS[OUTPUT_FORMAT]
+    if ENV == "GITHUB":
+        return "wordle." + str(wordle_num) + ".api" + extension
+    else:
+        return "data/wordle." + str(wordle_num) + ".api" + extension
+
+
+# writes the metrics of this run, named after the given wordle number or range
+def write_metrics(label):
+    run = "wordle." + str(label) + ".scrape"
     if ENV == "GITHUB":
-        return "wordle." + str(wordle_num) + ".api.csv"
+        metrics.write(get_metrics_file_path(run, "metrics"))
     else:
-        return "data/wordle." + str(wordle_num) + ".api.csv"
+        metrics.write(get_metrics_file_path(run))
+
+
+# records the counts of a parsed page in the run metrics
+def record_page_metrics(tweets, clean_count, text_invalid, squares_invalid):
+    metrics.observe("tweets_per_page", len(tweets), buckets=COUNT_BUCKETS)
+    metrics.count("parsed_tweets", clean_count)
+    metrics.count("rejected_tweets", text_invalid, reason="text_invalid")
+    metrics.count("rejected_tweets", squares_invalid, reason="squares_invalid")
 
 
 # checks whether it is too early to scrape the given wordle number's tweets
@@ -70,38 +123,64 @@ def wordle_num_from_current_datetime():
     return latest_num
 
 
-# generates the twitter API search params for the given wordle number and max id, if applicable
-def get_search_params(wordle_num, max_id=None):
-    start = WORDLE_DAY_ONE
-    wordle_start = start + timedelta(days=wordle_num)
+# returns the 3 day window (start, end) that tweets for the given wordle number are searched in
+def get_wordle_window(wordle_num):
+    wordle_start = WORDLE_DAY_ONE + timedelta(days=wordle_num)
     wordle_end = wordle_start + timedelta(days=3)
+    return wordle_start, wordle_end
+
+
+# generates the twitter API search params for the given wordle number and max id, if applicable
+# since id can be given to only get tweets newer than it, used by sharded mode
+def get_search_params(wordle_num, max_id=None, since_id=None):
+    wordle_start, wordle_end = get_wordle_window(wordle_num)
     return {
         "q": f'"wordle {wordle_num}" until:{wordle_end.strftime("%Y-%m-%d")} since:{wordle_start.strftime("%Y-%m-%d")} -filter:retweets',
         "result_type": "recent",
         "count": 100,
         "max_id": max_id,
+        "since_id": since_id,
     }
 
 
-# sets the OAuth info for the API request
-def bearer_oauth(r):
-    r.headers["Authorization"] = f"Bearer {bearer_token}"
-    r.headers["User-Agent"] = "v2RecentSearchPython"
-    return r
+# returns the first possible tweet id for the given (utc) datetime
+def get_snowflake_id(dt):
+    ms = int(dt.replace(tzinfo=timezone.utc).timestamp() * 1000)
+    return (ms - TWITTER_EPOCH_MS) << 22
+
+
+# splits the wordle window into shards of SHARD_HOURS each, newest first
+# each shard pages back from its max_id (inclusive) to its since_id (exclusive)
+def get_shards(wordle_num):
+    wordle_start, wordle_end = get_wordle_window(wordle_num)
+    shards = []
+    shard_end = wordle_end
+    while shard_end > wordle_start:
+        shard_start = max(shard_end - timedelta(hours=SHARD_HOURS), wordle_start)
+        shards.append(
+            {
+                "since_id": get_snowflake_id(shard_start) - 1,
+                "max_id": get_snowflake_id(shard_end) - 1,
+                "done": False,
+            }
+        )
+        shard_end = shard_start
+    return shards
+
+
+# gets the max id the next call should start from, or None if there are no more pages
+def get_next_max_id(res):
+    if "next_results" not in res["search_metadata"]:
+        return None
+    next_results = res["search_metadata"]["next_results"]
+    return int(next_results.split("max_id=")[1].split("&")[0]) - 1
 
 
 # gets the API response for the given url and params
+# the client waits out rate limits, and retries server errors
 def get_response(url, params):
-    pause_seconds = 60
-    response = requests.get(url, auth=bearer_oauth, params=params)
-    if response.status_code == 429:
-        # request has been ratelimitted, will be unratelimited in 15 min,
-        # but let's recheck every min just in case
-        while response.status_code == 429:
-            print("RATE LIMIT HIT - pausing for ", pause_seconds, "seconds")
-            time.sleep(pause_seconds)
-            response = requests.get(url, auth=bearer_oauth, params=params)
-    elif response.status_code != 200:
+    response = client.get(url, params)
+    if response.status_code != 200:
         # if not a ratelimit or ok response, throw an exception
         print()
         raise Exception(response.status_code, response.text)
@@ -109,101 +188,24 @@ def get_response(url, params):
 
 
 # The main event
-# Parses the API response, and returns an object containing the cleaned tweets
+# Parses the API response, and returns a TweetColumns object containing the cleaned tweets
 def process_response(res, wordle_num):
     tweets = res["statuses"]
     if len(tweets) == 0:
         print("END OF TWEET LIST")
-        return []
-    text_invalid = 0
-    squares_invalid = 0
-    clean_tweets = []
-
-    for tweet in tweets:
-        # easy fields to gather
-        clean_tweet = {
-            "time": tweet["created_at"],
-            "tweet_id": tweet["id"],
-            "user_id": tweet["user"]["id"],
-            "surface": tweet["source"].split(">")[1].split("<")[0],
-            "is_reply": 1 if tweet["in_reply_to_user_id"] != None else 0,
-            "is_quote": 1 if tweet["is_quote_status"] else 0,
-            "retweets": tweet["retweet_count"],
-            "quotes": None,
-            "favs": tweet["favorite_count"],
-            "replies": None,
-            "language": tweet["lang"],
-        }
-        text = tweet["text"]
-
-        # gets the wordle text string, i.e. "Wordle 250 2/6*"
-        wordleRegex = re.compile(
-            "Wordle[()#!,\-.:\s]*(\d*)[()#!,\-.:\s]*([1-6X])\/6\*?", re.IGNORECASE
-        )
-        wordleText = wordleRegex.search(text)
-        # parse wordle number, round count, and hard mode from wordle text
-        if wordleText is not None:
-            clean_tweet["wordle_num"] = wordleText.group(1)
-            clean_tweet["rounds"] = (
-                6 if wordleText.group(2) == "X" else wordleText.group(2)
-            )
-            clean_tweet["hard"] = 1 if "/6*" in wordleText.string else 0
-        else:
-            # must have valid text
-            text_invalid += 1
-            continue
-
-        # must be current wordle num
-        if clean_tweet["wordle_num"] != str(wordle_num):
-            text_invalid += 1
-            continue
-
-        # clean squares
-        valid_chars = ["⬛", "🟨", "🟩", "⬜", "🟧", "🟦", "\n"]
-        raw_rows = "".join(c for c in text if c in valid_chars).split("\n")
-        rows = [row for row in raw_rows if row != ""]
-
-        # must have between 1 and 6 rows
-        if len(rows) > 6 or len(rows) < 1:
-            squares_invalid += 1
-            continue
-
-        # must have 5 squares in each row
-        if any([len(row) != 5 for row in rows]):
-            squares_invalid += 1
-            continue
-
-        squares = "".join(rows)
-
-        if "⬛" in squares:
-            clean_tweet["theme"] = "d"  # dark
-        elif "⬜" in squares:
-            clean_tweet["theme"] = "l"  # light
-        else:
-            clean_tweet["theme"] = "u"  # unknown
-
-        clean_tweet["colorblind"] = 1 if "🟧" in squares or "🟦" in squares else 0
-        squares = (
-            squares.replace("⬛", "A")
-            .replace("⬜", "A")
-            .replace("🟨", "B")
-            .replace("🟦", "B")
-            .replace("🟧", "C")
-            .replace("🟩", "C")
-        )
-        clean_tweet["win"] = 1 if squares[-5:] == "CCCCC" else 0
-        clean_tweet["matrix"] = squares
-
-        clean_tweets.append(clean_tweet)
+        return TweetColumns()
+    with metrics.timer("parse_seconds"):
+        clean_tweets, text_invalid, squares_invalid = parse_statuses(tweets, wordle_num)
+    record_page_metrics(tweets, len(clean_tweets), text_invalid, squares_invalid)
 
     if len(clean_tweets) != 0:
         print(
             "processed",
             len(clean_tweets),
             "tweets. time:",
-            clean_tweets[0]["time"],
+            clean_tweets.time[0],
             "-",
-            clean_tweets[-1]["time"],
+            clean_tweets.time[-1],
         )
     else:
         print("processed 0 tweets.")
@@ -222,52 +224,154 @@ def process_response(res, wordle_num):
     return clean_tweets
 
 
-# save the cleaned tweets currently collected
-def save_tweets(clean_tweets, wordle_num, mode):
-    if len(clean_tweets) == 0:
-        return 0
-    print("Saving", len(clean_tweets), "tweets...")
-    with open(get_data_file_path(wordle_num), mode) as csvfile:
-        writer = csv.DictWriter(csvfile, clean_tweets[0].keys())
-        if mode == "w":
-            writer.writeheader()
-        writer.writerows(clean_tweets)
-    return len(clean_tweets)
-
-
-# get the last saved id, to determine where to start the scraping
-def get_last_saved_id(wordle_num):
-    try:
-        with open(get_data_file_path(wordle_num), "r") as f:
-            for line in f:
-                pass
-            return int(line.split(",")[1])
-    except:
+# Parses the API response of a combined backfill query, splitting the cleaned tweets by number
+# each number only keeps the tweets from its own 3 day window
+def process_backfill_response(res, wordle_nums):
+    tweets = res["statuses"]
+    id_windows = {}
+    for wordle_num in wordle_nums:
+        wordle_start, wordle_end = get_wordle_window(wordle_num)
+        id_windows[wordle_num] = (
+            get_snowflake_id(wordle_start),
+            get_snowflake_id(wordle_end),
+        )
+    with metrics.timer("parse_seconds"):
+        tweets_by_num, text_invalid, squares_invalid = parse_statuses_by_num(
+            tweets, id_windows
+        )
+    clean_count = sum(len(clean_tweets) for clean_tweets in tweets_by_num.values())
+    record_page_metrics(tweets, clean_count, text_invalid, squares_invalid)
+    print(
+        "processed",
+        " | ".join(f"{n}: {len(tweets_by_num[n])}" for n in wordle_nums),
+        "| text_invalid:",
+        text_invalid,
+        "| squares_invalid:",
+        squares_invalid,
+        "| out of",
+        len(tweets),
+    )
+    return tweets_by_num
+
+
+# sets the checkpoint file path, kept alongside the data file
+def get_checkpoint_file_path(wordle_num):
+    return get_data_file_path(wordle_num) + ".ckpt"
+
+
+# atomically replaces the checkpoint file with the given checkpoint
+def write_checkpoint(wordle_num, checkpoint):
+    path = get_checkpoint_file_path(wordle_num)
+    with open(path + ".tmp", "w") as f:
+        json.dump(checkpoint, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(path + ".tmp", path)
+
+
+# save the cleaned tweets currently collected in the sink, then update the checkpoint to match
+# the sink syncs the data file to disk before the checkpoint is replaced, so after a crash
+# the checkpoint never points past the data that was actually written
+def save_tweets(sink, wordle_num, checkpoint, close=False):
+    with metrics.stage("save"):
+        rows, offset = sink.close() if close else sink.flush()
+    metrics.count("rows_written", rows)
+    metrics.count("bytes_written", offset - checkpoint["offset"])
+    if rows != 0:
+        print("Saved", rows, "tweets")
+    checkpoint["rows"] += rows
+    checkpoint["offset"] = offset
+    write_checkpoint(wordle_num, checkpoint)
+    return rows
+
+
+# opens the sink of a data file, in append mode moving the checkpoint to where the sink continues
+# from, as reopening an arrow stream cuts off its end of stream marker, and after a crash a
+# checkpoint past the end of the file would throw the file away
+def open_data_sink(wordle_num, mode, checkpoint):
+    sink = open_sink(get_data_file_path(wordle_num), mode, OUTPUT_FORMAT)
+    if mode == "a" and sink.tell() != checkpoint["offset"]:
+        checkpoint["offset"] = sink.tell()
+        write_checkpoint(wordle_num, checkpoint)
+    return sink
+
+
+# rebuilds the checkpoint for a data file saved without one, from the last complete row
+# a partially written last row is cut off the file
+# only plain csv files can be recovered, other formats are restarted
+def recover_checkpoint(wordle_num):
+    path = get_data_file_path(wordle_num)
+    if OUTPUT_FORMAT != "csv":
+        return None
+    with open(path, "rb+") as f:
+        size = f.seek(0, os.SEEK_END)
+        tail = b""
+        while size > 0 and tail.count(b"\n") < 2:
+            read_size = min(size, 65536)
+            size -= read_size
+            f.seek(size)
+            tail = f.read(read_size) + tail
+        lines = tail.split(b"\n")
+        if lines[-1] != b"":
+            print("Truncated last row found, removing it")
+            f.truncate(f.seek(0, os.SEEK_END) - len(lines[-1]))
+        offset = f.seek(0, os.SEEK_END)
+        f.seek(0)
+        rows = sum(chunk.count(b"\n") for chunk in iter(lambda: f.read(1 << 20), b""))
+    if rows < 2:
+        return None  # only the header, or nothing at all
+    last_id = int(lines[-2].split(b",")[1])
+    return {"max_id": last_id - 1, "done": False, "rows": rows - 1, "offset": offset}
+
+
+# get the saved checkpoint, to determine where to start the scraping
+# any rows written after the last checkpoint are cut off, as they will be fetched again
+def load_checkpoint(wordle_num):
+    path = get_data_file_path(wordle_num)
+    if not os.path.exists(path):
         return None
+    try:
+        with open(get_checkpoint_file_path(wordle_num)) as f:
+            checkpoint = json.load(f)
+    except FileNotFoundError:
+        return recover_checkpoint(wordle_num)
+    size = os.path.getsize(path)
+    if size < checkpoint["offset"]:
+        print("Data file is shorter than its checkpoint, rebuilding checkpoint")
+        return recover_checkpoint(wordle_num)
+    if size > checkpoint["offset"]:
+        print("Removing", size - checkpoint["offset"], "bytes written after checkpoint")
+        os.truncate(path, checkpoint["offset"])
+    return checkpoint
 
 
 # get responses for one full limit of the API, or 450 calls
 def get_full_response_set(wordle_num, restart=False):
     max_id = None
+    checkpoint = {"max_id": None, "done": False, "rows": 0, "offset": 0}
     if is_too_early(wordle_num):
         print("Too early to gather this wordle!")
         return True  # Done
 
-    # if not in restart mode, look for the last saved id
+    # if not in restart mode, look for the saved checkpoint
     if not restart:
         print("In continue mode, searching for existing data...")
-        max_id = get_last_saved_id(wordle_num)
-        # if max_id is None, no saved data, and should switch to restart mode
-        if max_id is None:
+        saved = load_checkpoint(wordle_num)
+        # if there's no saved data, or it was saved by sharded mode, switch to restart mode
+        if saved is None or "max_id" not in saved:
             print("No existing data found, switching to restart mode")
             restart = True
+        elif saved["done"]:
+            print("Existing data is complete")
+            return True  # Done
         else:
-            max_id -= 1
-            print("Existing data found, continuing from last row")
+            checkpoint = saved
+            max_id = saved["max_id"]
+            print("Existing data found, continuing from row", saved["rows"])
 
     i = 0
     tweet_count = 0
-    all_tweets = []
+    sink = open_data_sink(wordle_num, "w" if restart else "a", checkpoint)
     while True:
         try:
             # get the API response
@@ -275,26 +379,22 @@ def get_full_response_set(wordle_num, restart=False):
         except Exception as e:
             # if an error, save the existing tweets and exit with the error
             print("ERROR - saving current data")
-            save_tweets(all_tweets, wordle_num, "w" if restart else "a")
+            save_tweets(sink, wordle_num, checkpoint, close=True)
             raise e
         print("[" + str(i) + "]", end=" ")
-        clean_tweets = process_response(res, wordle_num)
+        sink.write(process_response(res, wordle_num))
         i += 1
-        all_tweets += clean_tweets
+        # save the new max index to determine where the next call should start
+        max_id = get_next_max_id(res)
+        checkpoint["max_id"] = max_id
+        checkpoint["done"] = len(res["statuses"]) == 0 or max_id is None
         if i % SAVE_INTERVAL == 0:
-            tweet_count += save_tweets(all_tweets, wordle_num, "w" if restart else "a")
-            restart = False
-            all_tweets = []
-        if i >= LIMIT or len(res["statuses"]) == 0:
+            tweet_count += save_tweets(sink, wordle_num, checkpoint)
+        if i >= LIMIT or checkpoint["done"]:
             break
-        # save the new max index to determine where the next call should start
-        max_id = int(
-            res["search_metadata"]["next_results"].split("max_id=")[1].split("&q=")[0]
-        )
-        max_id -= 1
 
-    tweet_count += save_tweets(all_tweets, wordle_num, "w" if restart else "a")
-    if len(res["statuses"]) == 0:
+    tweet_count += save_tweets(sink, wordle_num, checkpoint, close=True)
+    if checkpoint["done"]:
         notify(
             "[" + str(wordle_num) + "] Processed " + str(tweet_count) + " tweets",
             "END OF TWEETS!",
@@ -315,20 +415,293 @@ def get_all_response_sets(wordle_num):
         is_done = get_full_response_set(wordle_num)
 
 
+# shares a number of API calls between all of the shards being fetched at once
+class CallBudget:
+    def __init__(self, limit):
+        self.remaining = limit
+        self.lock = threading.Lock()
+
+    # takes one call from the budget, returning False if it has run out
+    def take(self):
+        with self.lock:
+            if self.remaining <= 0:
+                return False
+            self.remaining -= 1
+            return True
+
+
+# pages back through a single shard until it is done or the budget runs out
+# the shard's max_id is updated as it goes, so it can be continued later
+def fetch_shard(wordle_num, shard_index, shard, budget, all_tweets, lock):
+    while not shard["done"] and budget.take():
+        params = get_search_params(wordle_num, shard["max_id"], shard["since_id"])
+        res = get_response(SEARCH_URL, params)
+        with lock:
+            print("[shard " + str(shard_index) + "]", end=" ")
+            all_tweets.extend(process_response(res, wordle_num))
+        max_id = get_next_max_id(res)
+        if len(res["statuses"]) == 0 or max_id is None:
+            shard["done"] = True
+        else:
+            shard["max_id"] = max_id
+
+
+# gets all the wordle tweets for the given number, fetching time shards of the window concurrently
+# every shard shares the client's rate limit, and results are merged into one file
+# after every SAVE_INTERVAL calls, checkpointing the position of every shard
+def get_sharded_response_sets(wordle_num):
+    if is_too_early(wordle_num):
+        print("Too early to gather this wordle!")
+        return
+
+    mode = "w"
+    checkpoint = {"shards": get_shards(wordle_num), "rows": 0, "offset": 0}
+    saved = load_checkpoint(wordle_num)
+    if saved is not None and "shards" in saved:
+        print("Existing sharded data found, continuing from row", saved["rows"])
+        checkpoint = saved
+        mode = "a"
+    shards = checkpoint["shards"]
+    print("Fetching", len(shards), "shards with", SHARD_WORKERS, "workers")
+    saved_ids = set()
+    tweet_count = 0
+    sink = open_data_sink(wordle_num, mode, checkpoint)
+    while not all(shard["done"] for shard in shards):
+        budget = CallBudget(SAVE_INTERVAL)
+        all_tweets = TweetColumns()
+        lock = threading.Lock()
+        pending = [(i, shard) for i, shard in enumerate(shards) if not shard["done"]]
+        try:
+            with metrics.stage("fetch"), ThreadPoolExecutor(SHARD_WORKERS) as pool:
+                futures = [
+                    pool.submit(
+                        fetch_shard, wordle_num, i, shard, budget, all_tweets, lock
+                    )
+                    for i, shard in pending
+                ]
+                for future in futures:
+                    future.result()
+        finally:
+            # merge the shards newest first without duplicates, and save them,
+            # even if one of the shards errored
+            tweet_ids = all_tweets.tweet_id
+            new_tweets = []
+            for i in sorted(range(len(tweet_ids)), key=tweet_ids.__getitem__)[::-1]:
+                if tweet_ids[i] not in saved_ids:
+                    saved_ids.add(tweet_ids[i])
+                    new_tweets.append(i)
+            metrics.count("duplicate_tweets", len(tweet_ids) - len(new_tweets))
+            merged_tweets = TweetColumns()
+            merged_tweets.extend(all_tweets, new_tweets)
+            sink.write(merged_tweets)
+            tweet_count += save_tweets(sink, wordle_num, checkpoint)
+        print()
+        print(
+            "[" + str(wordle_num) + "]",
+            sum(shard["done"] for shard in shards),
+            "of",
+            len(shards),
+            "shards done",
+        )
+
+    tweet_count += save_tweets(sink, wordle_num, checkpoint, close=True)
+    notify(
+        "[" + str(wordle_num) + "] Processed " + str(tweet_count) + " tweets",
+        "END OF TWEETS!",
+    )
+
+
+# generates the search params for a combined query over several consecutive wordle numbers,
+# searching the union of their 3 day windows
+def get_backfill_search_params(wordle_nums, max_id=None):
+    wordle_start = get_wordle_window(wordle_nums[0])[0]
+    wordle_end = get_wordle_window(wordle_nums[-1])[1]
+    terms = " OR ".join(f'"wordle {wordle_num}"' for wordle_num in wordle_nums)
+    return {
+        "q": f'({terms}) until:{wordle_end.strftime("%Y-%m-%d")} since:{wordle_start.strftime("%Y-%m-%d")} -filter:retweets',
+        "result_type": "recent",
+        "count": 100,
+        "max_id": max_id,
+    }
+
+
+# splits the range of wordle numbers into groups of consecutive numbers for combined queries
+def get_backfill_groups(first_num, last_num):
+    wordle_nums = [n for n in range(first_num, last_num + 1) if not is_too_early(n)]
+    return [
+        wordle_nums[i : i + BACKFILL_GROUP_SIZE]
+        for i in range(0, len(wordle_nums), BACKFILL_GROUP_SIZE)
+    ]
+
+
+# whether the data file of a number is there, and complete up to the given offset
+def has_data_up_to(wordle_num, offset):
+    path = get_data_file_path(wordle_num)
+    return os.path.exists(path) and os.path.getsize(path) >= offset
+
+
+# returns the given numbers whose data files are already complete, by their own checkpoints
+# (of a single or sharded scrape), or by the checkpoint of a finished backfill group
+def get_finished_wordle_nums(wordle_nums):
+    finished = set()
+    for path in glob.glob(get_checkpoint_file_path("*-*")):
+        with open(path) as f:
+            checkpoint = json.load(f)
+        if checkpoint["done"]:
+            for wordle_num, saved in checkpoint["files"].items():
+                if has_data_up_to(int(wordle_num), saved["offset"]):
+                    finished.add(int(wordle_num))
+    for wordle_num in wordle_nums:
+        try:
+            with open(get_checkpoint_file_path(wordle_num)) as f:
+                checkpoint = json.load(f)
+        except FileNotFoundError:
+            continue
+        if "shards" in checkpoint:
+            done = all(shard["done"] for shard in checkpoint["shards"])
+        else:
+            done = checkpoint["done"]
+        if done and has_data_up_to(wordle_num, checkpoint["offset"]):
+            finished.add(wordle_num)
+    return [wordle_num for wordle_num in wordle_nums if wordle_num in finished]
+
+
+# get the saved checkpoint of a backfill group, cutting each of its number's data files back
+# to it. numbers that were already complete when the group started aren't in it
+def load_group_checkpoint(label):
+    try:
+        with open(get_checkpoint_file_path(label)) as f:
+            checkpoint = json.load(f)
+    except FileNotFoundError:
+        return None
+    for wordle_num in checkpoint["files"]:
+        path = get_data_file_path(wordle_num)
+        offset = checkpoint["files"][wordle_num]["offset"]
+        if not os.path.exists(path) or os.path.getsize(path) < offset:
+            print("Data file", path, "is shorter than its checkpoint, restarting group")
+            return None
+        os.truncate(path, offset)
+    return checkpoint
+
+
+# save the cleaned tweets of every number in the group, then update the group checkpoint
+# the checkpoint is only replaced once every data file has been synced
+def save_group_tweets(sinks, label, checkpoint, close=False):
+    rows = 0
+    for wordle_num, sink in sinks.items():
+        with metrics.stage("save"):
+            file_rows, offset = sink.close() if close else sink.flush()
+        saved = checkpoint["files"][str(wordle_num)]
+        metrics.count("rows_written", file_rows)
+        metrics.count("bytes_written", offset - saved["offset"])
+        saved["rows"] += file_rows
+        saved["offset"] = offset
+        rows += file_rows
+    if rows != 0:
+        print("Saved", rows, "tweets for", label)
+    write_checkpoint(label, checkpoint)
+    return rows
+
+
+# gets all the tweets of a group of consecutive wordle numbers with one combined query,
+# writing each number's tweets to its own data file
+# numbers already complete (i.e. scraped on their own) are left out of the query, and their
+# data files are left as they are
+def get_backfill_group(wordle_nums):
+    label = str(wordle_nums[0]) + "-" + str(wordle_nums[-1])
+    mode = "a"
+    checkpoint = load_group_checkpoint(label)
+    if checkpoint is None:
+        finished = get_finished_wordle_nums(wordle_nums)
+        if finished:
+            print("Existing data for", finished, "is complete, leaving them out")
+        wordle_nums = [n for n in wordle_nums if n not in finished]
+        if not wordle_nums:
+            return
+        mode = "w"
+        checkpoint = {"max_id": None, "done": False, "files": {}}
+        for wordle_num in wordle_nums:
+            checkpoint["files"][str(wordle_num)] = {"rows": 0, "offset": 0}
+    elif checkpoint["done"]:
+        print("Existing data for", label, "is complete")
+        return
+    wordle_nums = [int(wordle_num) for wordle_num in checkpoint["files"]]
+    sinks = {
+        wordle_num: open_sink(get_data_file_path(wordle_num), mode, OUTPUT_FORMAT)
+        for wordle_num in wordle_nums
+    }
+    if mode == "a":
+        # reopening arrow streams cuts off their end of stream markers, see open_data_sink
+        for wordle_num, sink in sinks.items():
+            checkpoint["files"][str(wordle_num)]["offset"] = sink.tell()
+        write_checkpoint(label, checkpoint)
+
+    i = 0
+    tweet_count = 0
+    try:
+        while not checkpoint["done"]:
+            params = get_backfill_search_params(wordle_nums, checkpoint["max_id"])
+            res = get_response(SEARCH_URL, params)
+            print("[" + label + "] [" + str(i) + "]", end=" ")
+            tweets_by_num = process_backfill_response(res, wordle_nums)
+            for wordle_num, clean_tweets in tweets_by_num.items():
+                sinks[wordle_num].write(clean_tweets)
+            i += 1
+            max_id = get_next_max_id(res)
+            checkpoint["max_id"] = max_id
+            checkpoint["done"] = len(res["statuses"]) == 0 or max_id is None
+            if i % SAVE_INTERVAL == 0:
+                tweet_count += save_group_tweets(sinks, label, checkpoint)
+    finally:
+        # save the existing tweets, even if there was an error
+        tweet_count += save_group_tweets(sinks, label, checkpoint, close=True)
+    notify(
+        "[" + label + "] Processed " + str(tweet_count) + " tweets",
+        "END OF TWEETS!",
+    )
+
+
+# gets all the tweets for a range of wordle numbers, i.e. after an outage
+# consecutive numbers are grouped into combined queries, as their windows overlap,
+# and the groups are fetched concurrently, sharing the client's rate limit
+def get_backfill_response_sets(first_num, last_num):
+    groups = get_backfill_groups(first_num, last_num)
+    print("Backfilling", len(groups), "groups of wordle numbers:", groups)
+    with ThreadPoolExecutor(SHARD_WORKERS) as pool:
+        for future in [pool.submit(get_backfill_group, group) for group in groups]:
+            future.result()
+
+
 def set_env_var_for_filename(wordle_num):
     env_file = os.getenv("GITHUB_ENV")
     with open(env_file, "a") as f:
         f.write(f"WORDLE_DATA_FILEPATH={get_data_file_path(wordle_num)}")
 
 
-# main function, gets wordle num as first CLI arg
+# main function, gets wordle num as first CLI arg, or a range of numbers to backfill, i.e. "300-305"
+# optional flags after it: "github" when run on github actions, "sharded" for sharded mode
 def main():
     wordle_arg = sys.argv[1]
+    if "-" in wordle_arg:
+        first_num, last_num = wordle_arg.split("-")
+        try:
+            with metrics.stage("scrape"):
+                get_backfill_response_sets(int(first_num), int(last_num))
+        finally:
+            write_metrics(wordle_arg)
+        return
     if wordle_arg == "latest":
         wordle_num = wordle_num_from_current_datetime()
     else:
         wordle_num = int(wordle_arg)
-    get_all_response_sets(wordle_num)
+    try:
+        with metrics.stage("scrape"):
+            if SHARDED:
+                get_sharded_response_sets(wordle_num)
+            else:
+                get_all_response_sets(wordle_num)
+    finally:
+        write_metrics(wordle_num)
     if ENV == "GITHUB":
         set_env_var_for_filename(wordle_num)
 